@@ -1,20 +1,82 @@
+import argparse
 import errors
+import json
 import requests
 import socket
-import time
+from connect_server.ai import Engine
+from connect_server.board import Board
+from connect_server.book import OpeningBook
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-
-CONNECT5_SERVER = "http://127.0.0.1:5000/"
-TURN_POLL_INTERVAL = 1
+CONNECT5_SERVER = "http://127.0.0.1:5000"
+# Seconds to wait for a connection to the server and for a response once connected.
+# Requests that wait on the server have the server side wait added to the latter
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+# Failed connections and idempotent requests answered with a gateway error are retried
+# this many times, backing off exponentially from RETRY_BACKOFF seconds
+REQUEST_RETRIES = 3
+RETRY_BACKOFF = 0.2
+# How long in seconds each matchmaking request waits on the server for an opponent
+MATCHMAKING_WAIT = 30
+# Follow the game through the server's event stream, or long-poll /wait if False
+USE_EVENT_STREAM = True
+# How long in seconds each /wait request waits on the server for the game to change
+STATE_WAIT = 30
 
 
 class Client:
-    """Represents a single client used to partake in a game of Connect 5"""
+    """Represents a single client used to partake in a game of Connect 5.
+
+    All requests go through one pooled session, so polls and moves reuse kept-alive
+    connections rather than opening a new TCP connection each time.
 
-    def __init__(self):
+    Attributes:
+        server (str): The base URL of the Connect 5 server without a trailing slash.
+        board (Board): A local copy of the game board kept up to date from the moves
+            the server pushes, or None if the client reads the board from the server.
+        engine (Engine): The computer player choosing this client's moves, or None to
+            prompt for every move.
+        session (requests.Session): The pooled session used for every request.
+        ticket (str): The matchmaking ticket while waiting for an opponent, or None.
+    """
+
+    def __init__(
+        self,
+        server=CONNECT5_SERVER,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        retries=REQUEST_RETRIES,
+        backoff=RETRY_BACKOFF,
+        engine=None,
+    ):
         self.name = None
+        self.game_id = None
+        self.ticket = None
         self.symbol = ""
         self.active_player = False
+        self.board = None
+        self.engine = engine
+        self.server = server.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # The retry defaults never resend a POST that reached the server, so a move is
+        # only retried if the connection could not be made at all
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        # The event stream holds one connection open while moves use another
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
 
     def set_symbol(self, symbol):
         self.symbol = symbol
@@ -25,9 +87,14 @@ class Client:
     def set_active_player(self, active):
         self.active_player = active
 
-    def _make_get_request(self, url, data=None):
+    def _timeout(self, wait):
+        return (self.connect_timeout, self.read_timeout + wait)
+
+    def _make_get_request(self, url, data=None, stream=False, wait=0):
         try:
-            req = requests.get(url)
+            req = self.session.get(
+                url, params=data, stream=stream, timeout=self._timeout(wait)
+            )
         except requests.exceptions.RequestException as e:
             reg_err = "Bot registration error: "
             if not e.response:
@@ -37,9 +104,9 @@ class Client:
             raise errors.PlayerRegistrationError(reg_err)
         return req
 
-    def _make_post_request(self, url, data=None):
+    def _make_post_request(self, url, data=None, wait=0):
         try:
-            req = requests.post(url, json=data)
+            req = self.session.post(url, json=data, timeout=self._timeout(wait))
         except requests.exceptions.RequestException as e:
             reg_err = "Bot registration error: "
             if not e.response:
@@ -49,46 +116,120 @@ class Client:
             raise errors.PlayerRegistrationError(reg_err)
         return req
 
-    def print_board(self):
-        reg_url = CONNECT5_SERVER + "/board"
-        req = self._make_get_request(reg_url)
-        if "board" in req.json() and req.json()["board"]:
-            print(req.json()["board"])
+    def _url(self, route):
+        return self.server + route
+
+    def _game_url(self, route):
+        return self._url(f"/games/{self.game_id}{route}")
+
+    def get_state(self):
+        """Get the board, active player, winner, move count, players and version of
+        the game in a single request"""
+        reg_url = self._game_url("/state")
+        return self._make_get_request(reg_url).json()
 
-    def join_game(self):
-        """Attempt to join the game"""
-        reg_url = CONNECT5_SERVER + "/register"
+    def load_board(self):
+        """Fetch the game's move list and replay it into a local board, which is then
+        kept up to date with apply_move instead of downloading the board again"""
+        reg_url = self._game_url("/board")
+        details = self._make_get_request(reg_url, {"format": "moves"}).json()
+        self.board = Board.from_moves(
+            details["moves"], details["rows"], details["cols"], details["connect"]
+        )
+
+    def apply_move(self, column, row, symbol):
+        """Apply a move to the local board unless it has already been applied"""
+        if self.board and self.board.get(row, column) is None:
+            self.board.drop(column, symbol)
+
+    def print_board(self, state=None):
+        """Print the local board, an already fetched state or else fetch the state"""
+        if self.board and not state:
+            print(self.board.render())
+            return
+        state = state or self.get_state()
+        if "board" in state and state["board"]:
+            print(state["board"])
+
+    def join_game(self, name=None):
+        """Join the matchmaking queue and wait to be paired into a game. The player is
+        prompted for a name unless one is given."""
+        reg_url = self._url("/matchmaking")
         player_info = {}
 
         valid_name = False
         while not valid_name:
-            name = input("Please enter name: ")
+            name = name or input("Please enter name: ")
             player_info["name"] = name
 
             req = self._make_post_request(reg_url, player_info)
             if "success" in req.json():
-                print(req.json()["message"])
                 valid_name = req.json()["success"]
+                if not valid_name:
+                    print(req.json()["message"])
+                    name = None
 
         self.name = name
-        return req.json()
+        ticket = req.json()
+        if ticket["status"] == "pending":
+            self.ticket = ticket["ticket"]
+            print("Waiting for an opponent to join...")
+        # Each check long-polls on the server so an opponent arriving wakes us up
+        # straight away rather than on the next poll
+        while ticket["success"] and ticket["status"] == "pending":
+            ticket_url = self._url(f"/matchmaking/{ticket['ticket']}")
+            ticket = self._make_get_request(
+                ticket_url, {"wait": MATCHMAKING_WAIT}, wait=MATCHMAKING_WAIT
+            ).json()
+
+        self.ticket = None
+        if ticket["success"]:
+            self.game_id = ticket["game_id"]
+            ticket["message"] = "Successfully joined, please await your turn"
+            print(ticket["message"])
+        return ticket
+
+    def leave_matchmaking(self):
+        """Give up a matchmaking ticket still waiting for an opponent, so the server
+        does not pair the next player with a client that has gone"""
+        if not self.ticket:
+            return
+        try:
+            self.session.delete(
+                self._url(f"/matchmaking/{self.ticket}"), timeout=self._timeout(0)
+            )
+        except requests.exceptions.RequestException:
+            pass
+        self.ticket = None
 
     def initialise_player_details(self):
-        reg_url = CONNECT5_SERVER + "/initdetails"
-        player_info = {"name": self.name}
-        req = self._make_post_request(reg_url, player_info)
+        reg_url = self._game_url("/initdetails")
+        player_info = {"name": self.name, "wait": MATCHMAKING_WAIT}
+        req = self._make_post_request(reg_url, player_info, wait=MATCHMAKING_WAIT)
+        while req.json().get("pending"):
+            req = self._make_post_request(reg_url, player_info, wait=MATCHMAKING_WAIT)
         self.symbol = req.json()["symbol"]
         return req.json()
 
     def is_client_active_player(self):
-        reg_url = f"{CONNECT5_SERVER}/activeplayer/{self.name}"
-        req = self._make_get_request(reg_url)
-        return req.json()["active_player"]
+        return self.get_state()["active_player"] == self.name
 
-    def make_move(self):
+    def choose_column(self):
+        """Prompt for the column (1-9) to play, or let the engine choose it"""
+        if not self.engine:
+            return input(f"It's your turn {self.name}, please enter column (1-9):")
+        if not self.board:
+            self.load_board()
+        column = self.engine.choose_move(self.board, self.symbol) + 1
+        print(f"{self.name} plays column {column}")
+        return str(column)
+
+    def make_move(self, version=None):
+        """Play a column. If the game's `version` is known the move is only made at
+        that version, so a lost response can be retried without playing twice."""
         valid_move = False
         while not valid_move:
-            column = input(f"It's your turn {self.name}, please enter column (1-9):")
+            column = self.choose_column()
 
             valid_column = True
             try:
@@ -102,10 +243,16 @@ class Client:
                 print("Column must be an integer between 1 and 9!")
                 continue
 
-            reg_url = CONNECT5_SERVER + "/makemove"
+            reg_url = self._game_url("/makemove")
             # Easiest to subtract one from the column value here and use the indices of the 2D array
             # on the server
-            move_info = {"column": str(int(column) - 1), "symbol": self.symbol}
+            move_info = {
+                "column": str(int(column) - 1),
+                "symbol": self.symbol,
+                "name": self.name,
+            }
+            if version is not None:
+                move_info["version"] = version
             req = self._make_post_request(reg_url, move_info)
 
             # All attempts to access a key in a dictionary should be wrapped in a try except block
@@ -113,53 +260,154 @@ class Client:
             valid_move = req.json()["success"]
             if not valid_move:
                 print(req.json()["reason"])
+                if "version" in req.json():
+                    # The game moved on without this player, so leave it to the
+                    # caller to catch up
+                    return req.json()["winner"]
+        if self.board:
+            self.board.drop(int(column) - 1, self.symbol)
         return req.json()["winner"]
 
+    def subscribe(self, since=0):
+        """Yield (event_type, data) pairs from the game's event stream as the server
+        pushes them, starting after the event with ID `since`"""
+        reg_url = self._game_url("/events")
+        # The server sends a keep-alive comment at least every 15 seconds, so only a
+        # stream that stays silent for longer than that times out
+        req = self._make_get_request(reg_url, {"since": since}, stream=True, wait=15)
+        event_type = None
+        data = {}
+        # Server-Sent Events are blocks of "field: value" lines ended by a blank line.
+        # Lines starting with a colon are keep-alive comments
+        for line in req.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event_type = line[len("event:") :].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:") :])
+            elif not line and event_type:
+                yield event_type, data
+                event_type = None
+                data = {}
+
+    def wait_for_change(self, since):
+        """Long-poll until the game state is newer than version `since`"""
+        reg_url = self._game_url("/wait")
+        return self._make_get_request(
+            reg_url, {"since": since, "timeout": STATE_WAIT}, wait=STATE_WAIT
+        ).json()
+
+    def take_turn(self, state=None):
+        self.print_board(state)
+        self.make_move(state["version"] if state else None)
+        self.print_board()
+
     def winner_exists(self):
-        reg_url = CONNECT5_SERVER + "/winner"
-        req = self._make_get_request(reg_url)
-        return req.json()["winner"] if "winner" in req.json() else False
+        return self.get_state().get("winner", False)
+
+
+def print_result(client, winning_symbol):
+    if winning_symbol is None:
+        client.print_board()
+        print(f"The board is full, it's a draw {client.name}.")
+    elif winning_symbol == client.symbol:
+        print(f"You won! Congratulations {client.name}.")
+    else:
+        client.print_board()
+        print(f"You lost. Commiserations {client.name}.")
+
+
+def play_with_event_stream(client, since):
+    """Rather than polling for its turn the client follows the game's event stream,
+    which the server pushes to as soon as the opponent moves"""
+    for event_type, data in client.subscribe(since):
+        if event_type == "move":
+            client.apply_move(data["column"], data["row"], data["symbol"])
+        elif event_type == "reset":
+            client.load_board()
+        elif event_type == "win":
+            print_result(client, data["symbol"])
+            break
+        elif event_type == "draw":
+            print_result(client, None)
+            break
+        elif event_type == "sync":
+            # Events were missed, so catch up from the whole state instead
+            state = client.get_state()
+            client.load_board()
+            if state["winner"] or state["draw"]:
+                print_result(client, state["winning_symbol"])
+                break
+            client.set_active_player(state["active_player"] == client.name)
+            if client.is_active_player():
+                client.take_turn()
+        elif event_type == "turn":
+            client.set_active_player(data["active_player"] == client.name)
+            if client.is_active_player():
+                client.take_turn()
+            else:
+                print("Please wait for your turn...")
+
+
+def play_with_long_poll(client, since):
+    """Each /wait request blocks on the server until the game changes, so the client
+    makes one request per opponent move rather than polling on a timer"""
+    version = since
+    while True:
+        state = client.wait_for_change(version)
+        version = state["version"]
+        if state["winner"] or state["draw"]:
+            print_result(client, state["winning_symbol"])
+            break
+        # Check the turn even when /wait timed out without a change, as it may
+        # already have been this player's turn when the wait began
+        if state["active_player"] == client.name:
+            # Without the event stream the local board is stale, so the engine
+            # replays the current move list before choosing
+            client.board = None
+            client.take_turn(state)
+            print("Please wait for your turn...")
 
 
 if __name__ == "__main__":
-    client = Client()
+    parser = argparse.ArgumentParser(description="Play a game of Connect 5")
+    parser.add_argument(
+        "--bot", metavar="NAME", help="let the built-in engine play under this name"
+    )
+    parser.add_argument(
+        "--book",
+        help="an opening book for the engine to play early moves from without "
+        "searching, built with python -m connect_server.book",
+    )
+    args = parser.parse_args()
+
+    engine = None
+    if args.bot:
+        engine = Engine(book=OpeningBook(args.book) if args.book else None)
+    client = Client(engine=engine)
     try:
         # Client checks is it possible for it to join a game
-        response = client.join_game()
+        response = client.join_game(args.bot)
         if "success" not in response:
             print("Malformed response from the server")
         elif not response["success"]:
             print(response["message"])
         else:
-            # Client prompts the server to assign an initial active player (who goes first). At this
-            # point the client must wait for a second player
+            # Client prompts the server to assign an initial active player (who goes first). The
+            # matchmaking queue has already paired the client with a second player
             player_details = client.initialise_player_details()
             client.set_active_player(player_details["active_player"])
             client.set_symbol(player_details["symbol"])
 
-            # While there is not a winner keep playing
-            while not client.winner_exists():
-                # While you are not the active player keep polling for your turn
-                while not client.is_active_player():
-                    time.sleep(TURN_POLL_INTERVAL)
-                    client.set_active_player(client.is_client_active_player())
-
-                    # If there is a winner decided before you make your turn then you have lost
-                    if client.winner_exists():
-                        client.print_board()
-                        print(f"You lost. Commiserations {client.name}.")
-                # If you have not lost then it now it is your turn. If you have lost, the client
-                # will exit the loop and the main function finishes
-                if not client.winner_exists():
-                    client.print_board()
-                    client.make_move()
-                    client.print_board()
-
-                    # If there is a winner straight after your move then you have won
-                    if client.winner_exists():
-                        print(f"You won! Congratulations {client.name}.")
-                    else:
-                        print("Please wait for your turn...")
-                    client.set_active_player(False)
+            if USE_EVENT_STREAM:
+                client.load_board()
+            if client.is_active_player():
+                client.take_turn()
+            if USE_EVENT_STREAM:
+                play_with_event_stream(client, player_details["event_id"])
+            else:
+                play_with_long_poll(client, player_details["version"])
     except errors.PlayerRegistrationError as e:
         print(e)
+    finally:
+        client.leave_matchmaking()
+        client.close()
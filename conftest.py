@@ -0,0 +1,139 @@
+import asyncio
+import queue
+import threading
+import urllib.parse
+from json import dumps, loads
+
+import pytest
+from connect_server import create_app
+from connect_server.asgi import create_asgi_app
+
+
+class AsgiTestResponse:
+    """The response to a request made with `AsgiTestClient`.
+
+    The app runs on its own thread and event loop, so a streamed response can be read
+    chunk by chunk from `response` and then closed, like an unbuffered Flask response.
+
+    Attributes:
+        status_code (int): The HTTP status of the response.
+        response (iterator[bytes]): The chunks of the body as they are sent.
+    """
+
+    def __init__(self, app, scope, body):
+        self.status_code = None
+        self._chunks = queue.Queue()
+        self._started = threading.Event()
+        self._loop = None
+        self._disconnect = None
+        self._data = None
+        self._thread = threading.Thread(
+            target=asyncio.run, args=(self._run(app, scope, body),), daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+    async def _run(self, app, scope, body):
+        self._loop = asyncio.get_running_loop()
+        self._disconnect = asyncio.Event()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # Nothing more to send, so wait like a client holding the connection open
+            await self._disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                self.status_code = message["status"]
+                self._started.set()
+            else:
+                self._chunks.put(message.get("body", b""))
+
+        try:
+            await app(scope, receive, send)
+        finally:
+            self._chunks.put(None)
+            self._started.set()
+
+    @property
+    def response(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = b"".join(self.response)
+        return self._data
+
+    @property
+    def json(self):
+        return loads(self.data)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._disconnect.set)
+        self._thread.join()
+
+
+class AsgiTestClient:
+    """Makes requests against an ASGI app without a server, mirroring the parts of
+    Flask's test client the tests use"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get(self, path, **options):
+        return self.open("GET", path, **options)
+
+    def post(self, path, **options):
+        return self.open("POST", path, **options)
+
+    def delete(self, path, **options):
+        return self.open("DELETE", path, **options)
+
+    def open(self, method, path, json=None, headers=None, buffered=True):
+        path, _, query_string = path.partition("?")
+        headers = {"Content-Type": "application/json", **(headers or {})}
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": urllib.parse.unquote(path),
+            "query_string": query_string.encode(),
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+        body = dumps(json).encode() if json is not None else b""
+        response = AsgiTestResponse(self.app, scope, body)
+        if buffered:
+            response.data
+        return response
+
+
+def _test_client(app):
+    if hasattr(app, "test_client"):
+        return app.test_client()
+    return AsgiTestClient(app)
+
+
+# Every test using the client runs against both the Flask app and the asyncio (ASGI)
+# app
+@pytest.fixture(params=[create_app, create_asgi_app])
+def client(request):
+    app = request.param()
+    app.config["TESTING"] = True
+    with _test_client(app) as client:
+        yield client
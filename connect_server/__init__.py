@@ -1,315 +1,536 @@
+import atexit
+import contextlib
+import math
+import os
+import signal
+import threading
 import time
-from flask import Flask, request
-
-# Rather than global variables a database with SQLAlchemy could be used for persistence
-# beyond the current session
-global board
-global participants
-
-# I'd like to store these constants in a config file that could be shared with the client
-FIRST_INDEX = 0
-NUM_ROWS = 6
-NUM_COLS = 9
-NUM_TO_CONNECT = 5
-SYMBOL_1 = "X"
-SYMBOL_2 = "O"
-JOIN_SLEEP = 1
-
-
-class Player:
-    """Represents a single Player that has joined a game.
-
-    Attributes:
-        name (str): The display name chosen by the player.
-    """
-
-    def __init__(self, name):
-        self.name = name
-
-    def get_name(self):
-        return self.name
-
-    def __str__(self):
-        return self.get_name()
-
-    def equals(self, other_player):
-        return str(self) == str(other_player)
-
-
-class Participants:
-    """Represents the two active players in a game as well as which player is
-    currently taking their go.
-
-    Attributes:
-        player1 (Player): The first Player object to join the game.
-        player2 (Player): The second Player object to join the game.
-        active_player (Player): The Player whose go it is.
-
-    """
-
-    def __init__(self, player1=None, player2=None):
-        self.player1 = player1
-        self.player2 = player2
-        self.active_player = None
-
-    def get_player1(self):
-        return self.player1
-
-    def get_player2(self):
-        return self.player2
-
-    def get_players_string(self):
-        return f"[{self.player1}, {self.player2}]"
-
-    def get_active_player(self):
-        return self.active_player
-
-    def set_active_player(self, player):
-        self.active_player = player
-
-    def add_player(self, player):
-        if not self.get_player1():
-            self.player1 = player
-            return True
-        elif not self.get_player2():
-            self.player2 = player
-            return True
-        else:
-            print("No room to add player")
-            return False
-
-    def reset_participants(self):
-        self.player1 = None
-        self.player2 = None
-        self.active_player = None
-
-    def is_full(self):
-        return self.player1 and self.player2
-
-    def get_player_total(self):
-        total = 0
-        if self.player1:
-            total += 1
-        if self.player2:
-            total += 1
-        return total
-
-    def switch_active_player(self):
-        if not self.active_player:
-            print("Active player not selected. Players could not be switched")
-        elif not (self.player1 and self.player2):
-            print(
-                "Two players need to be present to switch. Players could not be switched"
-            )
-        elif self.active_player == self.player1:
-            self.active_player = self.player2
-        else:
-            self.active_player = self.player1
-        return self.active_player
-
-    def name_in_use(self, name):
-        if self.player1 and name == self.player1.get_name():
-            return True
-        elif self.player2 and name == self.player2.get_name():
-            return True
-        else:
-            return False
 
+from flask import Flask, Response, g, request, stream_with_context
+from connect_server.archive import ARCHIVE_FORMATS, finished_records
+from connect_server.board import Board
+from connect_server.constants import (
+    FIRST_INDEX,
+    JOIN_TIMEOUT,
+    NUM_COLS,
+    NUM_ROWS,
+    NUM_TO_CONNECT,
+    SYMBOL_1,
+    SYMBOL_2,
+)
+from connect_server.events import STREAM_KEEPALIVE
+from connect_server.game import (
+    BOARD_MEDIA_TYPES,
+    BOARD_TEXT,
+    DEFAULT_GAME_ID,
+    Game,
+    GameRegistry,
+)
+from connect_server.matchmaking import Matchmaker
+from connect_server.metrics import METRICS_MEDIA_TYPE, Metrics
+from connect_server.participants import Participants, Player
+from connect_server.persistence import FSYNC_INTERVAL, SNAPSHOT_INTERVAL, MoveLog
+from connect_server.profiling import PROFILE_LIMIT, PROFILE_SORT, Profiler
+from connect_server.reaper import REAP_INTERVAL, Reaper
+from connect_server.storage import MemoryStore, SqliteStore
+
+# The most scripted games one /games/simulate request may play
+MAX_SIMULATED_GAMES = 100
+
+# Games are kept in a dict in this process unless CONNECT5_DATABASE names a SQLite
+# database shared by every worker process
+games = GameRegistry()
+matchmaker = Matchmaker(games)
+# Started by the first app created in a process if abandoned games are to be reaped
+reaper = None
+
+
+def _enable_database():
+    """Keep games in the SQLite database at CONNECT5_DATABASE, if set, so every worker
+    process on the host plays the same games"""
+    path = os.environ.get("CONNECT5_DATABASE")
+    if path and not games.store.shared:
+        games.store = SqliteStore(path)
+
+
+def _enable_persistence():
+    """Recover and journal every game in the CONNECT5_DATA_DIR directory, if set, so
+    games survive a restart. Only the first app created in a process does this."""
+    directory = os.environ.get("CONNECT5_DATA_DIR")
+    if not directory or games.journal:
+        return
+    journal = MoveLog(
+        directory,
+        fsync_interval=float(os.environ.get("CONNECT5_FSYNC_INTERVAL", FSYNC_INTERVAL)),
+        snapshot_interval=float(
+            os.environ.get("CONNECT5_SNAPSHOT_INTERVAL", SNAPSHOT_INTERVAL)
+        ),
+    )
+    journal.recover(games)
+    atexit.register(journal.close)
+
+
+def _enable_eviction():
+    """Cap the games served at CONNECT5_MAX_GAMES, if set, and reap abandoned games if
+    CONNECT5_GAME_TTL or CONNECT5_PLAYER_TTL is set. Only the first app created in a
+    process starts the reaper."""
+    global reaper
+    max_games = os.environ.get("CONNECT5_MAX_GAMES")
+    if max_games:
+        games.max_games = int(max_games)
+    game_ttl = os.environ.get("CONNECT5_GAME_TTL")
+    player_ttl = os.environ.get("CONNECT5_PLAYER_TTL")
+    if reaper or not (game_ttl or player_ttl):
+        return
+    reaper = Reaper(
+        games,
+        matchmaker,
+        game_ttl=float(game_ttl) if game_ttl else None,
+        player_ttl=float(player_ttl) if player_ttl else None,
+        interval=float(os.environ.get("CONNECT5_REAP_INTERVAL", REAP_INTERVAL)),
+    )
+    reaper.start()
+    atexit.register(reaper.stop)
+
+
+def _enable_metrics():
+    """Record request metrics for /metrics if CONNECT5_METRICS is set, else None"""
+    if os.environ.get("CONNECT5_METRICS", "0") in ("", "0"):
+        return None
+    return Metrics()
+
+
+def _instrument(app, metrics):
+    """Time every request by route and serve the metrics at /metrics"""
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        metrics.observe_request(
+            request.url_rule.rule if request.url_rule else None,
+            request.method,
+            response.status_code,
+            time.perf_counter() - g.request_start,
+        )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        """Get the request metrics and the games being played for Prometheus"""
+        return Response(metrics.render(games, matchmaker), mimetype=METRICS_MEDIA_TYPE)
+
+
+def _enable_profiling():
+    """Profile the CONNECT5_PROFILE_RATE fraction of requests if set, else None.
+    SIGUSR1 then writes the stats to CONNECT5_PROFILE_DIR."""
+    rate = float(os.environ.get("CONNECT5_PROFILE_RATE") or 0)
+    if rate <= 0:
+        return None
+    profiler = Profiler(rate, os.environ.get("CONNECT5_PROFILE_DIR", "."))
+    # Signal handlers can only be installed from the main thread
+    if (
+        hasattr(signal, "SIGUSR1")
+        and threading.current_thread() is threading.main_thread()
+    ):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.dump())
+    return profiler
+
+
+def _profile_requests(app, profiler):
+    """Profile a sample of requests by route and serve the stats at /admin/profile"""
+
+    @app.before_request
+    def start_profile():
+        g.profile = profiler.start()
+
+    @app.teardown_request
+    def stop_profile(exception):
+        profile = g.pop("profile", None)
+        if profile:
+            profiler.stop(profile, request.url_rule.rule if request.url_rule else None)
+
+    @app.route("/admin/profile", methods=["GET"])
+    def get_profile():
+        """Get the profile of the sampled requests of every route, or just "route", as
+        text sorted by "sort" and cut to "limit" functions per route"""
+        return Response(
+            profiler.report(
+                request.args.get("route"),
+                request.args.get("sort", PROFILE_SORT),
+                request.args.get("limit", PROFILE_LIMIT, type=int),
+            ),
+            mimetype="text/plain",
+        )
 
-board = [[None for col in range(NUM_COLS)] for row in range(NUM_ROWS)]
-participants = Participants()
+    @app.route("/admin/profile", methods=["DELETE"])
+    def clear_profile():
+        """Discard the profiles gathered so far"""
+        profiler.clear()
+        return {"success": True}
+
+
+def _scoped_route(app, rule, **options):
+    """Register a view both at its original unscoped URL, which plays the default game,
+    and under /games/<game_id> for every other game"""
+
+    def decorator(view):
+        app.route(rule, defaults={"game_id": DEFAULT_GAME_ID}, **options)(view)
+        app.route(f"/games/<game_id>{rule}", **options)(view)
+        return view
+
+    return decorator
+
+
+def _wait_seconds(value):
+    """Clamp a client supplied wait time so no request can hold a worker for longer
+    than JOIN_TIMEOUT. Anything that is not a number waits the full JOIN_TIMEOUT."""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return JOIN_TIMEOUT
+    if math.isnan(seconds):
+        return JOIN_TIMEOUT
+    return min(max(seconds, 0), JOIN_TIMEOUT)
+
+
+def _batch_moves(moves):
+    """Check the moves sent to /makemoves are a list of objects each with an integer
+    "column", getting them with their columns as integers, or None if they are not"""
+    if not isinstance(moves, list):
+        return None
+    try:
+        return [dict(move, column=int(move["column"])) for move in moves]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _scripted_game(script):
+    """Check a game sent to /games/simulate, getting the arguments to play it with"""
+    moves = script.get("moves", [])
+    players = script.get("players")
+    if not isinstance(moves, list) or not isinstance(players, (list, type(None))):
+        raise TypeError("The moves and players must be lists")
+    return {
+        "moves": [int(col) for col in moves],
+        "players": players,
+        "rows": int(script.get("rows", NUM_ROWS)),
+        "cols": int(script.get("cols", NUM_COLS)),
+        "connect": int(script.get("connect", NUM_TO_CONNECT)),
+    }
+
+
+def _simulate_games(scripts):
+    """Play out a list of scripted games for /games/simulate, each with optional
+    "rows", "cols", "connect" and "players" and the "moves" to play as columns"""
+    if not isinstance(scripts, list) or len(scripts) > MAX_SIMULATED_GAMES:
+        return {
+            "success": False,
+            "message": f"Send a list of at most {MAX_SIMULATED_GAMES} games",
+        }, 400
+    try:
+        scripts = [_scripted_game(script) for script in scripts]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return {
+            "success": False,
+            "message": "Send each game as an object whose moves are a list of columns",
+        }, 400
+    results = []
+    for script in scripts:
+        try:
+            results.append(games.play_scripted_game(**script))
+        except ValueError as e:
+            results.append({"success": False, "message": str(e)})
+    return {"success": True, "games": results}
+
+
+def _event_id(value):
+    """Parse the Last-Event-ID header of a reconnecting stream, replaying every
+    retained event if it is missing or malformed"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _board_format(board_format, accept):
+    """Choose the board format from the "format" query parameter, falling back to the
+    Accept header and then the bracketed text rendering"""
+    if board_format:
+        return board_format
+    for media_type in (accept or "").split(","):
+        media_type = media_type.split(";")[0].strip()
+        if media_type in BOARD_MEDIA_TYPES:
+            return BOARD_MEDIA_TYPES[media_type]
+    return BOARD_TEXT
+
+
+def _game_not_found():
+    return {"success": False, "message": "Game not found"}, 404
 
 
 def create_app():
     app = Flask(__name__)
+    _enable_database()
+    # The cap on games applies to the games recovered too
+    _enable_eviction()
+    _enable_persistence()
+    metrics = _enable_metrics()
+    if metrics:
+        _instrument(app, metrics)
+    profiler = _enable_profiling()
+    if profiler:
+        _profile_requests(app, profiler)
+    join_wait = metrics.join_wait if metrics else contextlib.nullcontext
+
+    @app.route("/games", methods=["POST"])
+    def create_game():
+        """Create a new game, optionally choosing the board dimensions with "rows",
+        "cols" and "connect" """
+        details = request.get_json(silent=True) or {}
+        try:
+            game = games.create_game(
+                rows=int(details.get("rows", NUM_ROWS)),
+                cols=int(details.get("cols", NUM_COLS)),
+                connect=int(details.get("connect", NUM_TO_CONNECT)),
+            )
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        return {"success": True, "game_id": game.game_id}
+
+    @app.route("/games", methods=["GET"])
+    def list_games():
+        """Get a summary of every game being served"""
+        return {"success": True, "games": games.list_games()}
+
+    @app.route("/admin/memory", methods=["GET"])
+    def get_memory():
+        """Get the estimated memory held by the games being served"""
+        return {"success": True, **games.memory_report()}
+
+    @app.route("/games/simulate", methods=["POST"])
+    def simulate_games():
+        """Create and play out every scripted game in "games" in one request"""
+        return _simulate_games(request.json.get("games"))
+
+    @app.route("/games/export", methods=["GET"])
+    def export_games():
+        """Stream every finished game as an archive in the "format" query parameter,
+        "jsonl" (the default) or "binary" """
+        archive_format = request.args.get("format", "jsonl")
+        if archive_format not in ARCHIVE_FORMATS:
+            return {"success": False, "message": "Unknown archive format"}, 400
+        media_type, extension, encode = ARCHIVE_FORMATS[archive_format]
+        return Response(
+            encode(finished_records(games)),
+            mimetype=media_type,
+            headers={"Content-Disposition": f"attachment; filename=games.{extension}"},
+        )
 
-    @app.route("/board", methods=["GET"])
-    def get_board():
-        """Get a string representation of the current state of the game board"""
-        result_string = ""
-        for row in reversed(range(NUM_ROWS)):
-            for col in range(NUM_COLS):
-                result_string += (
-                    "[" + (" " if board[row][col] is None else board[row][col]) + "]"
-                )
-            result_string += "\n"
-        return {"success": True, "board": result_string}
-
-    @app.route("/players", methods=["GET"])
-    def get_players():
-        """Get a string representation of the players involved in the game"""
-        result = participants.get_players_string()
-        return {"success": True, "players": result}
-
-    @app.route("/register", methods=["POST"])
-    def register_new_player():
-        """Register a new player to the game using the user supplied name"""
-        global participants
-
-        # If the board is still full from a previously won game then reset the game
-        # before attempmting to add new players
-        if check_for_winner()["winner"]:
-            reset_game()
-
-        if participants.is_full():
-            return {"success": False, "message": "Too many players"}
-
-        # If there are less than 2 players but moves are on the board then also reset
-        # the game as something has gone wrong.
-        if not _board_is_empty():
-            reset_game()
+    @app.route("/games/<game_id>/join", methods=["POST"])
+    def join_game(game_id):
+        """Join an existing game using the user supplied name"""
+        return register_new_player(game_id)
 
+    @app.route("/matchmaking", methods=["POST"])
+    def join_matchmaking():
+        """Queue to be paired with the next player into a new game. The response is
+        either matched with a game ID or pending with a ticket to check later. "wait"
+        optionally sets how many seconds to wait for an opponent before returning."""
         name = request.json.get("name")
         if not name:
             return {"success": False, "message": "You must supply a name to register"}
-        if participants.name_in_use(name):
-            return {
-                "success": False,
-                "message": "Name is already in use, please choose another",
-            }
+        ticket = matchmaker.enqueue(name)
+        return matchmaker.wait(ticket, _wait_seconds(request.json.get("wait", 0)))
+
+    @app.route("/matchmaking/<ticket_id>", methods=["GET"])
+    def check_matchmaking(ticket_id):
+        """Check on a matchmaking ticket, long-polling for up to "wait" seconds"""
+        ticket = matchmaker.get_ticket(ticket_id)
+        if not ticket:
+            return {"success": False, "message": "Ticket not found"}, 404
+        return matchmaker.wait(ticket, _wait_seconds(request.args.get("wait", 0)))
+
+    @app.route("/matchmaking/<ticket_id>", methods=["DELETE"])
+    def leave_matchmaking(ticket_id):
+        """Leave the matchmaking queue"""
+        return {"success": matchmaker.cancel(ticket_id)}
+
+    @_scoped_route(app, "/board", methods=["GET"])
+    def get_board(game_id):
+        """Get a string representation of the current state of the game board. The
+        "format" query parameter or Accept header selects a compact format instead"""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        return game.get_board(
+            _board_format(request.args.get("format"), request.headers.get("Accept"))
+        )
 
-        return {
-            "success": participants.add_player(Player(name)),
-            "message": "Successfully joined, please await your turn",
-        }
+    @_scoped_route(app, "/players", methods=["GET"])
+    def get_players(game_id):
+        """Get a string representation of the players involved in the game"""
+        game = games.get_game(game_id)
+        return game.get_players() if game else _game_not_found()
 
-    @app.route("/activeplayer/<name>", methods=["GET"])
-    def is_active_player(name):
+    @_scoped_route(app, "/register", methods=["POST"])
+    def register_new_player(game_id):
+        """Register a new player to the game using the user supplied name"""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        return game.register_new_player(request.json.get("name"))
+
+    @_scoped_route(app, "/activeplayer/<name>", methods=["GET"])
+    def is_active_player(game_id, name):
         """Get a boolean to represent whether the provider player name is the active
         player or not i.e. is it the supplied player's turn to make a move.
 
         Attributes:
-            name (str): The name of the player being compared to the global active player.
+            name (str): The name of the player being compared to the active player.
         """
-        if participants and participants.get_active_player():
-            return {
-                "success": True,
-                "active_player": name == participants.get_active_player().name,
-            }
-        else:
-            return {"success": False, "active_player": False}
-
-    @app.route("/initdetails", methods=["POST"])
-    def initialise_player_details():
+        game = games.get_game(game_id)
+        return game.is_active_player(name) if game else _game_not_found()
+
+    @_scoped_route(app, "/initdetails", methods=["POST"])
+    def initialise_player_details(game_id):
         """Assign the initial active player for the game and assign symbols to both players"""
-        while not participants.is_full():
-            time.sleep(JOIN_SLEEP)
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        with join_wait():
+            return game.initialise_player_details(
+                request.json.get("name"),
+                timeout=_wait_seconds(request.json.get("wait")),
+            )
 
-        name = request.json.get("name")
-        current_player = Player(name)
-        player_1 = participants.get_player1()
-        participants.set_active_player(player_1)
-
-        if player_1.equals(current_player):
-            active_player = True
-            symbol = SYMBOL_1
-        else:
-            active_player = False
-            symbol = SYMBOL_2
-        return {
-            "success": True,
-            "active_player": active_player,
-            "symbol": symbol,
-        }
-
-    @app.route("/makemove", methods=["POST"])
-    def make_move():
-        global board
+    @_scoped_route(app, "/makemove", methods=["POST"])
+    def make_move(game_id):
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
         column = int(request.json.get("column"))
         symbol = request.json.get("symbol")
+        return game.make_move(
+            column,
+            symbol,
+            name=request.json.get("name"),
+            expected_version=request.json.get("version"),
+        )
 
-        # Initialise the row to the first available row in that column
-        row = 0
-        while row < NUM_ROWS and board[row][column] is not None:
-            row += 1
-
-        if row == NUM_ROWS:
+    @_scoped_route(app, "/makemoves", methods=["POST"])
+    def make_moves(game_id):
+        """Make a list of moves in order as one change to the game, stopping at the
+        first move that cannot be made or a win, and get the state of the game"""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        moves = _batch_moves(request.json.get("moves", []))
+        if moves is None:
             return {
                 "success": False,
-                "reason": "That column is full. Choose another column",
-                "winner": False,
-            }
+                "message": "Send the moves as a list of objects with a column",
+            }, 400
+        return game.make_moves(moves, expected_version=request.json.get("version"))
 
-        board[row][column] = symbol
-        participants.switch_active_player()
-        return {"success": True, "winner": check_for_winner()["winner"]}
-
-    @app.route("/winner", methods=["GET"])
-    def check_for_winner():
+    @_scoped_route(app, "/winner", methods=["GET"])
+    def check_for_winner(game_id):
         """Get whether or not the board currently contains a winner"""
-        is_winner = (
-            _check_rows_for_winner()
-            or _check_cols_for_winner()
-            or _check_upward_diagonal_for_winner()
-            or _check_downward_diagonal_for_winner()
+        game = games.get_game(game_id)
+        return game.check_for_winner() if game else _game_not_found()
+
+    @_scoped_route(app, "/state", methods=["GET"])
+    def get_state(game_id):
+        """Get the board, active player, winner, move count, players and version of
+        the game in a single response"""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        return app.response_class(game.get_state_json(), mimetype="application/json")
+
+    @_scoped_route(app, "/wait", methods=["GET"])
+    def wait_for_change(game_id):
+        """Long-poll until the game's version is newer than the "since" query
+        parameter, then get the board, active player and winner. Returns after at most
+        "timeout" seconds with "changed" set to False if nothing happened."""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        return game.wait_for_change(
+            request.args.get("since", 0, type=int),
+            timeout=_wait_seconds(request.args.get("timeout")),
+        )
+
+    @_scoped_route(app, "/events", methods=["GET"])
+    def stream_events(game_id):
+        """Stream the game's moves, turn changes, wins and resets as Server-Sent
+        Events. Events after the "since" query parameter, or the Last-Event-ID header
+        of a reconnecting client, are replayed first."""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        event_id = request.args.get(
+            "since", _event_id(request.headers.get("Last-Event-ID")), type=int
+        )
+
+        def generate(event_id):
+            while True:
+                events = game.wait_for_events(event_id, timeout=STREAM_KEEPALIVE)
+                if not events:
+                    yield ": keep-alive\n\n"
+                for event in events:
+                    event_id = event.event_id
+                    yield event.encoded
+
+        return Response(
+            stream_with_context(generate(event_id)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    @_scoped_route(app, "/spectate", methods=["GET"])
+    def spectate(game_id):
+        """Watch the game as Server-Sent Events without playing in it. The stream
+        starts with a "snapshot" event of the whole game and then sends every event as
+        it is published, with a fresh snapshot if the spectator falls behind."""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+
+        def generate():
+            with game.spectating():
+                event = game.get_snapshot_event()
+                event_id = event.event_id
+                yield event.encoded
+                while True:
+                    events = game.wait_for_events(event_id, timeout=STREAM_KEEPALIVE)
+                    if not events:
+                        yield ": keep-alive\n\n"
+                    for event in events:
+                        if event.event_type == "sync":
+                            event = game.get_snapshot_event()
+                        event_id = event.event_id
+                        yield event.encoded
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    @_scoped_route(app, "/reset", methods=["GET"])
+    def reset_game(game_id):
+        """Reset the game, optionally choosing new board dimensions with the "rows",
+        "cols" and "connect" query parameters"""
+        game = games.get_game(game_id)
+        if not game:
+            return _game_not_found()
+        return game.reset(
+            rows=request.args.get("rows", type=int),
+            cols=request.args.get("cols", type=int),
+            connect=request.args.get("connect", type=int),
         )
-        return {"success": True, "winner": is_winner}
-
-    def _check_rows_for_winner():
-        global board
-        for row in range(NUM_ROWS):
-            for col in range(NUM_COLS - (NUM_TO_CONNECT - 1)):
-                if board[row][col] and (
-                    board[row][col]
-                    == board[row][col + 1]
-                    == board[row][col + 2]
-                    == board[row][col + 3]
-                    == board[row][col + 4]
-                ):
-                    return True
-        return False
-
-    def _check_cols_for_winner():
-        global board
-        for col in range(NUM_COLS):
-            for row in range(NUM_ROWS - (NUM_TO_CONNECT - 1)):
-                if board[row][col] and (
-                    board[row][col]
-                    == board[row + 1][col]
-                    == board[row + 2][col]
-                    == board[row + 3][col]
-                    == board[row + 4][col]
-                ):
-                    return True
-        return False
-
-    def _check_upward_diagonal_for_winner():
-        global board
-        for row in range(NUM_ROWS - (NUM_TO_CONNECT - 1)):
-            for col in range(NUM_COLS - (NUM_TO_CONNECT - 1)):
-                if board[row][col] and (
-                    board[row][col]
-                    == board[row + 1][col + 1]
-                    == board[row + 2][col + 2]
-                    == board[row + 3][col + 3]
-                    == board[row + 4][col + 4]
-                ):
-                    return True
-        return False
-
-    def _check_downward_diagonal_for_winner():
-        global board
-        for row in range(NUM_ROWS - (NUM_ROWS - (NUM_TO_CONNECT - 1)), NUM_ROWS):
-            for col in range(FIRST_INDEX, NUM_COLS - (NUM_COLS - (NUM_TO_CONNECT - 1))):
-                if board[row][col] and (
-                    board[row][col]
-                    == board[row - 1][col + 1]
-                    == board[row - 2][col + 2]
-                    == board[row - 3][col + 3]
-                    == board[row - 4][col + 4]
-                ):
-                    return True
-        return False
-
-    @app.route("/reset", methods=["GET"])
-    def reset_game():
-        global board
-        global participants
-        board = [[None for col in range(NUM_COLS)] for row in range(NUM_ROWS)]
-        participants.reset_participants()
-        return {"success": True, "message": "Game reset"}
-
-    def _board_is_empty():
-        return board == [[None for col in range(NUM_COLS)] for row in range(NUM_ROWS)]
 
     return app
@@ -0,0 +1,370 @@
+"""A computer player that searches for the best column to drop into"""
+
+import random
+import time
+
+# The default time in seconds the engine may spend choosing a single move
+DEFAULT_TIME_BUDGET = 0.03
+# The deepest the engine searches however much time is left, in plies
+DEFAULT_MAX_DEPTH = 20
+# The number of entries in the transposition table. Must be a power of two
+DEFAULT_TABLE_SIZE = 1 << 16
+# Scores above this are forced wins, shortened by the number of plies to the win
+WIN_SCORE = 1_000_000
+# How often, in nodes searched, the engine checks whether it has run out of time
+TIME_CHECK_INTERVAL = 256
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+
+    def popcount(value):
+        return bin(value).count("1")
+
+
+class SearchTimeout(Exception):
+    """The time budget for a move ran out part way through a search"""
+
+
+class TranspositionTable:
+    """A fixed size table of previously searched positions keyed by Zobrist hash.
+
+    Each hash maps to a single slot. A new result replaces the stored one if it comes
+    from a deeper search or the stored one is left over from an earlier move, so the
+    table never grows and the most useful results are kept.
+
+    Attributes:
+        size (int): The number of slots in the table.
+        generation (int): Increased for every move the engine chooses, used to age out
+            results from earlier moves.
+    """
+
+    def __init__(self, size=DEFAULT_TABLE_SIZE):
+        if size & (size - 1):
+            raise ValueError("Transposition table size must be a power of two")
+        self.size = size
+        self.generation = 0
+        self._slots = [None] * size
+
+    def new_search(self):
+        self.generation += 1
+
+    def lookup(self, key):
+        entry = self._slots[key & (self.size - 1)]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & (self.size - 1)
+        entry = self._slots[index]
+        if entry is None or entry[5] != self.generation or depth >= entry[1]:
+            self._slots[index] = (key, depth, score, flag, move, self.generation)
+
+
+class Engine:
+    """Chooses moves with a negamax search with alpha-beta pruning.
+
+    Columns are tried centre first, after the best move remembered in the
+    transposition table. Iterative deepening searches one ply deeper at a time until
+    the time budget runs out, then plays the best move of the deepest finished search.
+
+    Positions are held as two bitmasks laid out like `Board`: the stones of the player
+    to move and every occupied cell.
+
+    Attributes:
+        time_budget (float): The seconds the engine may spend on each move, or None to
+            always search to `max_depth`. Only a search without a time budget plays
+            the same moves on every run.
+        max_depth (int): The deepest search in plies.
+        table (TranspositionTable): Results shared between searches.
+        book (OpeningBook): Moves to play without searching, or None.
+        last_depth (int): The depth of the deepest search finished for the last move,
+            or 0 if it came from the book.
+        last_score (int): The score of the last move for the player making it.
+    """
+
+    def __init__(
+        self,
+        time_budget=DEFAULT_TIME_BUDGET,
+        max_depth=DEFAULT_MAX_DEPTH,
+        table_size=DEFAULT_TABLE_SIZE,
+        seed=0,
+        book=None,
+    ):
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_size)
+        self.book = book
+        self.last_depth = 0
+        self.last_score = 0
+        self._seed = seed
+        self._geometry = None
+
+    def _prepare(self, board):
+        """Precompute the masks, Zobrist keys and scoring windows for the board size"""
+        geometry = (board.rows, board.cols, board.connect)
+        if self._geometry == geometry:
+            return
+        self._geometry = geometry
+        rows, cols, connect = geometry
+        height = rows + 1
+        self._rows = rows
+        self._connect = connect
+        self._shifts = (1, height, height + 1, height - 1)
+        self._bottom = [1 << (col * height) for col in range(cols)]
+        self._column_masks = [
+            ((1 << rows) - 1) << (col * height) for col in range(cols)
+        ]
+        self._top = [1 << (col * height + rows - 1) for col in range(cols)]
+        # No game lasts longer than this, so any score within it of WIN_SCORE is a
+        # forced result
+        self._win_threshold = WIN_SCORE - rows * cols
+        self._bottom_row = sum(self._bottom)
+        self._full = sum(self._column_masks)
+        self._order = sorted(range(cols), key=lambda col: abs(2 * col - (cols - 1)))
+
+        rng = random.Random(self._seed)
+        bits = cols * height
+        self._zobrist = [
+            [rng.getrandbits(64) for _ in range(bits)],
+            [rng.getrandbits(64) for _ in range(bits)],
+        ]
+        self._zobrist_side = rng.getrandbits(64)
+
+        # Every line of `connect` cells on the board, scored by how many stones one
+        # player has in it while the other has none
+        self._windows = []
+        for row in range(rows):
+            for col in range(cols):
+                for row_step, col_step in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                    end_row = row + row_step * (connect - 1)
+                    end_col = col + col_step * (connect - 1)
+                    if 0 <= end_row < rows and end_col < cols:
+                        window = 0
+                        for i in range(connect):
+                            cell_col = col + col_step * i
+                            cell_row = row + row_step * i
+                            window |= 1 << (cell_col * height + cell_row)
+                        self._windows.append(window)
+        self._weights = [0] + [4**count for count in range(1, connect + 1)]
+        self.table = TranspositionTable(self.table.size)
+
+    def choose_move(self, board, symbol):
+        """Choose the column (zero-based) for `symbol` to drop into on `board`"""
+        if self.book is not None:
+            entry = self.book.lookup(board, symbol)
+            if entry is not None:
+                self.last_depth = 0
+                self.last_score = entry[1]
+                return entry[0]
+        self._prepare(board)
+        self.table.new_search()
+        opponent = next((s for s in board.masks if s != symbol), None)
+        current = board.masks.get(symbol, 0)
+        other = board.masks.get(opponent, 0)
+        mask = current | other
+        key = self._hash_position(current, other)
+        legal = [col for col in self._order if not mask & self._top[col]]
+        if not legal:
+            raise ValueError("There are no legal moves on a full board")
+
+        self._deadline = (
+            time.perf_counter() + self.time_budget
+            if self.time_budget is not None
+            else float("inf")
+        )
+        self._nodes = 0
+        best_move = legal[0]
+        self.last_depth = 0
+        self.last_score = 0
+        remaining = board.rows * board.cols - board.move_count
+        for depth in range(1, min(self.max_depth, remaining) + 1):
+            try:
+                score, move = self._search_root(current, mask, key, depth, legal)
+            except SearchTimeout:
+                break
+            best_move = move
+            self.last_depth = depth
+            self.last_score = score
+            # A forced result needs no deeper search
+            if abs(score) >= self._win_threshold:
+                break
+        return best_move
+
+    def _hash_position(self, current, other):
+        """Hash the stones of the player to move with the first set of Zobrist keys and
+        the opponent's with the second. As the rules treat both players the same, a
+        position and its colour swapped twin share a key and a score."""
+        key = 0
+        for index in range(len(self._zobrist[0])):
+            bit = 1 << index
+            if current & bit:
+                key ^= self._zobrist[0][index]
+            elif other & bit:
+                key ^= self._zobrist[1][index]
+        return key
+
+    def _has_line(self, stones):
+        connect = self._connect
+        for shift in self._shifts:
+            run = stones
+            length = 1
+            while length * 2 <= connect:
+                run &= run >> (shift * length)
+                length *= 2
+            if length < connect:
+                run &= run >> (shift * (connect - length))
+            if run:
+                return True
+        return False
+
+    def _ordered_moves(self, mask, key):
+        entry = self.table.lookup(key)
+        moves = [col for col in self._order if not mask & self._top[col]]
+        if entry is not None and entry[4] in moves:
+            moves.remove(entry[4])
+            moves.insert(0, entry[4])
+        return moves
+
+    def _play_key(self, key, ply, move_bit):
+        """Update the hash for the player moving at `ply` dropping `move_bit`"""
+        index = move_bit.bit_length() - 1
+        return key ^ self._zobrist[ply & 1][index] ^ self._zobrist_side
+
+    def _move_bit(self, mask, col):
+        return (mask + self._bottom[col]) & self._column_masks[col]
+
+    def _search_root(self, current, mask, key, depth, legal):
+        alpha = -WIN_SCORE - 1
+        beta = WIN_SCORE + 1
+        best_move = legal[0]
+        best_score = -WIN_SCORE - 1
+        for col in self._ordered_moves(mask, key):
+            move_bit = self._move_bit(mask, col)
+            if self._has_line(current | move_bit):
+                return WIN_SCORE - 1, col
+            score = -self._negamax(
+                current ^ mask,
+                mask | move_bit,
+                self._play_key(key, 0, move_bit),
+                depth - 1,
+                -beta,
+                -alpha,
+                1,
+            )
+            if score > best_score:
+                best_score = score
+                best_move = col
+            alpha = max(alpha, score)
+        self.table.store(key, depth, best_score, EXACT, best_move)
+        return best_score, best_move
+
+    def _negamax(self, current, mask, key, depth, alpha, beta, ply):
+        self._nodes += 1
+        if self._nodes % TIME_CHECK_INTERVAL == 0 and (
+            time.perf_counter() > self._deadline
+        ):
+            raise SearchTimeout()
+
+        if mask == self._full:
+            return 0
+        # Leaves look for an immediate win in the same pass over the lines that
+        # scores the position, which is far cheaper than trying every column
+        if depth == 0:
+            return self._evaluate(current, mask, ply)
+
+        # Win straight away if possible, scoring quicker wins higher
+        moves = self._ordered_moves(mask, key)
+        for col in moves:
+            move_bit = self._move_bit(mask, col)
+            if self._has_line(current | move_bit):
+                return WIN_SCORE - ply
+
+        original_alpha = alpha
+        entry = self.table.lookup(key)
+        if entry is not None and entry[1] >= depth:
+            score, flag = self._from_table(entry[2], ply), entry[3]
+            if flag == EXACT:
+                return score
+            if flag == LOWER_BOUND:
+                alpha = max(alpha, score)
+            elif flag == UPPER_BOUND:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
+
+        best_score = -WIN_SCORE - 1
+        best_move = moves[0]
+        for col in moves:
+            move_bit = self._move_bit(mask, col)
+            score = -self._negamax(
+                current ^ mask,
+                mask | move_bit,
+                self._play_key(key, ply, move_bit),
+                depth - 1,
+                -beta,
+                -alpha,
+                ply + 1,
+            )
+            if score > best_score:
+                best_score = score
+                best_move = col
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, depth, self._to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def _to_table(self, score, ply):
+        """Forced results are scored by their distance from the root. The table holds
+        them by their distance from the position instead, as the same position can be
+        reached at a different ply."""
+        if score >= self._win_threshold:
+            return score + ply
+        if score <= -self._win_threshold:
+            return score - ply
+        return score
+
+    def _from_table(self, score, ply):
+        if score >= self._win_threshold:
+            return score - ply
+        if score <= -self._win_threshold:
+            return score + ply
+        return score
+
+    def _evaluate(self, current, mask, ply):
+        """Score the position for the player to move by the lines each player could
+        still complete, weighting lines with more stones far higher. A line the player
+        to move can complete with their next drop wins outright."""
+        other = current ^ mask
+        playable = (mask + self._bottom_row) & self._full
+        last_stone = self._connect - 1
+        score = 0
+        weights = self._weights
+        for window in self._windows:
+            mine = window & current
+            if mine:
+                if window & other:
+                    continue
+                count = popcount(mine)
+                if count == last_stone and (window ^ mine) & playable:
+                    return WIN_SCORE - ply
+                score += weights[count]
+            else:
+                theirs = window & other
+                if theirs:
+                    score -= weights[popcount(theirs)]
+        return score
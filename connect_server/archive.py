@@ -0,0 +1,281 @@
+"""Archives of finished games for review and analysis.
+
+A finished game is archived as a record of its board size, players, winner and every
+move with the time it was made. Archives come in two formats:
+
+- "jsonl": one JSON record per line, gzip compressed.
+- "binary": a compact format of 5 bytes per move, with times to the millisecond.
+
+Every function here works on generators one record at a time, so exporting or reading
+millions of games takes no more memory than one game.
+
+The server streams every finished game it holds from `GET /games/export?format=jsonl`.
+
+Example:
+    python -m connect_server.archive export --url http://127.0.0.1:5000 --output games.jsonl.gz
+    python -m connect_server.archive replay games.jsonl.gz --depth 4
+"""
+
+import argparse
+import gzip
+import json
+import struct
+import sys
+import zlib
+
+from connect_server.ai import Engine
+from connect_server.board import Board
+from connect_server.constants import SYMBOL_1, SYMBOL_2
+from connect_server.game import record_from_snapshot
+
+MAGIC = b"C5AR"
+FORMAT_VERSION = 2
+GZIP_MAGIC = b"\x1f\x8b"
+# The game ID length, rows, cols, connect, winner and the time of the first move, then
+# the number of moves
+RECORD_HEADER = struct.Struct("<HBBBBdH")
+# A move's column with the top bit set for the second player's symbol, and its time in
+# milliseconds after the first move
+MOVE = struct.Struct("<BI")
+UNKNOWN_TIME = 0xFFFFFFFF
+# The length of a player's name, one byte in version 1 archives
+NAME_LENGTH = struct.Struct("<H")
+MAX_NAME_LENGTH = 0xFFFF
+SYMBOLS = (None, SYMBOL_1, SYMBOL_2)
+# Bytes read at a time from a streamed export
+CHUNK_SIZE = 64 * 1024
+
+
+def finished_records(registry):
+    """Yield the record of every finished game in a registry, one game at a time"""
+    store = registry.store
+    if store.shared:
+        # Games finished by other processes may not have been loaded here, so every
+        # game is read straight from the store without being loaded into the registry
+        for game_id in store.game_ids():
+            snapshot = store.load(game_id)
+            record = record_from_snapshot(snapshot) if snapshot else None
+            if record:
+                yield record
+        return
+    for game in registry.get_games():
+        record = game.get_record()
+        if record:
+            yield record
+
+
+def encode_jsonl(records):
+    """Yield gzip compressed chunks of JSON lines"""
+    # A window of 16 plus 15 bits writes a gzip header and trailer
+    compressor = zlib.compressobj(wbits=31)
+    for record in records:
+        chunk = compressor.compress(
+            (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        )
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def encode_binary(records):
+    """Yield the binary archive a record at a time"""
+    yield MAGIC + bytes([FORMAT_VERSION])
+    for record in records:
+        yield _pack(record)
+
+
+def _pack(record):
+    game_id = record["game_id"].encode()
+    moves = record["moves"]
+    start = next((played_at for _, _, played_at in moves if played_at), 0.0)
+    parts = [
+        RECORD_HEADER.pack(
+            len(game_id),
+            record["rows"],
+            record["cols"],
+            record["connect"],
+            SYMBOLS.index(record["winner"]),
+            start,
+            len(moves),
+        ),
+        game_id,
+    ]
+    for name in record["players"]:
+        # Names too long to hold are cut short rather than failing part way through
+        # streaming an archive
+        name = (name or "").encode()[:MAX_NAME_LENGTH]
+        parts.append(NAME_LENGTH.pack(len(name)) + name)
+    for col, symbol, played_at in moves:
+        if symbol not in SYMBOLS[1:]:
+            raise ValueError(f"The binary format cannot hold the symbol {symbol!r}")
+        if played_at is None:
+            offset = UNKNOWN_TIME
+        else:
+            # The clock may have stepped backwards, or a game may have lasted longer
+            # than the 49.7 days 32 bits of milliseconds can hold
+            offset = min(max(round((played_at - start) * 1000), 0), UNKNOWN_TIME - 1)
+        parts.append(MOVE.pack(col | (0x80 if symbol == SYMBOL_2 else 0), offset))
+    return b"".join(parts)
+
+
+ARCHIVE_FORMATS = {
+    "jsonl": ("application/gzip", "jsonl.gz", encode_jsonl),
+    "binary": ("application/octet-stream", "c5a", encode_binary),
+}
+
+
+def read_records(f):
+    """Yield every record in an archive opened in binary mode, whichever format it is
+    in"""
+    magic = f.read(len(MAGIC) + 1)
+    if magic.startswith(GZIP_MAGIC):
+        f.seek(0)
+        f = gzip.GzipFile(fileobj=f)
+    elif magic.startswith(MAGIC):
+        yield from _read_binary(f, magic[len(MAGIC)])
+        return
+    else:
+        f.seek(0)
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("The archive ends part way through a game")
+    return data
+
+
+def _read_name(f, version):
+    if version < 2:
+        length = _read_exactly(f, 1)[0]
+    else:
+        (length,) = NAME_LENGTH.unpack(_read_exactly(f, NAME_LENGTH.size))
+    return _read_exactly(f, length).decode()
+
+
+def _read_binary(f, version):
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unknown archive format version {version}")
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if not header:
+            return
+        if len(header) != RECORD_HEADER.size:
+            raise ValueError("The archive ends part way through a game")
+        id_length, rows, cols, connect, winner, start, count = RECORD_HEADER.unpack(
+            header
+        )
+        game_id = _read_exactly(f, id_length).decode()
+        players = []
+        for _ in range(2):
+            name = _read_name(f, version)
+            players.append(name or None)
+        moves = []
+        for _ in range(count):
+            packed, offset = MOVE.unpack(_read_exactly(f, MOVE.size))
+            moves.append(
+                [
+                    packed & 0x7F,
+                    SYMBOL_2 if packed & 0x80 else SYMBOL_1,
+                    None if offset == UNKNOWN_TIME else start + offset / 1000,
+                ]
+            )
+        yield {
+            "game_id": game_id,
+            "rows": rows,
+            "cols": cols,
+            "connect": connect,
+            "players": players,
+            "winner": SYMBOLS[winner],
+            "moves": moves,
+        }
+
+
+def replay(record, engine=None):
+    """Replay a game move by move, checking it reaches the recorded result.
+
+    With an engine, every move is also compared with the move the engine would have
+    chosen in its place.
+
+    Returns:
+        dict: The game ID, number of moves, winner reached by replaying, whether that
+            matches the record, and with an engine the fraction of moves it agreed with.
+    """
+    board = Board(rows=record["rows"], cols=record["cols"], connect=record["connect"])
+    agreed = 0
+    for col, symbol, _ in record["moves"]:
+        if engine is not None and engine.choose_move(board, symbol) == col:
+            agreed += 1
+        if board.drop(col, symbol) is None:
+            raise ValueError(f"Game {record['game_id']} plays into a full column")
+    result = {
+        "game_id": record["game_id"],
+        "moves": board.move_count,
+        "winner": board.winner,
+        "consistent": board.winner == record["winner"],
+    }
+    if engine is not None:
+        result["engine_agreement"] = round(agreed / max(board.move_count, 1), 3)
+    return result
+
+
+def export(url, output, archive_format="jsonl"):
+    """Stream every finished game from a server at `url` to the `output` file object
+    opened in binary mode"""
+    import requests
+
+    with requests.get(
+        f"{url.rstrip('/')}/games/export",
+        params={"format": archive_format},
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            output.write(chunk)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser(
+        "export", help="download every finished game from a server"
+    )
+    export_parser.add_argument("--url", default="http://127.0.0.1:5000")
+    export_parser.add_argument(
+        "--format", choices=sorted(ARCHIVE_FORMATS), default="jsonl"
+    )
+    export_parser.add_argument("--output", required=True)
+    replay_parser = commands.add_parser(
+        "replay", help="replay archived games and compare them with the engine"
+    )
+    replay_parser.add_argument("archive")
+    replay_parser.add_argument("--game", help="only replay the game with this ID")
+    replay_parser.add_argument(
+        "--depth",
+        type=int,
+        help="compare every move with the engine searching this many plies",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        with open(args.output, "wb") as output:
+            export(args.url, output, args.format)
+        return 0
+
+    engine = Engine(time_budget=None, max_depth=args.depth) if args.depth else None
+    inconsistent = 0
+    with open(args.archive, "rb") as f:
+        for record in read_records(f):
+            if args.game and record["game_id"] != args.game:
+                continue
+            result = replay(record, engine)
+            inconsistent += not result["consistent"]
+            print(json.dumps(result))
+    return 1 if inconsistent else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,636 @@
+"""An asyncio (ASGI) variant of the server for deployments holding many idle players.
+
+It serves the same routes and JSON responses as the Flask app built by `create_app`
+and plays the same games, but a player waiting for an opponent or a move is an
+asyncio task awaiting an `asyncio.Event` rather than an OS thread blocked on a
+condition. Run it with any ASGI server e.g.
+`uvicorn --factory connect_server.asgi:create_asgi_app`.
+"""
+
+import asyncio
+import contextlib
+import json
+import re
+import time
+import urllib.parse
+
+from connect_server import (
+    _batch_moves,
+    _board_format,
+    _event_id,
+    _simulate_games,
+    _enable_database,
+    _enable_eviction,
+    _enable_metrics,
+    _enable_persistence,
+    _enable_profiling,
+    _wait_seconds,
+    games,
+    matchmaker,
+    NUM_COLS,
+    NUM_ROWS,
+    NUM_TO_CONNECT,
+)
+from connect_server.archive import ARCHIVE_FORMATS, finished_records
+from connect_server.events import STREAM_KEEPALIVE
+from connect_server.game import DEFAULT_GAME_ID
+from connect_server.metrics import METRICS_MEDIA_TYPE
+from connect_server.profiling import PROFILE_LIMIT, PROFILE_SORT
+
+
+async def offload(function, *args, **kwargs):
+    """Call a function that may use the game store. A shared store's transactions can
+    wait for another process to release the database, so with one the call runs on a
+    worker thread rather than holding up every request on the event loop."""
+    if games.store.shared:
+        return await asyncio.to_thread(function, *args, **kwargs)
+    return function(*args, **kwargs)
+
+
+async def wait_for(subject, predicate, timeout):
+    """Wait up to `timeout` seconds for `predicate` to become true, waking whenever
+    `subject` (a game or matchmaking ticket) notifies its listeners. A game in a
+    shared store is also refreshed every poll interval, as changes made by other
+    processes never notify its listeners.
+
+    Returns:
+        bool: The final value of the predicate.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    poll_interval = getattr(subject, "poll_interval", None)
+
+    def wake():
+        loop.call_soon_threadsafe(changed.set)
+
+    subject.listeners.add(wake)
+    try:
+        deadline = loop.time() + timeout
+        while True:
+            # Clear before checking so a change between the check and the wait below
+            # is never missed
+            changed.clear()
+            if poll_interval is not None:
+                # Only a subject in a shared store polls, and reading the store could
+                # wait on another process
+                await asyncio.to_thread(subject.refresh)
+            if predicate():
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            if poll_interval is not None:
+                remaining = min(remaining, poll_interval)
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        subject.listeners.remove(wake)
+
+
+class Request:
+    """The parts of an HTTP request that the route handlers use.
+
+    Attributes:
+        path_params (dict[str, str]): The values captured from the URL.
+        args (dict[str, str]): The query string parameters.
+        headers (dict[str, str]): The request headers with lower case names.
+        json (dict): The decoded JSON body, or an empty dict if there is none.
+    """
+
+    def __init__(self, path_params, query_string, headers, body):
+        self.path_params = path_params
+        self.args = {
+            key: values[-1]
+            for key, values in urllib.parse.parse_qs(query_string).items()
+        }
+        self.headers = headers
+        try:
+            self.json = json.loads(body) if body else {}
+        except ValueError:
+            self.json = {}
+        if not isinstance(self.json, dict):
+            self.json = {}
+
+    def int_arg(self, key, default=None):
+        try:
+            return int(self.args[key])
+        except (KeyError, ValueError):
+            return default
+
+
+class EventStream:
+    """A streamed response returned by a route handler, Server-Sent Events unless
+    another media type is given.
+
+    Attributes:
+        events (async iterator[str | bytes]): The encoded chunks to send.
+        media_type (str): The Content-Type of the stream.
+        headers (dict[str, str]): Any other headers to send.
+    """
+
+    def __init__(self, events, media_type="text/event-stream", headers=None):
+        self.events = events
+        self.media_type = media_type
+        self.headers = headers or {}
+
+
+class TextResponse:
+    """A plain text response returned by a route handler.
+
+    Attributes:
+        text (str): The body.
+        media_type (str): The Content-Type of the body.
+    """
+
+    def __init__(self, text, media_type):
+        self.text = text
+        self.media_type = media_type
+
+
+def _game_not_found():
+    return {"success": False, "message": "Game not found"}, 404
+
+
+class AsgiApp:
+    """An ASGI application serving the Connect 5 routes.
+
+    Attributes:
+        config (dict): Settings for the app, mirroring `Flask.config`.
+        routes (list): (method, rule, compiled path pattern, handler) for every route.
+        metrics (Metrics): Where every request is recorded, or None.
+        profiler (Profiler): Profiles a sample of requests, or None.
+    """
+
+    def __init__(self, metrics=None, profiler=None):
+        self.config = {}
+        self.routes = []
+        self.metrics = metrics
+        self.profiler = profiler
+
+    def route(self, rule, methods=("GET",)):
+        """Register a handler for a rule written like a Flask rule e.g.
+        "/activeplayer/<name>"."""
+        pattern = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", rule) + "$")
+
+        def decorator(handler):
+            for method in methods:
+                self.routes.append((method, rule, pattern, handler))
+            return handler
+
+        return decorator
+
+    def scoped_route(self, rule, methods=("GET",)):
+        """Register a handler at its unscoped URL, which plays the default game, and
+        under /games/<game_id> for every other game"""
+
+        def decorator(handler):
+            async def default_game(request):
+                request.path_params["game_id"] = DEFAULT_GAME_ID
+                return await handler(request)
+
+            self.route(rule, methods)(default_game)
+            self.route(f"/games/<game_id>{rule}", methods)(handler)
+            return handler
+
+        return decorator
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._handle(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _handle(self, scope, receive, send):
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        start = time.perf_counter()
+        profile = self.profiler.start() if self.profiler else None
+        rule = None
+        try:
+            rule, response = await self._route(scope, body)
+            if not isinstance(response, EventStream):
+                status, media_type, payload = self._encode(response)
+        finally:
+            if profile:
+                self.profiler.stop(profile, rule)
+
+        if isinstance(response, EventStream):
+            self._record(rule, scope, 200, start)
+            await self._send_stream(response, receive, send)
+            return
+        self._record(rule, scope, status, start)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", media_type.encode()),
+                    (b"content-length", str(len(payload)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _route(self, scope, body):
+        """Run the handler of the route matching the request.
+
+        Returns:
+            tuple: The rule of the matched route, or None, and the handler's response.
+        """
+        # Repeated slashes are merged like Flask does, so "http://host//board" works
+        path = re.sub("/+", "/", scope["path"])
+        for method, rule, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match and method == scope["method"]:
+                request = Request(
+                    match.groupdict(),
+                    scope.get("query_string", b"").decode(),
+                    {
+                        name.decode().lower(): value.decode()
+                        for name, value in scope.get("headers", [])
+                    },
+                    body,
+                )
+                return rule, await handler(request)
+        return None, ({"success": False, "message": "Not found"}, 404)
+
+    @staticmethod
+    def _encode(response):
+        """Get the status, media type and encoded body of a handler's response"""
+        if isinstance(response, TextResponse):
+            return 200, response.media_type, response.text.encode()
+        content, status = response if isinstance(response, tuple) else (response, 200)
+        # Handlers may return a body that is already encoded as JSON
+        payload = content if isinstance(content, str) else json.dumps(content)
+        return status, "application/json", payload.encode()
+
+    def _record(self, rule, scope, status, start):
+        if self.metrics:
+            self.metrics.observe_request(
+                rule, scope["method"], status, time.perf_counter() - start
+            )
+
+    async def _send_stream(self, stream, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", stream.media_type.encode()),
+                    (b"cache-control", b"no-cache"),
+                    *(
+                        (name.lower().encode(), value.encode())
+                        for name, value in stream.headers.items()
+                    ),
+                ],
+            }
+        )
+
+        async def forward():
+            async for chunk in stream.events:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk if isinstance(chunk, bytes) else chunk.encode(),
+                        "more_body": True,
+                    }
+                )
+            await send({"type": "http.response.body", "body": b""})
+
+        # Stop streaming as soon as the client goes away rather than on the next event
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        tasks = [
+            asyncio.ensure_future(forward()),
+            asyncio.ensure_future(disconnected()),
+        ]
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+
+
+def create_asgi_app():
+    app = AsgiApp(metrics=_enable_metrics(), profiler=_enable_profiling())
+    _enable_database()
+    # The cap on games applies to the games recovered too
+    _enable_eviction()
+    _enable_persistence()
+    join_wait = app.metrics.join_wait if app.metrics else contextlib.nullcontext
+
+    if app.metrics:
+
+        @app.route("/metrics", methods=["GET"])
+        async def get_metrics(request):
+            """Get the request metrics and the games being played for Prometheus"""
+            return TextResponse(
+                app.metrics.render(games, matchmaker), METRICS_MEDIA_TYPE
+            )
+
+    if app.profiler:
+
+        @app.route("/admin/profile", methods=["GET"])
+        async def get_profile(request):
+            """Get the profile of the sampled requests of every route, or just "route",
+            as text sorted by "sort" and cut to "limit" functions per route"""
+            return TextResponse(
+                app.profiler.report(
+                    request.args.get("route"),
+                    request.args.get("sort", PROFILE_SORT),
+                    request.int_arg("limit", PROFILE_LIMIT),
+                ),
+                "text/plain",
+            )
+
+        @app.route("/admin/profile", methods=["DELETE"])
+        async def clear_profile(request):
+            """Discard the profiles gathered so far"""
+            app.profiler.clear()
+            return {"success": True}
+
+    @app.route("/games", methods=["POST"])
+    async def create_game(request):
+        """Create a new game, optionally choosing the board dimensions with "rows",
+        "cols" and "connect" """
+        details = request.json
+        try:
+            game = await offload(
+                games.create_game,
+                rows=int(details.get("rows", NUM_ROWS)),
+                cols=int(details.get("cols", NUM_COLS)),
+                connect=int(details.get("connect", NUM_TO_CONNECT)),
+            )
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        return {"success": True, "game_id": game.game_id}
+
+    @app.route("/games", methods=["GET"])
+    async def list_games(request):
+        """Get a summary of every game being served"""
+        return {"success": True, "games": await offload(games.list_games)}
+
+    @app.route("/admin/memory", methods=["GET"])
+    async def get_memory(request):
+        """Get the estimated memory held by the games being served"""
+        return {"success": True, **await offload(games.memory_report)}
+
+    @app.route("/games/simulate", methods=["POST"])
+    async def simulate_games(request):
+        """Create and play out every scripted game in "games" in one request"""
+        return await offload(_simulate_games, request.json.get("games"))
+
+    @app.route("/games/export", methods=["GET"])
+    async def export_games(request):
+        """Stream every finished game as an archive in the "format" query parameter,
+        "jsonl" (the default) or "binary" """
+        archive_format = request.args.get("format", "jsonl")
+        if archive_format not in ARCHIVE_FORMATS:
+            return {"success": False, "message": "Unknown archive format"}, 400
+        media_type, extension, encode = ARCHIVE_FORMATS[archive_format]
+
+        async def generate():
+            chunks = encode(finished_records(games))
+            while True:
+                # Each chunk may read games from the store, and between chunks other
+                # requests get to run
+                chunk = await offload(next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+                await asyncio.sleep(0)
+
+        return EventStream(
+            generate(),
+            media_type,
+            {"Content-Disposition": f"attachment; filename=games.{extension}"},
+        )
+
+    @app.route("/games/<game_id>/join", methods=["POST"])
+    async def join_game(request):
+        """Join an existing game using the user supplied name"""
+        return await register_new_player(request)
+
+    @app.route("/matchmaking", methods=["POST"])
+    async def join_matchmaking(request):
+        """Queue to be paired with the next player into a new game"""
+        name = request.json.get("name")
+        if not name:
+            return {"success": False, "message": "You must supply a name to register"}
+        ticket = await offload(matchmaker.enqueue, name)
+        return await _wait_for_ticket(ticket, request.json.get("wait", 0))
+
+    @app.route("/matchmaking/<ticket_id>", methods=["GET"])
+    async def check_matchmaking(request):
+        """Check on a matchmaking ticket, long-polling for up to "wait" seconds"""
+        ticket = await offload(matchmaker.get_ticket, request.path_params["ticket_id"])
+        if not ticket:
+            return {"success": False, "message": "Ticket not found"}, 404
+        return await _wait_for_ticket(ticket, request.args.get("wait", 0))
+
+    async def _wait_for_ticket(ticket, wait):
+        await wait_for(ticket, ticket.matched.is_set, _wait_seconds(wait))
+        return await offload(matchmaker.wait, ticket, 0)
+
+    @app.route("/matchmaking/<ticket_id>", methods=["DELETE"])
+    async def leave_matchmaking(request):
+        """Leave the matchmaking queue"""
+        return {
+            "success": await offload(
+                matchmaker.cancel, request.path_params["ticket_id"]
+            )
+        }
+
+    @app.scoped_route("/board", methods=["GET"])
+    async def get_board(request):
+        """Get a string representation of the current state of the game board. The
+        "format" query parameter or Accept header selects a compact format instead"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        return await offload(
+            game.get_board,
+            _board_format(request.args.get("format"), request.headers.get("accept")),
+        )
+
+    @app.scoped_route("/players", methods=["GET"])
+    async def get_players(request):
+        """Get a string representation of the players involved in the game"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        return await offload(game.get_players) if game else _game_not_found()
+
+    @app.scoped_route("/register", methods=["POST"])
+    async def register_new_player(request):
+        """Register a new player to the game using the user supplied name"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        return await offload(game.register_new_player, request.json.get("name"))
+
+    @app.scoped_route("/activeplayer/<name>", methods=["GET"])
+    async def is_active_player(request):
+        """Get a boolean to represent whether the provider player name is the active
+        player or not i.e. is it the supplied player's turn to make a move."""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        return await offload(game.is_active_player, request.path_params["name"])
+
+    @app.scoped_route("/initdetails", methods=["POST"])
+    async def initialise_player_details(request):
+        """Assign the initial active player for the game and assign symbols to both
+        players, waiting for the second player to join if needed"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        with join_wait():
+            await wait_for(
+                game,
+                lambda: game.participants.is_full(),
+                _wait_seconds(request.json.get("wait")),
+            )
+        return await offload(
+            game.initialise_player_details, request.json.get("name"), timeout=0
+        )
+
+    @app.scoped_route("/makemove", methods=["POST"])
+    async def make_move(request):
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        column = int(request.json.get("column"))
+        symbol = request.json.get("symbol")
+        return await offload(
+            game.make_move,
+            column,
+            symbol,
+            name=request.json.get("name"),
+            expected_version=request.json.get("version"),
+        )
+
+    @app.scoped_route("/makemoves", methods=["POST"])
+    async def make_moves(request):
+        """Make a list of moves in order as one change to the game, stopping at the
+        first move that cannot be made or a win, and get the state of the game"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        moves = _batch_moves(request.json.get("moves", []))
+        if moves is None:
+            return {
+                "success": False,
+                "message": "Send the moves as a list of objects with a column",
+            }, 400
+        return await offload(
+            game.make_moves, moves, expected_version=request.json.get("version")
+        )
+
+    @app.scoped_route("/winner", methods=["GET"])
+    async def check_for_winner(request):
+        """Get whether or not the board currently contains a winner"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        return await offload(game.check_for_winner) if game else _game_not_found()
+
+    @app.scoped_route("/state", methods=["GET"])
+    async def get_state(request):
+        """Get the board, active player, winner, move count, players and version of
+        the game in a single response"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        return await offload(game.get_state_json) if game else _game_not_found()
+
+    @app.scoped_route("/wait", methods=["GET"])
+    async def wait_for_change(request):
+        """Long-poll until the game's version is newer than the "since" query
+        parameter, then get the board, active player and winner"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        since = request.int_arg("since", 0)
+        await wait_for(
+            game,
+            lambda: game.version > since,
+            _wait_seconds(request.args.get("timeout")),
+        )
+        return await offload(game.wait_for_change, since, timeout=0)
+
+    @app.scoped_route("/events", methods=["GET"])
+    async def stream_events(request):
+        """Stream the game's moves, turn changes, wins and resets as Server-Sent
+        Events"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        since = _event_id(request.headers.get("last-event-id"))
+        event_id = request.int_arg("since", since)
+
+        async def generate(event_id):
+            while True:
+                await wait_for(game, lambda: game.version > event_id, STREAM_KEEPALIVE)
+                events = await offload(game.wait_for_events, event_id, timeout=0)
+                if not events:
+                    yield ": keep-alive\n\n"
+                for event in events:
+                    event_id = event.event_id
+                    yield event.encoded
+
+        return EventStream(generate(event_id))
+
+    @app.scoped_route("/spectate", methods=["GET"])
+    async def spectate(request):
+        """Watch the game as Server-Sent Events without playing in it, starting with a
+        "snapshot" event of the whole game"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+
+        async def generate():
+            with game.spectating():
+                event = await offload(game.get_snapshot_event)
+                event_id = event.event_id
+                yield event.encoded
+                while True:
+                    await wait_for(
+                        game, lambda: game.version > event_id, STREAM_KEEPALIVE
+                    )
+                    events = await offload(game.wait_for_events, event_id, timeout=0)
+                    if not events:
+                        yield ": keep-alive\n\n"
+                    for event in events:
+                        if event.event_type == "sync":
+                            event = await offload(game.get_snapshot_event)
+                        event_id = event.event_id
+                        yield event.encoded
+
+        return EventStream(generate())
+
+    @app.scoped_route("/reset", methods=["GET"])
+    async def reset_game(request):
+        """Reset the game, optionally choosing new board dimensions with the "rows",
+        "cols" and "connect" query parameters"""
+        game = await offload(games.get_game, request.path_params["game_id"])
+        if not game:
+            return _game_not_found()
+        return await offload(
+            game.reset,
+            rows=request.int_arg("rows"),
+            cols=request.int_arg("cols"),
+            connect=request.int_arg("connect"),
+        )
+
+    return app
@@ -0,0 +1,80 @@
+"""Vectorised win detection for scoring many boards at once with NumPy.
+
+NumPy is only needed for this module, so install it separately with
+`pip install numpy`.
+"""
+
+import numpy as np
+
+from connect_server.constants import NUM_TO_CONNECT, SYMBOL_1, SYMBOL_2
+
+EMPTY = 0
+PLAYER_1 = 1
+PLAYER_2 = 2
+
+
+def encode_boards(boards, symbols=(SYMBOL_1, SYMBOL_2)):
+    """Encode boards as an (N, rows, cols) integer array of EMPTY, PLAYER_1 and
+    PLAYER_2.
+
+    Args:
+        boards: `Board` objects, nested lists of symbols and None indexed [row][col]
+            with the bottom row first, or an array of either symbols or codes.
+        symbols (tuple[str, str]): The symbols of the first and second player.
+    """
+    if not isinstance(boards, np.ndarray):
+        boards = [board.grid() if hasattr(board, "grid") else board for board in boards]
+        boards = np.array(boards, dtype=object)
+    if boards.dtype.kind in "iub":
+        return boards.astype(np.int8)
+    return (
+        (boards == symbols[0]) * PLAYER_1 + (boards == symbols[1]) * PLAYER_2
+    ).astype(np.int8)
+
+
+def _has_line(stones, connect):
+    """For an (N, rows, cols) 0/1 array, find which boards have `connect` in a line.
+
+    Each direction adds up `connect` shifted views of the array, which gives the
+    number of stones in every window of that direction at once. A window holding
+    `connect` stones is a line.
+    """
+    count, rows, cols = stones.shape
+    found = np.zeros(count, dtype=bool)
+    span = connect - 1
+    # (row step, col step) for horizontal, vertical, upward and downward diagonals
+    for row_step, col_step in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+        window_rows = rows - span * abs(row_step)
+        window_cols = cols - span * col_step
+        if window_rows <= 0 or window_cols <= 0:
+            continue
+        first_row = span if row_step < 0 else 0
+        total = np.zeros((count, window_rows, window_cols), dtype=np.int16)
+        for i in range(connect):
+            row = first_row + row_step * i
+            col = col_step * i
+            total += stones[:, row : row + window_rows, col : col + window_cols]
+        found |= (total == connect).any(axis=(1, 2))
+    return found
+
+
+def find_winners(boards, connect=NUM_TO_CONNECT, symbols=(SYMBOL_1, SYMBOL_2)):
+    """Check a batch of boards for a winner.
+
+    Args:
+        boards: The boards to check, in any form accepted by `encode_boards`.
+        connect (int): The number of symbols in a line needed to win.
+        symbols (tuple[str, str]): The symbols of the first and second player.
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: Whether each board has a winner, and the
+            winning symbol of each board or None. A board where both players have a
+            line reports the first player.
+    """
+    codes = encode_boards(boards, symbols)
+    first_wins = _has_line((codes == PLAYER_1).astype(np.int8), connect)
+    second_wins = _has_line((codes == PLAYER_2).astype(np.int8), connect)
+    winners = np.full(len(codes), None, dtype=object)
+    winners[second_wins] = symbols[1]
+    winners[first_wins] = symbols[0]
+    return first_wins | second_wins, winners
@@ -0,0 +1,149 @@
+"""Bitboard representation of a Connect N board"""
+
+from connect_server.constants import NUM_COLS, NUM_ROWS, NUM_TO_CONNECT
+
+
+class Board:
+    """A Connect N board that packs the stones of each symbol into an integer bitmask.
+
+    Cells are numbered column by column from the bottom up, with one spare bit on top of
+    every column. The spare bit is always empty so that shifting a mask horizontally or
+    diagonally can never wrap a line from the top of one column onto the bottom of the
+    next.
+
+    Attributes:
+        rows (int): The number of rows on the board.
+        cols (int): The number of columns on the board.
+        connect (int): The number of symbols in a line needed to win.
+        heights (list[int]): The number of symbols already dropped into each column.
+        masks (dict[str, int]): The bitmask of occupied cells for each symbol.
+        winner (str): The symbol that has connected enough in a line, if any.
+        move_count (int): The number of symbols dropped onto the board.
+        moves (list[tuple[int, str]]): The (column, symbol) of every drop in order.
+    """
+
+    def __init__(self, rows=NUM_ROWS, cols=NUM_COLS, connect=NUM_TO_CONNECT):
+        if rows < 1 or cols < 1 or connect < 1:
+            raise ValueError("Board dimensions and connect length must be positive")
+        self.rows = rows
+        self.cols = cols
+        self.connect = connect
+        self.heights = [0] * cols
+        self.masks = {}
+        self.winner = None
+        self.move_count = 0
+        self.moves = []
+        self._rendered = None
+        self._col_height = rows + 1
+        # Shifts that step one cell vertically, horizontally, up-right and down-right
+        self._shifts = (1, self._col_height, self._col_height + 1, self._col_height - 1)
+
+    def _bit(self, row, col):
+        return 1 << (col * self._col_height + row)
+
+    def is_valid_column(self, col):
+        return 0 <= col < self.cols
+
+    def is_column_full(self, col):
+        return self.heights[col] == self.rows
+
+    def is_empty(self):
+        return self.move_count == 0
+
+    def is_full(self):
+        return self.move_count == self.rows * self.cols
+
+    def get(self, row, col):
+        """Get the symbol at the given cell, or None if the cell is empty"""
+        bit = self._bit(row, col)
+        for symbol, mask in self.masks.items():
+            if mask & bit:
+                return symbol
+        return None
+
+    def drop(self, col, symbol):
+        """Drop a symbol into a column and record whether it completed a line.
+
+        Returns:
+            int: The row the symbol landed in, or None if the column is already full.
+        """
+        row = self.heights[col]
+        if row == self.rows:
+            return None
+        mask = self.masks.get(symbol, 0) | self._bit(row, col)
+        self.masks[symbol] = mask
+        self.heights[col] = row + 1
+        self.move_count += 1
+        self.moves.append((col, symbol))
+        self._rendered = None
+        if not self.winner and self._has_line(mask):
+            self.winner = symbol
+        return row
+
+    def _has_line(self, mask):
+        """Check whether any line of `connect` bits is set in the mask.
+
+        The runs are built up by doubling, so a line of length n costs O(log n) shifts
+        per direction rather than n - 1.
+        """
+        for shift in self._shifts:
+            run = mask
+            length = 1
+            while length * 2 <= self.connect:
+                run &= run >> (shift * length)
+                length *= 2
+            if length < self.connect:
+                run &= run >> (shift * (self.connect - length))
+            if run:
+                return True
+        return False
+
+    @classmethod
+    def from_moves(cls, moves, rows=NUM_ROWS, cols=NUM_COLS, connect=NUM_TO_CONNECT):
+        """Rebuild a board by replaying a list of (column, symbol) moves"""
+        board = cls(rows=rows, cols=cols, connect=connect)
+        for col, symbol in moves:
+            board.drop(col, symbol)
+        return board
+
+    @classmethod
+    def restore(
+        cls, moves, winner, rows=NUM_ROWS, cols=NUM_COLS, connect=NUM_TO_CONNECT
+    ):
+        """Rebuild a board from a snapshot that already records the winner, without
+        checking for a line after every move"""
+        board = cls(rows=rows, cols=cols, connect=connect)
+        for col, symbol in moves:
+            row = board.heights[col]
+            board.masks[symbol] = board.masks.get(symbol, 0) | board._bit(row, col)
+            board.heights[col] = row + 1
+            board.moves.append((col, symbol))
+        board.move_count = len(board.moves)
+        board.winner = winner
+        return board
+
+    def grid(self):
+        """Get the symbol in every cell as a list of rows, bottom row first"""
+        grid = [[None] * self.cols for _ in range(self.rows)]
+        for symbol, mask in self.masks.items():
+            for col in range(self.cols):
+                for row in range(self.heights[col]):
+                    if mask & self._bit(row, col):
+                        grid[row][col] = symbol
+        return grid
+
+    def render(self):
+        """Get the bracketed text rendering of the board with the top row first. The
+        rendering is cached until the next drop."""
+        if self._rendered is None:
+            lines = [
+                "".join(f"[{cell or ' '}]" for cell in row) + "\n"
+                for row in reversed(self.grid())
+            ]
+            self._rendered = "".join(lines)
+        return self._rendered
+
+    def cells(self, empty="."):
+        """Get a compact fixed-length rendering with one character per cell, row by
+        row from the bottom row up and left to right within each row"""
+        return "".join(cell or empty for row in self.grid() for cell in row)
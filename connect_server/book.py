@@ -0,0 +1,274 @@
+"""An opening book of searched positions, so the engine plays early moves instantly.
+
+The book is one file holding the best move and score of every position within the
+first few plies of a game, sorted by a canonical key of the position. A position and
+its mirror image share a key, so only one of each pair is stored. The file is
+memory-mapped rather than read, so opening it is instant and every process using the
+same book shares one copy in the page cache.
+
+Build a book offline from engine searches with e.g.
+    python -m connect_server.book --output opening.book --plies 5 --depth 8
+and let the bot play from it with `python client.py --bot NAME --book opening.book`.
+"""
+
+import argparse
+import concurrent.futures
+import mmap
+import os
+import struct
+import sys
+
+from connect_server.ai import Engine
+from connect_server.board import Board
+from connect_server.constants import (
+    NUM_COLS,
+    NUM_ROWS,
+    NUM_TO_CONNECT,
+    SYMBOL_1,
+    SYMBOL_2,
+)
+
+MAGIC = b"C5BK"
+# The magic, rows, cols and connect of the book, then the number of entries
+HEADER = struct.Struct("<4sBBBxI")
+# The canonical key, best move and score of a position
+ENTRY = struct.Struct("<Qbi")
+# The plies of the opening covered and the depth searched by default
+BOOK_PLIES = 4
+BOOK_DEPTH = 6
+# The number of positions each worker searches per task
+POSITIONS_PER_TASK = 32
+
+
+class Geometry:
+    """Computes the canonical keys of positions on one size of board.
+
+    A position is keyed by the stones of the player to move plus every occupied cell,
+    in the bit layout of `Board`. That is unique as every column has a spare bit on
+    top. The canonical key is the smaller of the keys of the position and its mirror
+    image.
+    """
+
+    def __init__(self, rows, cols, connect):
+        if cols * (rows + 1) > 63:
+            raise ValueError("The board is too big for a 64 bit book key")
+        self.rows = rows
+        self.cols = cols
+        self.connect = connect
+        self._height = rows + 1
+        self._column = (1 << self._height) - 1
+
+    def _mirror(self, bits):
+        mirrored = 0
+        for col in range(self.cols):
+            column = (bits >> (col * self._height)) & self._column
+            mirrored |= column << ((self.cols - 1 - col) * self._height)
+        return mirrored
+
+    def canonical_key(self, current, mask):
+        """Get the canonical key of a position, and whether it is the key of the
+        position's mirror image"""
+        key = current + mask
+        mirrored = self._mirror(current) + self._mirror(mask)
+        return (mirrored, True) if mirrored < key else (key, False)
+
+    def position(self, board, symbol):
+        """Get the stones of `symbol` and every occupied cell of a board"""
+        mask = 0
+        for stones in board.masks.values():
+            mask |= stones
+        return board.masks.get(symbol, 0), mask
+
+
+class OpeningBook:
+    """A book file mapped into memory.
+
+    Attributes:
+        geometry (Geometry): The size of board the book is for.
+        count (int): The number of positions in the book.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, rows, cols, connect, self.count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.geometry = Geometry(rows, cols, connect)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _find(self, key):
+        # Binary search straight over the mapped entries, so only the pages it touches
+        # are ever read
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * ENTRY.size
+            entry = ENTRY.unpack_from(self._map, offset)
+            if entry[0] < key:
+                low = middle + 1
+            elif entry[0] > key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def lookup(self, board, symbol):
+        """Get the best column for `symbol` to drop into on `board` and its score for
+        that player, or None if the position is not in the book"""
+        geometry = self.geometry
+        if (board.rows, board.cols, board.connect) != (
+            geometry.rows,
+            geometry.cols,
+            geometry.connect,
+        ):
+            return None
+        key, mirrored = geometry.canonical_key(*geometry.position(board, symbol))
+        entry = self._find(key)
+        if entry is None:
+            return None
+        _, move, score = entry
+        return (geometry.cols - 1 - move if mirrored else move), score
+
+
+def opening_positions(rows, cols, connect, plies):
+    """Find every position, up to mirror images, reached within the first `plies` - 1
+    moves of a game and not already won.
+
+    Returns:
+        list[list[int]]: The columns played to reach each position.
+    """
+    geometry = Geometry(rows, cols, connect)
+    seen = set()
+    positions = []
+    frontier = [[]]
+    for _ in range(plies):
+        next_frontier = []
+        for moves in frontier:
+            board = _replay(moves, rows, cols, connect)
+            symbol = (SYMBOL_1, SYMBOL_2)[len(moves) % 2]
+            key, _ = geometry.canonical_key(*geometry.position(board, symbol))
+            if key in seen or board.winner or board.is_full():
+                continue
+            seen.add(key)
+            positions.append(moves)
+            next_frontier += [
+                moves + [col] for col in range(cols) if not board.is_column_full(col)
+            ]
+        frontier = next_frontier
+    return positions
+
+
+def _replay(moves, rows, cols, connect):
+    return Board.from_moves(
+        [(col, (SYMBOL_1, SYMBOL_2)[ply % 2]) for ply, col in enumerate(moves)],
+        rows=rows,
+        cols=cols,
+        connect=connect,
+    )
+
+
+def search_positions(positions, rows, cols, connect, depth):
+    """Search positions to a fixed depth.
+
+    Returns:
+        list[tuple[int, int, int]]: The canonical key, best move in the canonical
+            orientation and score of each position.
+    """
+    geometry = Geometry(rows, cols, connect)
+    engine = Engine(time_budget=None, max_depth=depth)
+    entries = []
+    for moves in positions:
+        board = _replay(moves, rows, cols, connect)
+        symbol = (SYMBOL_1, SYMBOL_2)[len(moves) % 2]
+        move = engine.choose_move(board, symbol)
+        key, mirrored = geometry.canonical_key(*geometry.position(board, symbol))
+        entries.append((key, cols - 1 - move if mirrored else move, engine.last_score))
+    return entries
+
+
+def build_book(
+    path,
+    rows=NUM_ROWS,
+    cols=NUM_COLS,
+    connect=NUM_TO_CONNECT,
+    plies=BOOK_PLIES,
+    depth=BOOK_DEPTH,
+    workers=None,
+):
+    """Search every opening position across a pool of processes and write the book.
+
+    Returns:
+        int: The number of positions in the book.
+    """
+    positions = opening_positions(rows, cols, connect, plies)
+    tasks = [
+        positions[start : start + POSITIONS_PER_TASK]
+        for start in range(0, len(positions), POSITIONS_PER_TASK)
+    ]
+    entries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(search_positions, task, rows, cols, connect, depth)
+            for task in tasks
+        ]
+        for future in futures:
+            entries += future.result()
+    write_book(path, rows, cols, connect, entries)
+    return len(entries)
+
+
+def write_book(path, rows, cols, connect, entries):
+    """Write (key, move, score) entries as a book, replacing any book at `path` only
+    once the new one is complete"""
+    entries = sorted(set(entries))
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, rows, cols, connect, len(entries)))
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+    os.replace(path + ".tmp", path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", required=True, help="the book file to write")
+    parser.add_argument("--rows", type=int, default=NUM_ROWS)
+    parser.add_argument("--cols", type=int, default=NUM_COLS)
+    parser.add_argument("--connect", type=int, default=NUM_TO_CONNECT)
+    parser.add_argument(
+        "--plies",
+        type=int,
+        default=BOOK_PLIES,
+        help="how many opening moves of a game the book covers",
+    )
+    parser.add_argument(
+        "--depth", type=int, default=BOOK_DEPTH, help="plies searched per position"
+    )
+    parser.add_argument("--workers", type=int, help="defaults to one per CPU")
+    args = parser.parse_args(argv)
+
+    count = build_book(
+        args.output,
+        rows=args.rows,
+        cols=args.cols,
+        connect=args.connect,
+        plies=args.plies,
+        depth=args.depth,
+        workers=args.workers,
+    )
+    print(f"Wrote {count} positions to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
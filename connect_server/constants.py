@@ -0,0 +1,11 @@
+"""Game constants shared across the connect_server package"""
+
+# I'd like to store these constants in a config file that could be shared with the client
+FIRST_INDEX = 0
+NUM_ROWS = 6
+NUM_COLS = 9
+NUM_TO_CONNECT = 5
+SYMBOL_1 = "X"
+SYMBOL_2 = "O"
+# The longest time in seconds a request waits for an opponent before returning pending
+JOIN_TIMEOUT = 30
@@ -0,0 +1,98 @@
+"""Events published by a game as it is played, for pushing to subscribers"""
+
+import collections
+import itertools
+import json
+
+# The number of recent events each game keeps for subscribers that fall behind or
+# reconnect with a Last-Event-ID
+EVENT_HISTORY = 256
+# How long in seconds a stream waits for an event before sending a keep-alive comment
+STREAM_KEEPALIVE = 15
+
+
+class Listeners:
+    """Callbacks run whenever a game or matchmaking ticket changes.
+
+    Threads wait on conditions and events directly. Listeners let code on an asyncio
+    event loop be woken by a change made from any thread, without polling.
+    """
+
+    def __init__(self):
+        self._callbacks = set()
+
+    def add(self, callback):
+        self._callbacks.add(callback)
+
+    def remove(self, callback):
+        self._callbacks.discard(callback)
+
+    def notify(self):
+        for callback in list(self._callbacks):
+            callback()
+
+
+class GameEvent:
+    """A single change to a game such as a move, a turn change, a win or a reset.
+
+    The Server-Sent Events encoding is built once when the event is created, so
+    pushing it to any number of subscribers costs no further serialisation.
+
+    Attributes:
+        event_id (int): The position of the event in its game's event log.
+        event_type (str): What happened e.g. "move", "turn", "win" or "reset".
+        data (dict): The details of the event.
+        encoded (str): The event as a Server-Sent Events message.
+    """
+
+    def __init__(self, event_id, event_type, data):
+        self.event_id = event_id
+        self.event_type = event_type
+        self.data = data
+        self.encoded = (
+            f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+        )
+
+
+class EventLog:
+    """The most recent events of a single game.
+
+    The log is not locked itself. It is only used while holding the lock of the game
+    that owns it, and subscribers wait on that game's condition for new events.
+
+    Attributes:
+        last_id (int): The ID of the most recently published event.
+    """
+
+    def __init__(self, history=EVENT_HISTORY):
+        self.last_id = 0
+        self._events = collections.deque(maxlen=history)
+
+    def publish(self, event_type, data=None):
+        self.last_id += 1
+        event = GameEvent(self.last_id, event_type, data or {})
+        self._events.append(event)
+        return event
+
+    def since(self, event_id):
+        """Get the retained events published after the given event ID.
+
+        If some of those events are no longer retained, because the subscriber fell
+        too far behind or the game was reloaded from a store, a single "sync" event is
+        returned instead, telling the subscriber to fetch the whole state.
+
+        Only the wanted events are read, newest first, so every one of many
+        subscribers woken by a new event pays for that event alone.
+        """
+        if event_id >= self.last_id:
+            return []
+        count = self.last_id - event_id
+        if count <= len(self._events):
+            events = list(itertools.islice(reversed(self._events), count))
+            events.reverse()
+            if (
+                events[0].event_id == event_id + 1
+                and events[-1].event_id == self.last_id
+            ):
+                return events
+        return [GameEvent(self.last_id, "sync", {})]
@@ -0,0 +1,947 @@
+"""Games and the registry that holds every game served by a process"""
+
+import collections
+import contextlib
+import json
+import sys
+import threading
+import time
+import uuid
+
+from connect_server.board import Board
+from connect_server.constants import (
+    FIRST_INDEX,
+    JOIN_TIMEOUT,
+    NUM_COLS,
+    NUM_ROWS,
+    NUM_TO_CONNECT,
+    SYMBOL_1,
+    SYMBOL_2,
+)
+from connect_server.events import EVENT_HISTORY, EventLog, GameEvent, Listeners
+from connect_server.participants import Participants, Player
+from connect_server.storage import MemoryStore
+
+DEFAULT_GAME_ID = "default"
+BOARD_TEXT = "text"
+BOARD_CELLS = "cells"
+BOARD_MOVES = "moves"
+BOARD_FORMATS = (BOARD_TEXT, BOARD_CELLS, BOARD_MOVES)
+# A move publishes at most two events, so every move of a batch is still in the event
+# log when the batch is saved to the store
+MAX_BATCH_MOVES = EVENT_HISTORY // 2
+# Media types a client can send in its Accept header instead of the "format" parameter
+BOARD_MEDIA_TYPES = {
+    "application/vnd.connect5.cells+json": BOARD_CELLS,
+    "application/vnd.connect5.moves+json": BOARD_MOVES,
+}
+
+
+class Game:
+    """A single match between two players on its own board.
+
+    Every method returns the JSON response body for the matching route so the same
+    game logic can sit behind any web framework. Each game has its own lock so moves
+    in one game never wait on another.
+
+    Attributes:
+        game_id (str): The key of the game in its registry.
+        board (Board): The board the game is played on. It caches the outcome of the
+            game when a move is made, so the winner can be read without a rescan.
+        move_times (list[float]): When each move on the board was made, in seconds
+            since the epoch, or None for moves from before times were recorded.
+        participants (Participants): The players that have joined the game.
+        lock (threading.Lock): Guards the board and participants of this game.
+        changed (threading.Condition): Notified whenever an event is published, so
+            waiting players and subscribers are woken instead of sleeping in a loop.
+        events (EventLog): The recent moves, turn changes, wins and resets.
+        listeners (Listeners): Callbacks run alongside notifying `changed`.
+        version (int): Increases every time the state of the game changes.
+        spectators (int): The number of spectators watching the game's stream.
+        last_activity (float): When the game last changed or a player last called in,
+            from time.monotonic().
+        players_seen (dict[str, float]): When each player last called in with their
+            name, from time.monotonic().
+        journal (MoveLog): Where every published event is appended for crash
+            recovery, or None if the game is not persisted.
+        store (Store): Where the game is kept, or None for a game that lives only in
+            this object. Every change is written to the store, and a game in a shared
+            store reloads itself whenever another process has changed it.
+    """
+
+    def __init__(self, game_id, rows=NUM_ROWS, cols=NUM_COLS, connect=NUM_TO_CONNECT):
+        self.game_id = game_id
+        self.board = Board(rows=rows, cols=cols, connect=connect)
+        self.move_times = []
+        self.participants = Participants()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.events = EventLog()
+        self.listeners = Listeners()
+        self.journal = None
+        self.store = None
+        self.spectators = 0
+        self.last_activity = time.monotonic()
+        self.players_seen = {}
+        self._state = None
+        self._state_json = None
+        self._snapshot_event = None
+
+    @property
+    def version(self):
+        # Every change to the game publishes an event, so the ID of the latest event
+        # doubles as the version of the game state
+        return self.events.last_id
+
+    def get_board(self, board_format=BOARD_TEXT):
+        """Get the board as bracketed text, as one character per cell ("cells") or as
+        the ordered list of moves ("moves") that clients can replay locally"""
+        with self.lock:
+            self._refresh()
+            if board_format == BOARD_TEXT:
+                return {"success": True, "board": self.board.render()}
+            if board_format not in BOARD_FORMATS:
+                return {
+                    "success": False,
+                    "message": f"Board format must be one of {', '.join(BOARD_FORMATS)}",
+                }
+            response = {
+                "success": True,
+                "format": board_format,
+                "version": self.version,
+                "rows": self.board.rows,
+                "cols": self.board.cols,
+                "connect": self.board.connect,
+            }
+            if board_format == BOARD_CELLS:
+                response["cells"] = self.board.cells()
+            else:
+                response["moves"] = list(self.board.moves)
+            return response
+
+    def get_players(self):
+        with self.lock:
+            self._refresh()
+            return {"success": True, "players": self.participants.get_players_string()}
+
+    def get_summary(self):
+        with self.lock:
+            self._refresh()
+            return {
+                "game_id": self.game_id,
+                "rows": self.board.rows,
+                "cols": self.board.cols,
+                "connect": self.board.connect,
+                "players": self.participants.get_player_total(),
+                "winner": bool(self.board.winner),
+                "spectators": self.spectators,
+            }
+
+    def register_new_player(self, name):
+        with self.lock, self._transaction():
+            # If the board is still full from a previously won game then reset the game
+            # before attempmting to add new players
+            if self.board.winner:
+                self._reset()
+
+            if self.participants.is_full():
+                return {"success": False, "message": "Too many players"}
+
+            # If there are less than 2 players but moves are on the board then also reset
+            # the game as something has gone wrong.
+            if not self.board.is_empty():
+                self._reset()
+
+            if not name:
+                return {
+                    "success": False,
+                    "message": "You must supply a name to register",
+                }
+            if self.participants.name_in_use(name):
+                return {
+                    "success": False,
+                    "message": "Name is already in use, please choose another",
+                }
+
+            added = self.participants.add_player(Player(name))
+            if added:
+                self._touch(name)
+                self._publish("join", {"name": name})
+            return {
+                "success": added,
+                "message": "Successfully joined, please await your turn",
+                "game_id": self.game_id,
+            }
+
+    def is_active_player(self, name):
+        with self.lock:
+            self._refresh()
+            self._touch(name)
+            active_player = self.participants.get_active_player()
+            if active_player:
+                return {"success": True, "active_player": name == active_player.name}
+            else:
+                return {"success": False, "active_player": False}
+
+    def initialise_player_details(self, name, timeout=JOIN_TIMEOUT):
+        """Assign the initial active player for the game and assign symbols to both
+        players.
+
+        If the second player has not joined yet this waits on the game's condition for
+        up to `timeout` seconds and then returns a pending response, so a waiting
+        player never holds a worker forever. A timeout of 0 checks without waiting.
+        """
+        with self.changed:
+            self._touch(name)
+            # The store transaction is only begun once both players are here, so no
+            # other process is held off while this one waits
+            if self._wait_for(self.participants.is_full, timeout):
+                with self._transaction():
+                    if self.participants.is_full():
+                        return self._initialise_player_details(name)
+            return {
+                "success": False,
+                "pending": True,
+                "message": "Waiting for an opponent to join",
+            }
+
+    def _initialise_player_details(self, name):
+        current_player = Player(name)
+        player_1 = self.participants.get_player1()
+        if not self.participants.get_active_player():
+            self.participants.set_active_player(player_1)
+            self._publish("turn", {"active_player": player_1.get_name()})
+
+        # Ask who has the turn rather than assuming it is still player 1, as the
+        # first move may already have been made before this player calls in
+        active_player = self.participants.get_active_player()
+        symbol = SYMBOL_1 if player_1.equals(current_player) else SYMBOL_2
+        return {
+            "success": True,
+            "active_player": active_player.equals(current_player),
+            "symbol": symbol,
+            "event_id": self.events.last_id,
+            "version": self.version,
+        }
+
+    def make_move(self, column, symbol, name=None, expected_version=None):
+        """Drop the symbol into the column if it is that symbol's turn.
+
+        Once /initdetails has started the game, only the active player's symbol may be
+        played, and if `name` is given it must be the active player's. Before then any
+        symbol may be played, so a board can be set up move by move.
+
+        If `expected_version` is given the move is only made if the game is still at
+        that version, so a client that loses the response can safely send the same
+        move again: a repeat of the move made at that version succeeds without being
+        played twice.
+        """
+        with self.lock, self._transaction():
+            if expected_version is not None and expected_version != self.version:
+                return self._move_conflict(column, symbol, name, expected_version)
+            return self._make_move(column, symbol, name)
+
+    def _make_move(self, column, symbol, name=None):
+        """Make a move, or get why it cannot be made. Must be called while holding the
+        game's lock inside a transaction."""
+        self._touch(name)
+        if self._is_over():
+            return {
+                "success": False,
+                "reason": "The game is already over",
+                "winner": bool(self.board.winner),
+            }
+        reason = self._check_turn(symbol, name)
+        if reason:
+            return {"success": False, "reason": reason, "winner": False}
+        if not self.board.is_valid_column(column):
+            return {
+                "success": False,
+                "reason": f"Column must be between {FIRST_INDEX} and {self.board.cols - 1}",
+                "winner": bool(self.board.winner),
+            }
+
+        # Dropping into a column is O(1) as the board tracks the height of every
+        # column
+        row = self.board.drop(column, symbol)
+        if row is None:
+            return {
+                "success": False,
+                "reason": "That column is full. Choose another column",
+                "winner": False,
+            }
+
+        played_at = time.time()
+        self.move_times.append(played_at)
+        self._publish(
+            "move",
+            {"column": column, "row": row, "symbol": symbol, "time": played_at},
+        )
+        if self.board.winner:
+            self._publish("win", {"symbol": self.board.winner})
+        elif self.board.is_full():
+            self._publish("draw")
+        active_player = self.participants.switch_active_player()
+        if active_player and not self._is_over():
+            self._publish("turn", {"active_player": active_player.get_name()})
+        return {
+            "success": True,
+            "winner": bool(self.board.winner),
+            "version": self.version,
+        }
+
+    def make_moves(self, moves, expected_version=None):
+        """Make a list of moves in order as one change to the game, stopping at the
+        first move that cannot be made or once the game is over.
+
+        No other request sees the game part way through the batch, and in a store
+        every move made is saved in one transaction.
+
+        Args:
+            moves (list[dict]): The "column", "symbol" and optionally "name" of each
+                move, as sent to /makemove.
+            expected_version (int): If given, no move is made unless the game is still
+                at this version.
+
+        Returns:
+            dict: The state of the game after the batch, whether every move was made,
+                how many were, and why the batch stopped early if it did.
+        """
+        if len(moves) > MAX_BATCH_MOVES:
+            return {
+                "success": False,
+                "reason": f"At most {MAX_BATCH_MOVES} moves can be made at once",
+                "applied": 0,
+            }
+        with self.lock, self._transaction():
+            reason = None
+            applied = 0
+            if expected_version is not None and expected_version != self.version:
+                reason = "The game has changed since that version"
+            for move in moves if reason is None else ():
+                if self._is_over():
+                    break
+                result = self._make_move(
+                    int(move["column"]), move.get("symbol"), move.get("name")
+                )
+                if not result["success"]:
+                    reason = result["reason"]
+                    break
+                applied += 1
+            response = dict(self._get_state(), success=reason is None, applied=applied)
+            if reason is not None:
+                response["reason"] = reason
+            return response
+
+    def _check_turn(self, symbol, name):
+        """Get why the move may not be made by this player, or None if it may"""
+        active_player = self.participants.get_active_player()
+        if active_player is None:
+            if name is not None:
+                return "The game has not started yet"
+            return None
+        if name is not None and name != active_player.get_name():
+            return "It is not your turn"
+        player_1 = self.participants.get_player1()
+        expected_symbol = SYMBOL_1 if active_player.equals(player_1) else SYMBOL_2
+        if symbol != expected_symbol:
+            return f"It is {expected_symbol}'s turn"
+        return None
+
+    def _move_conflict(self, column, symbol, name, expected_version):
+        # A resent move finds its own move as the first event after the version it
+        # was sent for, made by the same player
+        events = self.events.since(expected_version)
+        if (
+            events
+            and events[0].event_type == "move"
+            and events[0].data["column"] == column
+            and events[0].data["symbol"] == symbol
+            and (name is None or self._player_name(symbol) == name)
+        ):
+            return {
+                "success": True,
+                "winner": bool(self.board.winner),
+                "version": self.version,
+                "duplicate": True,
+            }
+        return {
+            "success": False,
+            "reason": "The game has changed since that version",
+            "winner": bool(self.board.winner),
+            "version": self.version,
+        }
+
+    def _player_name(self, symbol):
+        """Get the name of the player playing `symbol`, or None"""
+        player = (
+            self.participants.get_player1()
+            if symbol == SYMBOL_1
+            else self.participants.get_player2()
+        )
+        return player.get_name() if player else None
+
+    def _is_over(self):
+        return bool(self.board.winner) or self.board.is_full()
+
+    def is_in_play(self):
+        """Whether the game has started and is not over yet"""
+        return self.participants.get_active_player() is not None and not self._is_over()
+
+    def get_state(self):
+        """Get the board, active player, winner, move count, players and version of
+        the game in one response"""
+        with self.lock:
+            self._refresh()
+            return self._get_state()
+
+    def get_state_json(self):
+        """Get the state of the game already encoded as JSON"""
+        with self.lock:
+            self._refresh()
+            state = self._get_state()
+            if self._state_json is None:
+                self._state_json = json.dumps(state)
+            return self._state_json
+
+    def _get_state(self):
+        # Every change to the game bumps its version, so the state is only rebuilt
+        # after a move, join or reset rather than on every request
+        if self._state is None or self._state["version"] != self.version:
+            active_player = self.participants.get_active_player()
+            self._state = {
+                "success": True,
+                "version": self.version,
+                "board": self.board.render(),
+                "active_player": active_player.get_name() if active_player else None,
+                "winner": bool(self.board.winner),
+                "winning_symbol": self.board.winner,
+                "draw": self.board.is_full() and not self.board.winner,
+                "move_count": self.board.move_count,
+                "players": [
+                    player.get_name() if player else None
+                    for player in (
+                        self.participants.get_player1(),
+                        self.participants.get_player2(),
+                    )
+                ],
+            }
+            self._state_json = None
+        return self._state
+
+    def wait_for_change(self, version, timeout):
+        """Get the state of the game once its version is newer than `version`, waiting
+        up to `timeout` seconds for it to change. "changed" in the response is False
+        if the wait timed out."""
+        with self.changed:
+            changed = self._wait_for(lambda: self.version > version, timeout)
+            return {**self._get_state(), "changed": changed}
+
+    def check_for_winner(self):
+        """Get whether or not the board currently contains a winner"""
+        with self.lock:
+            self._refresh()
+            return {"success": True, "winner": bool(self.board.winner)}
+
+    def reset(self, rows=None, cols=None, connect=None):
+        """Reset the game, optionally choosing new board dimensions"""
+        with self.lock, self._transaction():
+            try:
+                self._reset(rows, cols, connect)
+            except ValueError as e:
+                return {"success": False, "message": str(e)}
+            return {"success": True, "message": "Game reset"}
+
+    def _reset(self, rows=None, cols=None, connect=None):
+        self.board = Board(
+            rows=self.board.rows if rows is None else rows,
+            cols=self.board.cols if cols is None else cols,
+            connect=self.board.connect if connect is None else connect,
+        )
+        self.move_times = []
+        self.participants.reset_participants()
+        self.players_seen = {}
+        self._publish(
+            "reset",
+            {
+                "rows": self.board.rows,
+                "cols": self.board.cols,
+                "connect": self.board.connect,
+            },
+        )
+
+    def _publish(self, event_type, data=None):
+        """Record an event and wake everything waiting on the game. Must be called
+        while holding the game's lock."""
+        event = self.events.publish(event_type, data)
+        self.last_activity = time.monotonic()
+        if self.journal:
+            self.journal.append(self.game_id, event)
+        self.changed.notify_all()
+        self.listeners.notify()
+        return event
+
+    def snapshot(self):
+        """Get everything needed to rebuild the game as a JSON serialisable dict"""
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        active_player = self.participants.get_active_player()
+        return {
+            "game_id": self.game_id,
+            "version": self.version,
+            "rows": self.board.rows,
+            "cols": self.board.cols,
+            "connect": self.board.connect,
+            "moves": list(self.board.moves),
+            "move_times": list(self.move_times),
+            "winner": self.board.winner,
+            "players": [
+                str(player) if player else None
+                for player in (
+                    self.participants.get_player1(),
+                    self.participants.get_player2(),
+                )
+            ],
+            "active_player": active_player.get_name() if active_player else None,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        game = cls(
+            snapshot["game_id"],
+            rows=snapshot["rows"],
+            cols=snapshot["cols"],
+            connect=snapshot["connect"],
+        )
+        game._load(snapshot)
+        return game
+
+    def _load(self, snapshot):
+        self.board = Board.restore(
+            snapshot["moves"],
+            snapshot["winner"],
+            snapshot["rows"],
+            snapshot["cols"],
+            snapshot["connect"],
+        )
+        # Snapshots taken before move times were recorded have none
+        self.move_times = list(
+            snapshot.get("move_times") or [None] * len(snapshot["moves"])
+        )
+        self.participants.reset_participants()
+        for name in snapshot["players"]:
+            if name:
+                self.participants.add_player(Player(name))
+        self._set_active_player(snapshot["active_player"])
+        self.events.last_id = snapshot["version"]
+
+    def refresh(self):
+        """Reload the game if another process has changed it in a shared store"""
+        with self.lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Reload the game from a shared store if its version there differs. Must be
+        called while holding the game's lock."""
+        if self.store is None or not self.store.shared:
+            return
+        version = self.store.version(self.game_id)
+        if version is not None and version != self.version:
+            self._load(self.store.load(self.game_id))
+            self.changed.notify_all()
+            self.listeners.notify()
+
+    @property
+    def poll_interval(self):
+        return self.store.poll_interval if self.store else None
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Change the game inside a store transaction, after reloading it if another
+        process changed it first. Everything published inside is saved to the store
+        in the same transaction. Must be entered while holding the game's lock.
+
+        A store that is not shared holds no copy of the game, so nothing is saved."""
+        if self.store is None or not self.store.shared:
+            yield
+            return
+        with self.store.transaction(self.game_id):
+            self._refresh()
+            version = self.version
+            yield
+            if self.version != version:
+                self.store.save(self._snapshot(), self.events.since(version))
+
+    def _wait_for(self, predicate, timeout):
+        """Wait on the game's condition until the predicate is true. A game in a
+        shared store also checks the store every poll interval, as changes made by
+        other processes never notify the condition. Must be called while holding the
+        game's lock."""
+        if self.poll_interval is None:
+            return self.changed.wait_for(predicate, timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            self._refresh()
+            result = predicate()
+            remaining = deadline - time.monotonic()
+            if result or remaining <= 0:
+                return result
+            self.changed.wait(min(remaining, self.poll_interval))
+
+    def apply_event(self, event_type, data, version):
+        """Replay a journaled event onto the game without publishing it again"""
+        with self.lock:
+            if event_type == "join":
+                self.participants.add_player(Player(data["name"]))
+            elif event_type == "turn":
+                self._set_active_player(data["active_player"])
+            elif event_type == "move":
+                self.board.drop(data["column"], data["symbol"])
+                self.move_times.append(data.get("time"))
+                self.participants.switch_active_player()
+            elif event_type == "forfeit":
+                self.board.winner = data["symbol"]
+            elif event_type == "reset":
+                self.board = Board(data["rows"], data["cols"], data["connect"])
+                self.move_times = []
+                self.participants.reset_participants()
+            self.events.last_id = version
+
+    def _set_active_player(self, name):
+        for player in (
+            self.participants.get_player1(),
+            self.participants.get_player2(),
+        ):
+            if player and player.get_name() == name:
+                self.participants.set_active_player(player)
+
+    def get_record(self):
+        """Get the finished game as a record for the archive, or None if it is still
+        being played. See `record_from_snapshot`."""
+        with self.lock:
+            self._refresh()
+            if not self._is_over():
+                return None
+            return record_from_snapshot(self._snapshot())
+
+    def get_snapshot_event(self):
+        """Get the whole state of the game and its moves as a "snapshot" event.
+
+        The event is built and encoded once per version of the game, so any number of
+        spectators joining between two moves share the same encoded snapshot.
+        """
+        with self.lock:
+            self._refresh()
+            event = self._snapshot_event
+            if event is None or event.event_id != self.version:
+                state = dict(self._get_state(), moves=list(self.board.moves))
+                event = self._snapshot_event = GameEvent(
+                    self.version, "snapshot", state
+                )
+            return event
+
+    @contextlib.contextmanager
+    def spectating(self):
+        """Count a spectator as watching the game until the block exits"""
+        with self.lock:
+            self.spectators += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.spectators -= 1
+
+    def _touch(self, name):
+        """Record that a player called in. Names that are not playing the game are
+        ignored, so no one else can keep it alive. Must be called while holding the
+        game's lock."""
+        if name is not None and self.participants.name_in_use(name):
+            self.last_activity = self.players_seen[name] = time.monotonic()
+
+    def idle_seconds(self, now=None):
+        """How long since the game last changed or a player last called in"""
+        return (time.monotonic() if now is None else now) - self.last_activity
+
+    def forfeit_if_abandoned(self, ttl, now=None):
+        """End the game in the opponent's favour if the player whose turn it is has not
+        called in, and the game has not changed, for `ttl` seconds.
+
+        Returns:
+            bool: Whether the game was forfeited.
+        """
+        with self.lock, self._transaction():
+            if not self.is_in_play():
+                return False
+            name = self.participants.get_active_player().get_name()
+            now = time.monotonic() if now is None else now
+            if now - max(self.last_activity, self.players_seen.get(name, 0)) < ttl:
+                return False
+            player_1 = self.participants.get_player1()
+            symbol = SYMBOL_2 if player_1.get_name() == name else SYMBOL_1
+            self.board.winner = symbol
+            self._publish("forfeit", {"name": name, "symbol": symbol})
+            self._publish("win", {"symbol": symbol})
+            return True
+
+    def memory_size(self):
+        """Estimate the bytes of memory held by the game's board, players, events and
+        cached responses"""
+        with self.lock:
+            # The lock, store and journal are shared or not part of the game's state,
+            # so only the game's own parts are walked
+            seen = set()
+            return (
+                sys.getsizeof(self)
+                + sys.getsizeof(self.__dict__)
+                + sum(
+                    _deep_size(part, seen)
+                    for part in (
+                        self.board,
+                        self.move_times,
+                        self.participants,
+                        self.players_seen,
+                        self.events,
+                        self._state,
+                        self._state_json,
+                        self._snapshot_event,
+                    )
+                )
+            )
+
+    def wait_for_events(self, event_id, timeout):
+        """Get the events published after `event_id`, waiting up to `timeout` seconds
+        for one to be published if there are none yet."""
+        with self.changed:
+            self._wait_for(lambda: self.events.last_id > event_id, timeout)
+            return self.events.since(event_id)
+
+
+def record_from_snapshot(snapshot):
+    """Get a game's record for the archive from its snapshot.
+
+    Returns:
+        dict: The game ID, board dimensions, players, winning symbol (None for a draw)
+            and every move as [column, symbol, time], or None if the game is still
+            being played.
+    """
+    moves = snapshot["moves"]
+    if not snapshot["winner"] and len(moves) < snapshot["rows"] * snapshot["cols"]:
+        return None
+    move_times = snapshot.get("move_times") or [None] * len(moves)
+    return {
+        "game_id": snapshot["game_id"],
+        "rows": snapshot["rows"],
+        "cols": snapshot["cols"],
+        "connect": snapshot["connect"],
+        "players": list(snapshot["players"]),
+        "winner": snapshot["winner"],
+        "moves": [
+            [col, symbol, played_at]
+            for (col, symbol), played_at in zip(moves, move_times)
+        ],
+    }
+
+
+def _deep_size(obj, seen):
+    """Add up the sizes of an object and the containers and attributes it holds,
+    counting each object once"""
+    if id(obj) in seen or obj is None:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(
+            _deep_size(key, seen) + _deep_size(value, seen)
+            for key, value in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _deep_size(obj.__dict__, seen)
+    return size
+
+
+class GameRegistry:
+    """Holds every game served by this process keyed by game ID.
+
+    The registry lock is only held while games are added or looked up. All play within
+    a game is guarded by that game's own lock.
+
+    Attributes:
+        games (collections.OrderedDict[str, Game]): The games currently being served,
+            least recently used first.
+        journal (MoveLog): The log new games are persisted to, or None.
+        store (Store): Where every game is kept. A game another process added to a
+            shared store is loaded from it the first time it is asked for.
+        max_games (int): The most games served at once, or None for no limit. Adding
+            a game beyond the limit evicts the least recently used game.
+    """
+
+    def __init__(self, store=None, max_games=None):
+        self.games = collections.OrderedDict()
+        self.journal = None
+        self.store = store or MemoryStore()
+        self.max_games = max_games
+        self._lock = threading.Lock()
+
+    def _add_game(self, game):
+        """Add a game unless one with the same ID exists. Must be called while holding
+        the registry lock."""
+        if game.game_id in self.games:
+            return self.games[game.game_id]
+        if not self.store.add(game.snapshot()):
+            # Another process added the game first
+            game = Game.from_snapshot(self.store.load(game.game_id))
+        game.store = self.store
+        self._insert(game)
+        if self.journal:
+            game.journal = self.journal
+            self.journal.append_created(game)
+        return game
+
+    def _insert(self, game):
+        """Serve a game, evicting the least recently used games beyond `max_games`.
+        Must be called while holding the registry lock."""
+        self.games[game.game_id] = game
+        while self.max_games and len(self.games) > self.max_games:
+            self._evicted(self.games.popitem(last=False)[1])
+
+    def _evicted(self, game):
+        """Drop an evicted game from a store held in this process and from the
+        journal. Must be called while holding the registry lock."""
+        self.store.evict(game.game_id)
+        if game.journal and not self.store.shared:
+            # Recovery would otherwise restore the game from the journal
+            game.journal.append_evicted(game.game_id)
+            game.journal = None
+
+    def create_game(
+        self, rows=NUM_ROWS, cols=NUM_COLS, connect=NUM_TO_CONNECT, game_id=None
+    ):
+        """Create and register a new game.
+
+        Raises:
+            ValueError: If the board dimensions are invalid.
+        """
+        game = Game(game_id or uuid.uuid4().hex, rows=rows, cols=cols, connect=connect)
+        with self._lock:
+            return self._add_game(game)
+
+    def get_game(self, game_id):
+        """Get a game by ID, or None if no such game exists. The default game is
+        created on first use so the unscoped routes always have a game to play."""
+        game = self.games.get(game_id)
+        if game is None and (game_id == DEFAULT_GAME_ID or self.store.shared):
+            with self._lock:
+                game = self.games.get(game_id)
+                if game is None:
+                    game = self._load_game(game_id)
+        elif game is not None and self.max_games:
+            try:
+                self.games.move_to_end(game_id)
+            except KeyError:
+                # Evicted since it was looked up
+                pass
+        return game
+
+    def _load_game(self, game_id):
+        """Load a game another process added to the shared store, or create the default
+        game. Must be called while holding the registry lock."""
+        snapshot = self.store.load(game_id) if self.store.shared else None
+        if snapshot is not None:
+            game = Game.from_snapshot(snapshot)
+            game.store = self.store
+            self._insert(game)
+            return game
+        if game_id == DEFAULT_GAME_ID:
+            return self._add_game(Game(game_id))
+        return None
+
+    def restore_game(self, game):
+        """Add a game recovered from the journal without journaling it again"""
+        with self._lock:
+            self.store.add(game.snapshot())
+            self._insert(game)
+            game.journal = self.journal
+            game.store = self.store
+
+    def play_scripted_game(
+        self,
+        moves,
+        players=None,
+        rows=NUM_ROWS,
+        cols=NUM_COLS,
+        connect=NUM_TO_CONNECT,
+    ):
+        """Create a game and play a script of columns in it, the symbols alternating
+        from the first player's. If two player names are given they join the game and
+        it is started before the script is played.
+
+        Returns:
+            dict: The game ID and the state of the game once the script stopped, as
+                returned by `Game.make_moves`.
+
+        Raises:
+            ValueError: If the board dimensions are invalid or other than two players
+                are named.
+        """
+        if players is not None and len(players) != 2:
+            raise ValueError("Name both players or neither")
+        game = self.create_game(rows=rows, cols=cols, connect=connect)
+        if players:
+            for name in players:
+                game.register_new_player(name)
+            game.initialise_player_details(players[0], timeout=0)
+        script = [
+            {"column": col, "symbol": (SYMBOL_1, SYMBOL_2)[ply % 2]}
+            for ply, col in enumerate(moves)
+        ]
+        applied = 0
+        # A script longer than a batch is played a batch at a time
+        for start in range(0, max(len(script), 1), MAX_BATCH_MOVES):
+            result = game.make_moves(script[start : start + MAX_BATCH_MOVES])
+            applied += result["applied"]
+            if not result["success"] or result["winner"] or result["draw"]:
+                break
+        return {**result, "game_id": game.game_id, "applied": applied}
+
+    def get_games(self):
+        with self._lock:
+            return list(self.games.values())
+
+    def evict(self, game_id):
+        """Stop serving a game and drop it from a store held in this process. A shared
+        store keeps the game, so it is loaded again if it is asked for.
+
+        Returns:
+            bool: Whether the game was being served.
+        """
+        with self._lock:
+            game = self.games.pop(game_id, None)
+            if game is None:
+                return False
+            self._evicted(game)
+            return True
+
+    def memory_report(self):
+        """Estimate the memory held by the games being served.
+
+        Returns:
+            dict: The number of games and the total, mean and largest estimated bytes
+                per game.
+        """
+        sizes = [game.memory_size() for game in self.get_games()]
+        return {
+            "games": len(sizes),
+            "total_bytes": sum(sizes),
+            "mean_bytes": round(sum(sizes) / len(sizes)) if sizes else 0,
+            "max_bytes": max(sizes, default=0),
+        }
+
+    def list_games(self):
+        if self.store.shared:
+            for game_id in self.store.game_ids():
+                self.get_game(game_id)
+        return [game.get_summary() for game in self.get_games()]
@@ -0,0 +1,322 @@
+"""Load test the HTTP API and report the latency of every route.
+
+Simulated pairs of players each play whole games: create a game, register both
+players, /initdetails, then on every turn check /activeplayer/<name>, fetch /board,
+/makemove and check /winner until the game is won or drawn. Moves are random but
+seeded, so two runs with the same options make the same requests.
+
+By default the Flask app is served on a local port inside this process. Pass --url to
+load test a server that is already running, such as the async server under uvicorn.
+
+The report gives the throughput and p50/p95/p99 latency of every route and can be
+saved as JSON. Passing an earlier report as --baseline compares the two and fails if
+any route's p95 latency grew by more than --tolerance.
+
+Example:
+    python -m connect_server.loadtest --games 200 --concurrency 8 --output run.json
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from connect_server.board import Board
+from connect_server.constants import NUM_COLS, NUM_ROWS, NUM_TO_CONNECT
+
+# How much slower in p95 latency a route may get than in the baseline before the run
+# counts as a regression
+REGRESSION_TOLERANCE = 1.2
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """Collects the latency of every request by route from many threads"""
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, duration):
+        """Summarise every route's requests over a run of `duration` seconds"""
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            summary = {
+                "requests": len(latencies),
+                "errors": self.errors[route],
+                "throughput": round(len(latencies) / duration, 2),
+                "mean_ms": round(1000 * sum(latencies) / len(latencies), 3),
+            }
+            for percentile in PERCENTILES:
+                summary[f"p{percentile}_ms"] = round(
+                    1000 * _percentile(latencies, percentile), 3
+                )
+            routes[route] = summary
+        return routes
+
+
+def _percentile(ordered, percentile):
+    """The nearest-rank percentile of a sorted list"""
+    rank = math.ceil(percentile / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class PlayerPair:
+    """Plays one game between two players through the HTTP API, timing every request.
+
+    Attributes:
+        server (str): The base URL of the server without a trailing slash.
+        recorder (Recorder): Where the latency of every request is recorded.
+        session (requests.Session): The kept-alive session the requests are made on.
+        rng (random.Random): Chooses the moves.
+    """
+
+    def __init__(self, server, recorder, session, seed):
+        self.server = server
+        self.recorder = recorder
+        self.session = session
+        self.rng = random.Random(seed)
+
+    def _request(self, method, route, path, **options):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.server + path, **options)
+            body = response.json()
+            ok = response.ok and body.get("success", True)
+        except (requests.exceptions.RequestException, ValueError):
+            body, ok = {}, False
+        self.recorder.record(route, time.perf_counter() - start, ok)
+        return body
+
+    def play(self, names, rows, cols, connect):
+        """Play a game to the end.
+
+        Returns:
+            int: The number of moves played.
+        """
+        details = {"rows": rows, "cols": cols, "connect": connect}
+        game = self._request("POST", "/games", "/games", json=details)
+        if "game_id" not in game:
+            return 0
+        url = f"/games/{game['game_id']}"
+        for name in names:
+            self._request("POST", "/register", f"{url}/register", json={"name": name})
+        symbols = {}
+        for name in names:
+            player = self._request(
+                "POST", "/initdetails", f"{url}/initdetails", json={"name": name}
+            )
+            symbols[name] = player.get("symbol")
+        if not all(symbols.values()):
+            return 0
+
+        board = Board(rows=rows, cols=cols, connect=connect)
+        while True:
+            for name in names:
+                route = "/activeplayer/<name>"
+                if self._request("GET", route, f"{url}/activeplayer/{name}").get(
+                    "active_player"
+                ):
+                    break
+            else:
+                return board.move_count
+            self._request("GET", "/board", f"{url}/board")
+            column = self.rng.choice(
+                [col for col in range(cols) if not board.is_column_full(col)]
+            )
+            move = {"column": column, "symbol": symbols[name], "name": name}
+            if not self._request("POST", "/makemove", f"{url}/makemove", json=move).get(
+                "success"
+            ):
+                return board.move_count
+            board.drop(column, symbols[name])
+            if self._request("GET", "/winner", f"{url}/winner").get("winner"):
+                return board.move_count
+            if board.is_full():
+                return board.move_count
+
+
+@contextlib.contextmanager
+def serve_in_process():
+    """Serve a fresh Flask app on a free local port for the duration of the block.
+
+    Yields:
+        str: The URL of the server.
+    """
+    from werkzeug.serving import make_server
+
+    from connect_server import create_app
+
+    # Logging every request would cost more than serving it
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def run_load_test(
+    server,
+    games=100,
+    concurrency=4,
+    rows=NUM_ROWS,
+    cols=NUM_COLS,
+    connect=NUM_TO_CONNECT,
+    seed=0,
+):
+    """Play `games` games against `server`, `concurrency` at a time.
+
+    Returns:
+        dict: The options of the run, its totals and the summary of every route.
+    """
+    recorder = Recorder()
+    numbers = iter(range(games))
+    numbers_lock = threading.Lock()
+    moves = []
+
+    def worker():
+        with requests.Session() as session:
+            while True:
+                with numbers_lock:
+                    number = next(numbers, None)
+                if number is None:
+                    return
+                pair = PlayerPair(server, recorder, session, seed + number)
+                names = (f"load-{seed}-{number}-a", f"load-{seed}-{number}-b")
+                moves.append(pair.play(names, rows, cols, connect))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    routes = recorder.report(duration)
+    requests_made = sum(route["requests"] for route in routes.values())
+    return {
+        "options": {
+            "games": games,
+            "concurrency": concurrency,
+            "rows": rows,
+            "cols": cols,
+            "connect": connect,
+            "seed": seed,
+        },
+        "duration": round(duration, 3),
+        "moves": sum(moves),
+        "requests": requests_made,
+        "throughput": round(requests_made / duration, 2),
+        "routes": routes,
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Find the routes whose p95 latency grew by more than `tolerance` times the
+    baseline's.
+
+    Returns:
+        dict[str, float]: The ratio of new to baseline p95 latency of every route that
+            regressed.
+    """
+    regressions = {}
+    for route, summary in results["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or not before["p95_ms"]:
+            continue
+        ratio = summary["p95_ms"] / before["p95_ms"]
+        if ratio > tolerance:
+            regressions[route] = round(ratio, 2)
+    return regressions
+
+
+def format_report(results):
+    lines = [
+        f"{results['options']['games']} games, {results['moves']} moves, "
+        f"{results['requests']} requests in {results['duration']}s "
+        f"({results['throughput']} requests/s)",
+        f"{'route':<22}{'requests':>10}{'errors':>8}{'req/s':>10}"
+        + "".join(f"{f'p{percentile} ms':>10}" for percentile in PERCENTILES),
+    ]
+    for route, summary in results["routes"].items():
+        lines.append(
+            f"{route:<22}{summary['requests']:>10}{summary['errors']:>8}"
+            f"{summary['throughput']:>10}"
+            + "".join(
+                f"{summary[f'p{percentile}_ms']:>10}" for percentile in PERCENTILES
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="a running server, instead of one in process")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="games played at once"
+    )
+    parser.add_argument("--rows", type=int, default=NUM_ROWS)
+    parser.add_argument("--cols", type=int, default=NUM_COLS)
+    parser.add_argument("--connect", type=int, default=NUM_TO_CONNECT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="the JSON results of an earlier run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="how many times slower than the baseline a route's p95 may get",
+    )
+    args = parser.parse_args(argv)
+
+    options = {
+        "games": args.games,
+        "concurrency": args.concurrency,
+        "rows": args.rows,
+        "cols": args.cols,
+        "connect": args.connect,
+        "seed": args.seed,
+    }
+    if args.url:
+        results = run_load_test(args.url.rstrip("/"), **options)
+    else:
+        with serve_in_process() as url:
+            results = run_load_test(url, **options)
+
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for route, ratio in regressions.items():
+            print(f"{route} p95 latency is {ratio}x the baseline", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
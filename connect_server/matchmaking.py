@@ -0,0 +1,242 @@
+"""Matchmaking queue that pairs waiting players into new games.
+
+The queue is held in the process unless games are kept in a shared store, in which
+case the tickets are kept in the store too, so every worker process shares one queue.
+"""
+
+import collections
+import threading
+import time
+import uuid
+
+from connect_server.constants import JOIN_TIMEOUT
+from connect_server.events import Listeners
+from connect_server.game import Game
+
+# How long in seconds a ticket lasts without being checked before it is dropped, whether
+# it is still pending or matched but never collected. Longer than a long-poll, so a
+# player that is still waiting always checks again in time
+TICKET_EXPIRY = 2 * JOIN_TIMEOUT
+
+
+class Ticket:
+    """A player's place in the matchmaking queue.
+
+    Attributes:
+        ticket_id (str): The key the player uses to check on their ticket.
+        name (str): The name the player will join their game with.
+        game_id (str): The game the player was matched into, once matched.
+        matched (threading.Event): Set once the player has been placed in a game.
+        listeners (Listeners): Callbacks run once the ticket is matched.
+        claimed (bool): Set once the ticket has been paired, before its game exists.
+        last_seen (float): When the player last checked on the ticket, from
+            time.monotonic().
+    """
+
+    def __init__(self, name):
+        self.ticket_id = uuid.uuid4().hex
+        self.name = name
+        self.game_id = None
+        self.matched = threading.Event()
+        self.listeners = Listeners()
+        self.claimed = False
+        self.last_seen = time.monotonic()
+
+    def match(self, game_id):
+        """Place the ticket's player in a game and wake anything waiting on it"""
+        self.game_id = game_id
+        self.matched.set()
+        self.listeners.notify()
+
+    def to_response(self):
+        if self.matched.is_set():
+            return {
+                "success": True,
+                "status": "matched",
+                "ticket": self.ticket_id,
+                "game_id": self.game_id,
+            }
+        return {"success": True, "status": "pending", "ticket": self.ticket_id}
+
+
+class SharedTicket(Ticket):
+    """A ticket kept in a shared store, so it can be checked through any worker.
+
+    The ticket may be matched by another worker, which cannot notify this one, so it
+    is refreshed from the store every poll interval instead.
+
+    Attributes:
+        store (SqliteStore): The store holding the ticket.
+        poll_interval (float): How often a waiting request checks the store.
+    """
+
+    def __init__(self, store, name, ticket_id=None, game_id=None):
+        super().__init__(name)
+        self.ticket_id = ticket_id or self.ticket_id
+        self.store = store
+        self.poll_interval = store.poll_interval
+        if game_id:
+            self.match(game_id)
+
+    def refresh(self):
+        """Check the store for a match made through any worker"""
+        row = self.store.check_ticket(self.ticket_id, time.time())
+        if row and row[1] and not self.matched.is_set():
+            self.match(row[1])
+
+
+class Matchmaker:
+    """Pairs players into new games as they arrive.
+
+    A player joining an empty queue gets a pending ticket straight away. They can then
+    check it cheaply or long-poll it, which blocks on the ticket's event rather than
+    sleeping until an opponent arrives.
+
+    With a shared store the queue and tickets are kept in the store instead of
+    `waiting` and `tickets`, so a player may queue through one worker process and
+    check their ticket through another.
+
+    Attributes:
+        registry (GameRegistry): The registry new games are created in.
+        waiting (collections.deque[Ticket]): Tickets waiting for an opponent, oldest
+            first.
+        tickets (dict[str, Ticket]): Every ticket whose outcome has not yet been
+            collected by its player.
+        expiry (float): The seconds a ticket lasts without being checked.
+    """
+
+    def __init__(self, registry, expiry=TICKET_EXPIRY):
+        self.registry = registry
+        self.waiting = collections.deque()
+        self.tickets = {}
+        self.expiry = expiry
+        self._lock = threading.Lock()
+
+    def enqueue(self, name):
+        """Add a player to the queue, pairing them with the longest waiting player
+        that has a different name if there is one."""
+        store = self._shared_store()
+        if store:
+            return self._enqueue_shared(store, name)
+        ticket = Ticket(name)
+        with self._lock:
+            self._expire()
+            self.tickets[ticket.ticket_id] = ticket
+            opponent = next((t for t in self.waiting if t.name != name), None)
+            if opponent is None:
+                self.waiting.append(ticket)
+                return ticket
+            self.waiting.remove(opponent)
+            # The game is created outside the lock, so mark both tickets as taken
+            # straight away to stop either being cancelled in the meantime
+            opponent.claimed = ticket.claimed = True
+
+        game = self.registry.create_game()
+        for matched_ticket in (opponent, ticket):
+            game.register_new_player(matched_ticket.name)
+            matched_ticket.match(game.game_id)
+        return ticket
+
+    def _shared_store(self):
+        store = self.registry.store
+        return store if store.shared else None
+
+    def _enqueue_shared(self, store, name):
+        ticket = SharedTicket(store, name)
+        now = time.time()
+        game_id = store.enqueue_ticket(
+            ticket.ticket_id, name, now, now - self.expiry, self._new_game
+        )
+        if game_id:
+            ticket.match(game_id)
+        return ticket
+
+    @staticmethod
+    def _new_game(names):
+        """Build the snapshot of a new game joined by both players, for a shared store
+        to add as it matches them"""
+        game = Game(uuid.uuid4().hex)
+        for name in names:
+            game.register_new_player(name)
+        return game.snapshot()
+
+    def expire(self):
+        """Drop every ticket whose player has stopped checking on it.
+
+        Returns:
+            int: The number of tickets dropped.
+        """
+        store = self._shared_store()
+        if store:
+            return store.expire_tickets(time.time() - self.expiry)
+        with self._lock:
+            return self._expire()
+
+    def _expire(self):
+        """Drop pending tickets, and matched tickets never collected, whose players
+        have stopped checking on them. Must be called while holding the lock."""
+        cutoff = time.monotonic() - self.expiry
+        expired = [
+            ticket
+            for ticket in self.tickets.values()
+            if ticket.last_seen < cutoff
+            # A claimed ticket's game is still being created
+            and (ticket.matched.is_set() or not ticket.claimed)
+        ]
+        for ticket in expired:
+            if not ticket.claimed:
+                self.waiting.remove(ticket)
+            del self.tickets[ticket.ticket_id]
+        return len(expired)
+
+    def get_ticket(self, ticket_id):
+        store = self._shared_store()
+        if store:
+            row = store.check_ticket(ticket_id, time.time())
+            return SharedTicket(store, row[0], ticket_id, row[1]) if row else None
+        ticket = self.tickets.get(ticket_id)
+        if ticket is not None:
+            ticket.last_seen = time.monotonic()
+        return ticket
+
+    def wait(self, ticket, timeout):
+        """Wait up to `timeout` seconds for the ticket to be matched. A matched ticket
+        is forgotten once its outcome has been returned."""
+        if isinstance(ticket, SharedTicket):
+            return self._wait_shared(ticket, timeout)
+        if ticket.matched.wait(timeout):
+            with self._lock:
+                self.tickets.pop(ticket.ticket_id, None)
+        ticket.last_seen = time.monotonic()
+        return ticket.to_response()
+
+    def _wait_shared(self, ticket, timeout):
+        deadline = time.monotonic() + timeout
+        while not ticket.matched.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ticket.matched.wait(min(remaining, ticket.poll_interval))
+            ticket.refresh()
+        if ticket.matched.is_set():
+            ticket.store.collect_ticket(ticket.ticket_id)
+        return ticket.to_response()
+
+    def cancel(self, ticket_id):
+        """Remove a ticket that is still waiting for an opponent"""
+        store = self._shared_store()
+        if store:
+            return store.cancel_ticket(ticket_id)
+        with self._lock:
+            ticket = self.tickets.get(ticket_id)
+            if ticket is None or ticket.claimed:
+                return False
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+            del self.tickets[ticket_id]
+            return True
+
+    def pending(self):
+        """Get the number of players waiting for an opponent"""
+        store = self._shared_store()
+        return store.pending_tickets() if store else len(self.waiting)
@@ -0,0 +1,193 @@
+"""Request metrics exposed in the Prometheus text format.
+
+Every thread records into its own shard of counters, so recording a request never
+takes a lock or contends with another thread. Only a scrape of /metrics adds the
+shards up. The shards of threads that have finished, such as the per-request threads
+of a threaded server, are folded into one retired shard so they do not pile up.
+
+Enable the metrics by setting CONNECT5_METRICS=1 before creating the app.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+# The upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+# The upper bounds in seconds of the /initdetails join wait histogram buckets
+JOIN_WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 20, 30)
+# How many shards may be registered before the shards of finished threads are retired
+RETIRE_THRESHOLD = 64
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# The route label of a request that matched no route
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class _Shard:
+    """The counters recorded by one thread.
+
+    Attributes:
+        requests (dict[tuple, int]): The number of requests by (route, method, status).
+        latency (dict[str, list]): The bucket counts of each route's latency
+            histogram, followed by the sum of its latencies.
+        join_wait (list): The bucket counts of the join wait histogram, followed by
+            the sum of the waits.
+        join_waiting (int): Requests of this thread now waiting in /initdetails.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.latency = {}
+        self.join_wait = [0] * (len(JOIN_WAIT_BUCKETS) + 2)
+        self.join_waiting = 0
+
+    def merge(self, other):
+        for key, count in list(other.requests.items()):
+            self.requests[key] = self.requests.get(key, 0) + count
+        for route, counts in list(other.latency.items()):
+            totals = self.latency.setdefault(route, [0] * len(counts))
+            for i, count in enumerate(counts):
+                totals[i] += count
+        for i, count in enumerate(other.join_wait):
+            self.join_wait[i] += count
+        self.join_waiting += other.join_waiting
+
+
+def _observe(counts, buckets, seconds):
+    # The last bucket is +Inf and the last count is the sum
+    counts[bisect.bisect_left(buckets, seconds)] += 1
+    counts[-1] += seconds
+
+
+class Metrics:
+    """Records requests per thread and renders them for Prometheus"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= RETIRE_THRESHOLD:
+                    self._retire()
+        return shard
+
+    def _retire(self):
+        # A finished thread never records again, so its shard can safely be merged
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retired.merge(shard)
+        self._shards = live
+
+    def observe_request(self, route, method, status, seconds):
+        shard = self._shard()
+        key = (route or UNMATCHED_ROUTE, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        counts = shard.latency.get(key[0])
+        if counts is None:
+            counts = shard.latency[key[0]] = [0] * (len(LATENCY_BUCKETS) + 2)
+        _observe(counts, LATENCY_BUCKETS, seconds)
+
+    @contextlib.contextmanager
+    def join_wait(self):
+        """Count the block as a request waiting in /initdetails and record how long it
+        waited"""
+        self._shard().join_waiting += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            shard = self._shard()
+            shard.join_waiting -= 1
+            _observe(shard.join_wait, JOIN_WAIT_BUCKETS, time.perf_counter() - start)
+
+    def totals(self):
+        """Add up every thread's counters.
+
+        Returns:
+            _Shard: The totals.
+        """
+        totals = _Shard()
+        with self._lock:
+            self._retire()
+            totals.merge(self._retired)
+            for _, shard in self._shards:
+                totals.merge(shard)
+        return totals
+
+    def render(self, registry, matchmaker):
+        """Render the metrics and the current games and queue in the Prometheus text
+        exposition format"""
+        totals = self.totals()
+        games = registry.get_games()
+        lines = [
+            "# HELP connect5_requests_total Requests served by route, method and status",
+            "# TYPE connect5_requests_total counter",
+        ]
+        for (route, method, status), count in sorted(totals.requests.items()):
+            labels = _labels(route=route, method=method, status=status)
+            lines.append(f"connect5_requests_total{{{labels}}} {count}")
+        lines += [
+            "# HELP connect5_request_duration_seconds Time taken to serve a request",
+            "# TYPE connect5_request_duration_seconds histogram",
+        ]
+        for route, counts in sorted(totals.latency.items()):
+            lines += _histogram(
+                "connect5_request_duration_seconds",
+                LATENCY_BUCKETS,
+                counts,
+                route=route,
+            )
+        lines += [
+            "# HELP connect5_join_wait_seconds Time /initdetails waited for an opponent",
+            "# TYPE connect5_join_wait_seconds histogram",
+            *_histogram(
+                "connect5_join_wait_seconds", JOIN_WAIT_BUCKETS, totals.join_wait
+            ),
+            "# HELP connect5_join_waiting Requests waiting in /initdetails for an opponent",
+            "# TYPE connect5_join_waiting gauge",
+            f"connect5_join_waiting {max(totals.join_waiting, 0)}",
+            "# HELP connect5_games Games held by the server",
+            "# TYPE connect5_games gauge",
+            f"connect5_games {len(games)}",
+            "# HELP connect5_active_games Games that have started and are not over",
+            "# TYPE connect5_active_games gauge",
+            f"connect5_active_games {sum(game.is_in_play() for game in games)}",
+            "# HELP connect5_matchmaking_waiting Players queued for an opponent",
+            "# TYPE connect5_matchmaking_waiting gauge",
+            f"connect5_matchmaking_waiting {matchmaker.pending()}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(name, buckets, counts, **labels):
+    """The bucket, sum and count lines of one histogram. Prometheus buckets are
+    cumulative, so each holds every observation up to its bound."""
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*map(str, buckets), "+Inf"), counts):
+        cumulative += count
+        bucket_labels = _labels(**labels, le=bound)
+        lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+    prefix = f"{{{_labels(**labels)}}}" if labels else ""
+    lines.append(f"{name}_sum{prefix} {counts[-1]}")
+    lines.append(f"{name}_count{prefix} {cumulative}")
+    return lines
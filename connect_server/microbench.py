@@ -0,0 +1,242 @@
+"""Micro-benchmarks of the board operations behind every request.
+
+Times creating a board, dropping symbols, rendering /board, checking for an empty
+board and every win checker on empty, mid-game, full and won boards of several sizes.
+The boards are built from seeded random games, so every run times exactly the same
+positions and two runs, or two win checkers, can be compared directly.
+
+The win checkers are the board's own bitboard check, the cell by cell scan used to
+verify it and, when NumPy is installed, the vectorised batch check.
+
+Example:
+    python -m connect_server.microbench --output before.json
+    python -m connect_server.microbench --baseline before.json
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import timeit
+
+from connect_server.board import Board
+from connect_server.constants import SYMBOL_1, SYMBOL_2
+from connect_server.tournament import scan_for_winner
+
+try:
+    from connect_server.batch import find_winners
+except ImportError:
+    find_winners = None
+
+# (rows, cols, connect) of the boards timed by default
+SIZES = ((6, 7, 4), (6, 9, 5), (15, 15, 5))
+STATES = ("empty", "mid", "full", "won")
+REPEAT = 5
+# Roughly how long in seconds each timed run of a benchmark lasts
+RUN_SECONDS = 0.01
+# How much slower a benchmark may get than in the baseline before the run counts as a
+# regression
+REGRESSION_TOLERANCE = 1.2
+
+
+def _bitboard_winner(board):
+    for symbol, mask in board.masks.items():
+        if board._has_line(mask):
+            return symbol
+    return None
+
+
+def _numpy_winner(board):
+    return find_winners([board.grid()], board.connect)[1][0]
+
+
+WIN_CHECKERS = {"bitboard": _bitboard_winner, "scan": scan_for_winner}
+if find_winners is not None:
+    WIN_CHECKERS["numpy"] = _numpy_winner
+
+
+def _random_game(rng, rows, cols, connect, stop):
+    """Play random moves until `stop(board)` or the board is full. A win does not end
+    the game unless `stop` says so."""
+    board = Board(rows=rows, cols=cols, connect=connect)
+    while not board.is_full() and not stop(board):
+        col = rng.choice([c for c in range(cols) if not board.is_column_full(c)])
+        board.drop(col, (SYMBOL_1, SYMBOL_2)[board.move_count % 2])
+    return board
+
+
+def build_boards(rows, cols, connect, seed=0):
+    """Build the board in every state for one size from seeded random games.
+
+    The mid-game board is half full without a winner and the full board has every
+    cell filled whether or not a line was made on the way.
+
+    Returns:
+        dict[str, Board]: The board in each of `STATES`.
+    """
+    rng = random.Random(seed)
+    half = rows * cols // 2
+    mid = won = None
+    while mid is None or mid.winner:
+        mid = _random_game(
+            rng, rows, cols, connect, lambda board: board.move_count >= half
+        )
+    full = _random_game(rng, rows, cols, connect, lambda board: False)
+    while won is None or not won.winner:
+        won = _random_game(rng, rows, cols, connect, lambda board: board.winner)
+    return {
+        "empty": Board(rows=rows, cols=cols, connect=connect),
+        "mid": mid,
+        "full": full,
+        "won": won,
+    }
+
+
+def _render(board):
+    # Clear the cache so the rendering is actually rebuilt
+    board._rendered = None
+    return board.render()
+
+
+def _time(function, repeat):
+    """Time a call of `function`, in nanoseconds.
+
+    Returns:
+        tuple[float, float]: The median and fastest time of `repeat` runs.
+    """
+    timer = timeit.Timer(function)
+    # Like timeit's autorange, but aiming for much shorter runs so the whole suite
+    # takes seconds rather than minutes
+    number = 1
+    while timer.timeit(number) < RUN_SECONDS:
+        number *= 2
+    times = [total / number * 1e9 for total in timer.repeat(repeat, number)]
+    return statistics.median(times), min(times)
+
+
+def _benchmarks(boards):
+    """Yield the (benchmark, state, function, calls) to time for one size, where each
+    call of `function` makes `calls` calls of the operation being timed"""
+    rows, cols, connect = (
+        boards["empty"].rows,
+        boards["empty"].cols,
+        boards["empty"].connect,
+    )
+    yield "create", None, lambda: Board(rows=rows, cols=cols, connect=connect), 1
+    moves = boards["won"].moves
+    yield "drop", None, lambda: Board.from_moves(moves, rows, cols, connect), len(moves)
+    for state in STATES:
+        board = boards[state]
+        yield "render", state, lambda board=board: _render(board), 1
+        yield "is_empty", state, board.is_empty, 1
+        for name, checker in WIN_CHECKERS.items():
+            yield f"win:{name}", state, lambda board=board, checker=checker: checker(
+                board
+            ), 1
+
+
+def run_benchmarks(sizes=SIZES, seed=0, repeat=REPEAT):
+    """Time every benchmark on every size of board.
+
+    Returns:
+        list[dict]: The benchmark, size, board state and median and fastest time in
+            nanoseconds of every benchmark.
+    """
+    results = []
+    for rows, cols, connect in sizes:
+        boards = build_boards(rows, cols, connect, seed)
+        for name, state, function, calls in _benchmarks(boards):
+            median, fastest = _time(function, repeat)
+            results.append(
+                {
+                    "benchmark": name,
+                    "size": f"{rows}x{cols}/{connect}",
+                    "state": state,
+                    "median_ns": round(median / calls, 1),
+                    "min_ns": round(fastest / calls, 1),
+                }
+            )
+    return results
+
+
+def _key(result):
+    return result["benchmark"], result["size"], result["state"]
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Find the benchmarks whose fastest time grew by more than `tolerance` times the
+    baseline's.
+
+    Returns:
+        dict[tuple, float]: The ratio of new to baseline time of every benchmark that
+            regressed, keyed by (benchmark, size, state).
+    """
+    before = {_key(result): result["min_ns"] for result in baseline}
+    regressions = {}
+    for result in results:
+        if before.get(_key(result)):
+            ratio = result["min_ns"] / before[_key(result)]
+            if ratio > tolerance:
+                regressions[_key(result)] = round(ratio, 2)
+    return regressions
+
+
+def format_report(results):
+    lines = [
+        f"{'benchmark':<14}{'size':<10}{'state':<8}{'median ns':>12}{'min ns':>12}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['benchmark']:<14}{result['size']:<10}{result['state'] or '':<8}"
+            f"{result['median_ns']:>12}{result['min_ns']:>12}"
+        )
+    return "\n".join(lines)
+
+
+def _size(value):
+    rows, cols, connect = map(int, value.split(","))
+    return rows, cols, connect
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--size",
+        type=_size,
+        action="append",
+        dest="sizes",
+        metavar="ROWS,COLS,CONNECT",
+        help="a board size to time, repeatable. Defaults to "
+        + " ".join(",".join(map(str, size)) for size in SIZES),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="the JSON results of an earlier run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="how many times slower than the baseline a benchmark may get",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes or SIZES, seed=args.seed, repeat=args.repeat)
+    print(format_report(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for (name, size, state), ratio in regressions.items():
+            print(
+                f"{name} {size} {state or ''} is {ratio}x the baseline", file=sys.stderr
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Players taking part in a game"""
+
+
+class Player:
+    """Represents a single Player that has joined a game.
+
+    Attributes:
+        name (str): The display name chosen by the player.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+    def __str__(self):
+        return self.get_name()
+
+    def equals(self, other_player):
+        return str(self) == str(other_player)
+
+
+class Participants:
+    """Represents the two active players in a game as well as which player is
+    currently taking their go.
+
+    Attributes:
+        player1 (Player): The first Player object to join the game.
+        player2 (Player): The second Player object to join the game.
+        active_player (Player): The Player whose go it is.
+
+    """
+
+    def __init__(self, player1=None, player2=None):
+        self.player1 = player1
+        self.player2 = player2
+        self.active_player = None
+
+    def get_player1(self):
+        return self.player1
+
+    def get_player2(self):
+        return self.player2
+
+    def get_players_string(self):
+        return f"[{self.player1}, {self.player2}]"
+
+    def get_active_player(self):
+        return self.active_player
+
+    def set_active_player(self, player):
+        self.active_player = player
+
+    def add_player(self, player):
+        if not self.get_player1():
+            self.player1 = player
+            return True
+        elif not self.get_player2():
+            self.player2 = player
+            return True
+        else:
+            print("No room to add player")
+            return False
+
+    def reset_participants(self):
+        self.player1 = None
+        self.player2 = None
+        self.active_player = None
+
+    def is_full(self):
+        return self.player1 and self.player2
+
+    def get_player_total(self):
+        total = 0
+        if self.player1:
+            total += 1
+        if self.player2:
+            total += 1
+        return total
+
+    def switch_active_player(self):
+        if not self.active_player:
+            print("Active player not selected. Players could not be switched")
+        elif not (self.player1 and self.player2):
+            print(
+                "Two players need to be present to switch. Players could not be switched"
+            )
+        elif self.active_player == self.player1:
+            self.active_player = self.player2
+        else:
+            self.active_player = self.player1
+        return self.active_player
+
+    def name_in_use(self, name):
+        if self.player1 and name == self.player1.get_name():
+            return True
+        elif self.player2 and name == self.player2.get_name():
+            return True
+        else:
+            return False
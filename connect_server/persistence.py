@@ -0,0 +1,227 @@
+"""An append-only log of game events so games survive a restart of the server.
+
+Every event a game publishes is handed to a background writer thread, which appends it
+to the current log segment as a JSON line and flushes and fsyncs the segment in
+batches. No request ever waits on the disk. A crash can lose at most the events of the
+last `fsync_interval` seconds.
+
+Every `snapshot_interval` seconds the writer starts a new segment, snapshots every game
+to a single file and deletes the segments the snapshot covers, so recovery only ever
+reads one snapshot and a short tail of events.
+"""
+
+import gc
+import json
+import os
+import queue
+import threading
+import time
+
+from connect_server.game import Game
+
+# How often in seconds the writer flushes and fsyncs the log
+FSYNC_INTERVAL = 1.0
+# How often in seconds the writer snapshots every game and discards the old log
+SNAPSHOT_INTERVAL = 60.0
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_FILE = "moves.{:08d}.log"
+
+_STOP = object()
+
+
+class MoveLog:
+    """Journals the events of every game in a directory and recovers them on startup.
+
+    Attributes:
+        directory (str): Where the snapshot and log segments are kept.
+        fsync_interval (float): The most seconds between fsyncs of the log.
+        snapshot_interval (float): The seconds between snapshots.
+        segment (int): The number of the segment currently being written.
+    """
+
+    def __init__(
+        self,
+        directory,
+        fsync_interval=FSYNC_INTERVAL,
+        snapshot_interval=SNAPSHOT_INTERVAL,
+    ):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.segment = 0
+        self._queue = queue.SimpleQueue()
+        self._registry = None
+        self._file = None
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, game_id, event):
+        """Queue an event to be written. Called while holding the game's lock, so
+        events reach the log in the order they were published."""
+        self._queue.put((game_id, event.event_id, event.event_type, event.data))
+
+    def append_created(self, game):
+        self._queue.put(
+            (
+                game.game_id,
+                game.version,
+                "create",
+                {
+                    "rows": game.board.rows,
+                    "cols": game.board.cols,
+                    "connect": game.board.connect,
+                },
+            )
+        )
+
+    def append_evicted(self, game_id):
+        """Queue a record that a game was evicted, so recovery does not restore it"""
+        self._queue.put((game_id, 0, "evict", None))
+
+    def recover(self, registry):
+        """Restore every game in the snapshot and log segments into the registry, then
+        start journaling the registry's games from where they left off"""
+        # Recovery allocates many objects that all live on, so the cyclic garbage
+        # collector would only spend time rescanning them
+        gc.disable()
+        try:
+            games = self._load()
+        finally:
+            gc.enable()
+        for game in games.values():
+            registry.restore_game(game)
+        self.start(registry)
+        return list(games.values())
+
+    def _load(self):
+        games = {}
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as f:
+                snapshot = json.load(f)
+            self.segment = snapshot["segment"]
+            for details in snapshot["games"]:
+                game = Game.from_snapshot(details)
+                games[game.game_id] = game
+
+        segments = sorted(
+            number
+            for number in map(self._segment_number, os.listdir(self.directory))
+            if number is not None and number >= self.segment
+        )
+        for number in segments:
+            self._replay(self._segment_path(number), games)
+            self.segment = number
+        return games
+
+    def start(self, registry):
+        self._registry = registry
+        registry.journal = self
+        for game in registry.get_games():
+            game.journal = self
+        # Start a fresh segment rather than appending after a possibly torn last line
+        self.segment += 1
+        self._file = open(self._segment_path(self.segment), "a")
+        self._thread = threading.Thread(
+            target=self._run, name="connect5-move-log", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        """Write and fsync everything queued so far and stop the writer"""
+        if self._thread:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _replay(self, path, games):
+        with open(path) as f:
+            for line in f:
+                try:
+                    game_id, version, event_type, data = json.loads(line)
+                except ValueError:
+                    # The last line may be torn by a crash part way through a write
+                    break
+                game = games.get(game_id)
+                if event_type == "create":
+                    if game is None:
+                        games[game_id] = Game(game_id, **data)
+                elif event_type == "evict":
+                    games.pop(game_id, None)
+                elif game is not None and version > game.version:
+                    game.apply_event(event_type, data, version)
+
+    def _run(self):
+        last_sync = last_snapshot = time.monotonic()
+        while True:
+            timeout = max(last_sync + self.fsync_interval - time.monotonic(), 0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                break
+            if record is not None:
+                self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+            now = time.monotonic()
+            if now - last_snapshot >= self.snapshot_interval:
+                self._snapshot()
+                last_sync = last_snapshot = time.monotonic()
+            elif now - last_sync >= self.fsync_interval:
+                self._sync()
+                last_sync = now
+
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not _STOP:
+                self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._sync()
+        self._file.close()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _snapshot(self):
+        """Snapshot every game and discard the segments it covers.
+
+        A new segment is started before any game is snapshotted. Events published
+        while the snapshot is taken are still queued and land in the new segment,
+        and replaying skips any of them the snapshot already includes.
+        """
+        self._sync()
+        self._file.close()
+        self.segment += 1
+        self._file = open(self._segment_path(self.segment), "a")
+
+        snapshot = {
+            "segment": self.segment,
+            "games": [game.snapshot() for game in self._registry.get_games()],
+        }
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+        for name in os.listdir(self.directory):
+            number = self._segment_number(name)
+            if number is not None and number < self.segment:
+                os.remove(os.path.join(self.directory, name))
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, SEGMENT_FILE.format(number))
+
+    @staticmethod
+    def _segment_number(name):
+        prefix, _, suffix = SEGMENT_FILE.partition("{:08d}")
+        if name.startswith(prefix) and name.endswith(suffix):
+            number = name[len(prefix) : -len(suffix)]
+            if number.isdigit():
+                return int(number)
+        return None
@@ -0,0 +1,104 @@
+"""Opt-in profiling of a sample of requests, aggregated by route.
+
+Set CONNECT5_PROFILE_RATE to the fraction of requests to profile, e.g. 0.01 for one in
+a hundred. Each sampled request is run under cProfile and its stats are added to its
+route's total. At most one request is profiled at a time, so a sampled request that
+arrives while another is being profiled simply runs unprofiled, and requests that are
+not sampled only pay for one random number.
+
+The totals can be read as text from `GET /admin/profile`, optionally with "route",
+"sort" and "limit" query parameters, and cleared with `DELETE /admin/profile`. Sending
+the server SIGUSR1 writes each route's totals to a .prof file in
+CONNECT5_PROFILE_DIR (the working directory by default) for tools such as snakeviz.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+
+# The sort order and number of functions in a text dump by default
+PROFILE_SORT = "cumulative"
+PROFILE_LIMIT = 30
+PROFILE_FILE = "connect5-profile{}.prof"
+
+
+class Profiler:
+    """Profiles a random sample of requests and keeps their stats by route.
+
+    Attributes:
+        rate (float): The fraction of requests profiled.
+        directory (str): Where SIGUSR1 writes the stats.
+        requests (dict[str, int]): The number of requests profiled on each route.
+    """
+
+    def __init__(self, rate, directory=".", seed=None):
+        self.rate = rate
+        self.directory = directory
+        self.requests = {}
+        self._stats = {}
+        self._rng = random.Random(seed)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start profiling this request if it is sampled and no other request is being
+        profiled.
+
+        Returns:
+            cProfile.Profile: The running profiler to pass to `stop`, or None.
+        """
+        if self._rng.random() >= self.rate or not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, route):
+        """Stop a profiler from `start` and add its stats to the route's totals"""
+        profile.disable()
+        self._busy.release()
+        route = route or "<unmatched>"
+        with self._lock:
+            if route in self._stats:
+                self._stats[route].add(profile)
+            else:
+                self._stats[route] = pstats.Stats(profile)
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def report(self, route=None, sort=PROFILE_SORT, limit=PROFILE_LIMIT):
+        """Get the totals of every route, or just one, as pstats text"""
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            sort = PROFILE_SORT
+        output = io.StringIO()
+        with self._lock:
+            for name, stats in sorted(self._stats.items()):
+                if route and name != route:
+                    continue
+                output.write(f"{name}: {self.requests[name]} requests profiled\n")
+                stats.stream = output
+                stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue() or "No requests have been profiled yet\n"
+
+    def clear(self):
+        with self._lock:
+            self._stats = {}
+            self.requests = {}
+
+    def dump(self):
+        """Write each route's totals to a .prof file in `directory`.
+
+        Returns:
+            list[str]: The files written.
+        """
+        paths = []
+        with self._lock:
+            for route, stats in self._stats.items():
+                name = re.sub(r"[^\w]+", "-", route).strip("-")
+                path = os.path.join(self.directory, PROFILE_FILE.format("-" + name))
+                stats.dump_stats(path)
+                paths.append(path)
+        return paths
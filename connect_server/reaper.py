@@ -0,0 +1,98 @@
+"""Clears away games and matchmaking tickets abandoned by their players.
+
+A background thread checks every game each `interval` seconds:
+
+- A game in play whose active player has not called in, and which has not changed, for
+  `player_ttl` seconds is forfeited to the opponent, so the game ends rather than
+  wedging until someone resets it.
+- A game that has not changed and that no player has called in to for `game_ttl`
+  seconds is evicted from memory. The default game is created afresh the next time it
+  is used.
+
+Matchmaking tickets whose players stopped checking on them are dropped at the same
+time. Games kept in a shared database are only evicted from this process's memory and
+never forfeited, as players may be calling in to another process.
+
+Enable the reaper by setting CONNECT5_GAME_TTL and/or CONNECT5_PLAYER_TTL in seconds
+before creating the app.
+"""
+
+import threading
+import time
+
+# How often in seconds the reaper checks every game
+REAP_INTERVAL = 30.0
+
+
+class Reaper:
+    """Forfeits and evicts abandoned games on a background thread.
+
+    Attributes:
+        registry (GameRegistry): The games checked.
+        matchmaker (Matchmaker): The queue whose expired tickets are dropped.
+        game_ttl (float): The idle seconds after which a game is evicted, or None to
+            never evict games.
+        player_ttl (float): The seconds the active player may be away before their
+            game is forfeited, or None to never forfeit games.
+        interval (float): The seconds between checks.
+        totals (dict[str, int]): The games forfeited and evicted and the tickets
+            dropped since the reaper was created.
+    """
+
+    def __init__(
+        self,
+        registry,
+        matchmaker,
+        game_ttl=None,
+        player_ttl=None,
+        interval=REAP_INTERVAL,
+    ):
+        self.registry = registry
+        self.matchmaker = matchmaker
+        self.game_ttl = game_ttl
+        self.player_ttl = player_ttl
+        self.interval = interval
+        self.totals = {"forfeited": 0, "evicted": 0, "tickets": 0}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def reap(self, now=None):
+        """Check every game and ticket once.
+
+        Returns:
+            dict[str, int]: The games forfeited and evicted and the tickets dropped.
+        """
+        now = time.monotonic() if now is None else now
+        reaped = {"forfeited": 0, "evicted": 0, "tickets": 0}
+        forfeit = self.player_ttl is not None and not self.registry.store.shared
+        for game in self.registry.get_games():
+            if forfeit and game.forfeit_if_abandoned(self.player_ttl, now):
+                reaped["forfeited"] += 1
+            elif (
+                self.game_ttl is not None
+                # Spectators still watching keep a game alive
+                and not game.spectators
+                and game.idle_seconds(now) >= self.game_ttl
+                and self.registry.evict(game.game_id)
+            ):
+                reaped["evicted"] += 1
+        reaped["tickets"] = self.matchmaker.expire()
+        for key, count in reaped.items():
+            self.totals[key] += count
+        return reaped
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="connect5-reaper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.reap()
@@ -0,0 +1,432 @@
+"""Where the state of every game is kept.
+
+Games are played on in-memory `Game` objects, which read from and write through to a
+shared store. The default `MemoryStore` leaves the `Game` objects as the only copy, so
+each worker process serves its own games. `SqliteStore` keeps them in a SQLite database that every
+worker process on a host can share, so both players see the same board whichever
+worker serves them.
+"""
+
+import contextlib
+import sqlite3
+import threading
+
+# How often in seconds a request waiting on a game in a shared store checks the store
+# for changes made by other processes
+STORE_POLL_INTERVAL = 0.25
+# How long in seconds a write waits for another process to finish its transaction
+STORE_BUSY_TIMEOUT = 5.0
+
+
+class Store:
+    """The interface every store implements.
+
+    Games are passed in and out as the dicts built by `Game.snapshot`. A change to a
+    game is written with `save` inside `transaction`, after the game has been reloaded
+    if another process changed it, so no two processes ever change a game at once.
+
+    Attributes:
+        shared (bool): Whether other processes can change games in the store, in which
+            case games check their version in the store before every request.
+        poll_interval (float): How often waiting requests check a shared store for
+            changes, or None if the store is not shared.
+    """
+
+    shared = False
+    poll_interval = None
+
+    def transaction(self, game_id):
+        """A context manager holding every other process off the game until it exits"""
+        raise NotImplementedError
+
+    def add(self, snapshot):
+        """Add a new game.
+
+        Returns:
+            bool: False if a game with the same ID is already stored.
+        """
+        raise NotImplementedError
+
+    def load(self, game_id):
+        """Get the snapshot of a stored game, or None if there is no such game"""
+        raise NotImplementedError
+
+    def version(self, game_id):
+        """Get the version of a stored game, or None if there is no such game"""
+        raise NotImplementedError
+
+    def save(self, snapshot, events):
+        """Write the events published by a change to a game and its state after them.
+        Must be called inside `transaction`."""
+        raise NotImplementedError
+
+    def game_ids(self):
+        """Iterate over the ID of every stored game"""
+        raise NotImplementedError
+
+    def evict(self, game_id):
+        """Let go of a game the process no longer serves. A shared store keeps it for
+        the other processes."""
+
+
+class MemoryStore(Store):
+    """Keeps games only in this process.
+
+    The `Game` objects served by the registry are the only copy of each game, so the
+    store just tracks which game IDs are taken. Games are never saved to it.
+    """
+
+    def __init__(self):
+        self._game_ids = set()
+        self._lock = threading.Lock()
+
+    def transaction(self, game_id):
+        return contextlib.nullcontext()
+
+    def add(self, snapshot):
+        with self._lock:
+            if snapshot["game_id"] in self._game_ids:
+                return False
+            self._game_ids.add(snapshot["game_id"])
+            return True
+
+    def load(self, game_id):
+        # The registry already holds every game in this process
+        return None
+
+    def version(self, game_id):
+        return None
+
+    def save(self, snapshot, events):
+        pass
+
+    def game_ids(self):
+        return list(self._game_ids)
+
+    def evict(self, game_id):
+        with self._lock:
+            self._game_ids.discard(game_id)
+
+
+class SqliteStore(Store):
+    """Keeps every game in a SQLite database shared by the processes on one host.
+
+    The database runs in write-ahead logging (WAL) mode, so reads never wait on a
+    write. Every change to a game is one `BEGIN IMMEDIATE` transaction, which takes the
+    database's write lock before the game is reloaded, so a change is always made to
+    the latest state. Each thread has its own connection, and every statement is a
+    fixed parameterised string, so SQLite prepares it once per connection and reuses
+    it from its statement cache.
+
+    The matchmaking queue is kept here too, so a player can queue through one worker
+    and check their ticket through another, and players queued through different
+    workers are paired with each other.
+
+    Attributes:
+        path (str): The database file.
+    """
+
+    shared = True
+    poll_interval = STORE_POLL_INTERVAL
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS games (
+            game_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            cols INTEGER NOT NULL,
+            connect INTEGER NOT NULL,
+            active_player TEXT,
+            winner TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS players (
+            game_id TEXT NOT NULL,
+            seat INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (game_id, seat)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS moves (
+            game_id TEXT NOT NULL,
+            move_number INTEGER NOT NULL,
+            col INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            played_at REAL,
+            PRIMARY KEY (game_id, move_number)
+        ) WITHOUT ROWID""",
+        # Tickets are queued in rowid order. The game ID is set once matched.
+        """CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            game_id TEXT,
+            last_seen REAL NOT NULL
+        )""",
+    )
+    INSERT_GAME = (
+        "INSERT OR IGNORE INTO games (game_id, version, rows, cols, connect, "
+        "active_player, winner) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    )
+    SELECT_GAME = (
+        "SELECT version, rows, cols, connect, active_player, winner FROM games "
+        "WHERE game_id = ?"
+    )
+    SELECT_VERSION = "SELECT version FROM games WHERE game_id = ?"
+    SELECT_PLAYERS = "SELECT name FROM players WHERE game_id = ? ORDER BY seat"
+    SELECT_MOVES = (
+        "SELECT col, symbol, played_at FROM moves WHERE game_id = ? "
+        "ORDER BY move_number"
+    )
+    SELECT_GAME_IDS = "SELECT game_id FROM games"
+    INSERT_PLAYER = (
+        "INSERT INTO players (game_id, seat, name) "
+        "SELECT ?, COUNT(*), ? FROM players WHERE game_id = ?"
+    )
+    INSERT_MOVE = (
+        "INSERT INTO moves (game_id, move_number, col, symbol, played_at) "
+        "SELECT ?, COUNT(*), ?, ?, ? FROM moves WHERE game_id = ?"
+    )
+    DELETE_PLAYERS = "DELETE FROM players WHERE game_id = ?"
+    DELETE_MOVES = "DELETE FROM moves WHERE game_id = ?"
+    DELETE_EXPIRED_TICKETS = "DELETE FROM tickets WHERE last_seen < ?"
+    SELECT_OPPONENT = (
+        "SELECT ticket_id, name FROM tickets WHERE game_id IS NULL AND name != ? "
+        "ORDER BY rowid LIMIT 1"
+    )
+    INSERT_TICKET = (
+        "INSERT INTO tickets (ticket_id, name, game_id, last_seen) VALUES (?, ?, ?, ?)"
+    )
+    MATCH_TICKET = "UPDATE tickets SET game_id = ? WHERE ticket_id = ?"
+    TOUCH_TICKET = "UPDATE tickets SET last_seen = ? WHERE ticket_id = ?"
+    SELECT_TICKET = "SELECT name, game_id FROM tickets WHERE ticket_id = ?"
+    DELETE_MATCHED_TICKET = (
+        "DELETE FROM tickets WHERE ticket_id = ? AND game_id IS NOT NULL"
+    )
+    DELETE_PENDING_TICKET = (
+        "DELETE FROM tickets WHERE ticket_id = ? AND game_id IS NULL"
+    )
+    COUNT_PENDING_TICKETS = "SELECT COUNT(*) FROM tickets WHERE game_id IS NULL"
+    UPDATE_GAME = (
+        "UPDATE games SET version = ?, rows = ?, cols = ?, connect = ?, "
+        "active_player = ?, winner = ? WHERE game_id = ?"
+    )
+
+    def __init__(self, path, busy_timeout=STORE_BUSY_TIMEOUT):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        with self._transaction(connection):
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            # Databases created before move times were recorded lack the column
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(moves)")]
+            if "played_at" not in columns:
+                connection.execute("ALTER TABLE moves ADD COLUMN played_at REAL")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Transactions are begun and committed explicitly
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None
+            )
+            # Safe in WAL mode: a crash can lose the last transactions but never
+            # corrupt the database
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _transaction(connection):
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def transaction(self, game_id):
+        return self._transaction(self._connection())
+
+    def add(self, snapshot):
+        with self._transaction(self._connection()) as connection:
+            return self._insert(connection, snapshot)
+
+    def _insert(self, connection, snapshot):
+        """Add a new game inside a transaction"""
+        cursor = connection.execute(
+            self.INSERT_GAME,
+            (
+                snapshot["game_id"],
+                snapshot["version"],
+                snapshot["rows"],
+                snapshot["cols"],
+                snapshot["connect"],
+                snapshot["active_player"],
+                snapshot["winner"],
+            ),
+        )
+        if cursor.rowcount == 0:
+            return False
+        for name in snapshot["players"]:
+            if name:
+                connection.execute(
+                    self.INSERT_PLAYER,
+                    (snapshot["game_id"], name, snapshot["game_id"]),
+                )
+        move_times = snapshot.get("move_times") or [None] * len(snapshot["moves"])
+        for (col, symbol), played_at in zip(snapshot["moves"], move_times):
+            connection.execute(
+                self.INSERT_MOVE,
+                (snapshot["game_id"], col, symbol, played_at, snapshot["game_id"]),
+            )
+        return True
+
+    def load(self, game_id):
+        connection = self._connection()
+        # Read everything in one transaction so a concurrent move is never half seen
+        with self._read(connection):
+            row = connection.execute(self.SELECT_GAME, (game_id,)).fetchone()
+            if row is None:
+                return None
+            players = [
+                name for (name,) in connection.execute(self.SELECT_PLAYERS, (game_id,))
+            ]
+            moves = connection.execute(self.SELECT_MOVES, (game_id,)).fetchall()
+        version, rows, cols, connect, active_player, winner = row
+        return {
+            "game_id": game_id,
+            "version": version,
+            "rows": rows,
+            "cols": cols,
+            "connect": connect,
+            "moves": [(col, symbol) for col, symbol, _ in moves],
+            "move_times": [played_at for _, _, played_at in moves],
+            "winner": winner,
+            "players": players + [None] * (2 - len(players)),
+            "active_player": active_player,
+        }
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _read(connection):
+        # Inside a write transaction the reads already see a consistent state
+        if connection.in_transaction:
+            yield
+            return
+        connection.execute("BEGIN")
+        try:
+            yield
+        finally:
+            connection.execute("COMMIT")
+
+    def version(self, game_id):
+        row = self._connection().execute(self.SELECT_VERSION, (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, snapshot, events):
+        connection = self._connection()
+        game_id = snapshot["game_id"]
+        for event in events:
+            if event.event_type == "move":
+                connection.execute(
+                    self.INSERT_MOVE,
+                    (
+                        game_id,
+                        event.data["column"],
+                        event.data["symbol"],
+                        event.data.get("time"),
+                        game_id,
+                    ),
+                )
+            elif event.event_type == "join":
+                connection.execute(
+                    self.INSERT_PLAYER, (game_id, event.data["name"], game_id)
+                )
+            elif event.event_type == "reset":
+                connection.execute(self.DELETE_PLAYERS, (game_id,))
+                connection.execute(self.DELETE_MOVES, (game_id,))
+        connection.execute(
+            self.UPDATE_GAME,
+            (
+                snapshot["version"],
+                snapshot["rows"],
+                snapshot["cols"],
+                snapshot["connect"],
+                snapshot["active_player"],
+                snapshot["winner"],
+                game_id,
+            ),
+        )
+
+    def game_ids(self):
+        # Read through the cursor so the IDs are never all held at once
+        cursor = self._connection().execute(self.SELECT_GAME_IDS)
+        return (game_id for (game_id,) in cursor)
+
+    def enqueue_ticket(self, ticket_id, name, now, cutoff, new_game):
+        """Queue a matchmaking ticket, pairing it with the longest waiting ticket of a
+        player with another name if there is one. Tickets last seen before `cutoff`
+        are dropped first.
+
+        Args:
+            new_game (callable): Builds the snapshot of a game for the two names
+                paired. The game is added in the same transaction the tickets are
+                matched in, so a matched ticket's game always exists.
+
+        Returns:
+            str: The ID of the game the ticket was matched into, or None if it is
+                waiting.
+        """
+        with self._transaction(self._connection()) as connection:
+            connection.execute(self.DELETE_EXPIRED_TICKETS, (cutoff,))
+            opponent = connection.execute(self.SELECT_OPPONENT, (name,)).fetchone()
+            if opponent is None:
+                connection.execute(self.INSERT_TICKET, (ticket_id, name, None, now))
+                return None
+            snapshot = new_game([opponent[1], name])
+            self._insert(connection, snapshot)
+            connection.execute(self.MATCH_TICKET, (snapshot["game_id"], opponent[0]))
+            connection.execute(
+                self.INSERT_TICKET, (ticket_id, name, snapshot["game_id"], now)
+            )
+            return snapshot["game_id"]
+
+    def check_ticket(self, ticket_id, now):
+        """Record that a ticket's player checked on it.
+
+        Returns:
+            tuple[str, str]: The ticket's name and the ID of the game it was matched
+                into or None, or None if there is no such ticket.
+        """
+        connection = self._connection()
+        connection.execute(self.TOUCH_TICKET, (now, ticket_id))
+        return connection.execute(self.SELECT_TICKET, (ticket_id,)).fetchone()
+
+    def collect_ticket(self, ticket_id):
+        """Forget a matched ticket once its outcome has been returned"""
+        self._connection().execute(self.DELETE_MATCHED_TICKET, (ticket_id,))
+
+    def cancel_ticket(self, ticket_id):
+        """Remove a ticket still waiting for an opponent.
+
+        Returns:
+            bool: Whether the ticket was waiting.
+        """
+        cursor = self._connection().execute(self.DELETE_PENDING_TICKET, (ticket_id,))
+        return cursor.rowcount > 0
+
+    def expire_tickets(self, cutoff):
+        """Drop every ticket last seen before `cutoff`.
+
+        Returns:
+            int: The number of tickets dropped.
+        """
+        cursor = self._connection().execute(self.DELETE_EXPIRED_TICKETS, (cutoff,))
+        return cursor.rowcount
+
+    def pending_tickets(self):
+        """Get the number of tickets waiting for an opponent"""
+        return self._connection().execute(self.COUNT_PENDING_TICKETS).fetchone()[0]
@@ -0,0 +1,250 @@
+"""Headless self-play tournaments between computer players.
+
+Games are played directly against `Board` without going through HTTP and are spread
+across a pool of worker processes. Each finished game is written as one JSON line, so
+results stream to disk however many games are played.
+
+Example:
+    python -m connect_server.tournament --games 1000 --players engine random
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import time
+
+from connect_server.ai import DEFAULT_MAX_DEPTH, Engine
+from connect_server.board import Board
+from connect_server.constants import (
+    NUM_COLS,
+    NUM_ROWS,
+    NUM_TO_CONNECT,
+    SYMBOL_1,
+    SYMBOL_2,
+)
+
+# The number of games each worker plays per task, to spread the cost of sending
+# work between processes
+GAMES_PER_TASK = 16
+# How many plies the engine searches per move. A fixed depth rather than a time
+# budget keeps every game reproducible however loaded the machine is
+ENGINE_DEPTH = 4
+
+
+class RandomPlayer:
+    """Drops into a random column that is not full"""
+
+    def __init__(self, seed=None, **options):
+        self.rng = random.Random(seed)
+
+    def choose_move(self, board, symbol):
+        return self.rng.choice(
+            [col for col in range(board.cols) if not board.is_column_full(col)]
+        )
+
+
+class CentrePlayer:
+    """Drops into the column nearest the centre that is not full"""
+
+    def __init__(self, seed=None, **options):
+        pass
+
+    def choose_move(self, board, symbol):
+        return min(
+            (col for col in range(board.cols) if not board.is_column_full(col)),
+            key=lambda col: abs(2 * col - (board.cols - 1)),
+        )
+
+
+def _engine_player(seed=None, depth=None, time_budget=None, **options):
+    if time_budget is None:
+        depth = depth or ENGINE_DEPTH
+    return Engine(
+        time_budget=time_budget, max_depth=depth or DEFAULT_MAX_DEPTH, seed=seed or 0
+    )
+
+
+STRATEGIES = {
+    "random": RandomPlayer,
+    "centre": CentrePlayer,
+    "engine": _engine_player,
+}
+
+
+def scan_for_winner(board):
+    """Find a winner by checking every line on the board cell by cell. Far slower than
+    the board's own check and only used to verify it."""
+    for row in range(board.rows):
+        for col in range(board.cols):
+            symbol = board.get(row, col)
+            if not symbol:
+                continue
+            for row_step, col_step in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                end_row = row + row_step * (board.connect - 1)
+                end_col = col + col_step * (board.connect - 1)
+                if not (0 <= end_row < board.rows and end_col < board.cols):
+                    continue
+                if all(
+                    board.get(row + row_step * i, col + col_step * i) == symbol
+                    for i in range(1, board.connect)
+                ):
+                    return symbol
+    return None
+
+
+def play_game(game_number, strategies, options):
+    """Play one game between two strategies and return the result as a dict.
+
+    The strategies swap who goes first on alternate games, and every game has its own
+    seed so any game can be replayed exactly, unless the engine is given a time
+    budget.
+    """
+    seed = options["seed"] + game_number
+    names = strategies if game_number % 2 == 0 else strategies[::-1]
+    players = {
+        SYMBOL_1: STRATEGIES[names[0]](seed=seed, **options["player_options"]),
+        SYMBOL_2: STRATEGIES[names[1]](seed=seed + 1, **options["player_options"]),
+    }
+    board = Board(
+        rows=options["rows"], cols=options["cols"], connect=options["connect"]
+    )
+    move_times = []
+    mismatch = False
+    symbol = SYMBOL_1
+    while not board.winner and not board.is_full():
+        start = time.perf_counter()
+        column = players[symbol].choose_move(board, symbol)
+        move_times.append(round(time.perf_counter() - start, 6))
+        board.drop(column, symbol)
+        if options["verify"] and board.winner != scan_for_winner(board):
+            mismatch = True
+        symbol = SYMBOL_2 if symbol == SYMBOL_1 else SYMBOL_1
+
+    result = {
+        "game": game_number,
+        "seed": seed,
+        "players": {SYMBOL_1: names[0], SYMBOL_2: names[1]},
+        "winner": names[0 if board.winner == SYMBOL_1 else 1] if board.winner else None,
+        "winning_symbol": board.winner,
+        "moves": [col for col, _ in board.moves],
+        "move_times": move_times,
+    }
+    if options["verify"]:
+        result["verified"] = not mismatch
+    return result
+
+
+def play_games(game_numbers, strategies, options):
+    return [play_game(number, strategies, options) for number in game_numbers]
+
+
+def run_tournament(games, strategies, output, workers=None, **options):
+    """Play `games` games between two strategies across a pool of processes, writing
+    each result as a JSON line to the `output` file object as soon as it finishes.
+
+    Only a few tasks per worker are in flight at once, so memory stays flat however
+    many games are played.
+
+    Returns:
+        collections.Counter: The number of wins for each strategy, with draws counted
+            under None.
+    """
+    options = {
+        "rows": NUM_ROWS,
+        "cols": NUM_COLS,
+        "connect": NUM_TO_CONNECT,
+        "seed": 0,
+        "verify": False,
+        "player_options": {},
+        **options,
+    }
+    workers = workers or os.cpu_count() or 1
+    tally = collections.Counter()
+    batches = (
+        range(start, min(start + GAMES_PER_TASK, games))
+        for start in range(0, games, GAMES_PER_TASK)
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for batch in batches:
+            pending.add(pool.submit(play_games, batch, strategies, options))
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                _write_results(done, output, tally)
+        _write_results(concurrent.futures.as_completed(pending), output, tally)
+    return tally
+
+
+def _write_results(futures, output, tally):
+    for future in futures:
+        for result in future.result():
+            tally[result["winner"]] += 1
+            if result.get("verified") is False:
+                tally["verification_failures"] += 1
+            output.write(json.dumps(result) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument(
+        "--players",
+        nargs=2,
+        choices=sorted(STRATEGIES),
+        default=["engine", "random"],
+        metavar="STRATEGY",
+        help=f"the two strategies to play, from {', '.join(sorted(STRATEGIES))}",
+    )
+    parser.add_argument("--workers", type=int, help="defaults to one per CPU")
+    parser.add_argument("--output", default="-", help="JSONL file, or - for stdout")
+    parser.add_argument("--rows", type=int, default=NUM_ROWS)
+    parser.add_argument("--cols", type=int, default=NUM_COLS)
+    parser.add_argument("--connect", type=int, default=NUM_TO_CONNECT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--depth",
+        type=int,
+        help=f"plies the engine searches per move, {ENGINE_DEPTH} by default",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="seconds the engine may spend per move instead, which makes games "
+        "depend on the speed of the machine",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check every win against a full board scan",
+    )
+    args = parser.parse_args(argv)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        tally = run_tournament(
+            args.games,
+            args.players,
+            output,
+            workers=args.workers,
+            rows=args.rows,
+            cols=args.cols,
+            connect=args.connect,
+            seed=args.seed,
+            verify=args.verify,
+            player_options={"depth": args.depth, "time_budget": args.time_budget},
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(dict(tally), file=sys.stderr)
+    return 1 if tally["verification_failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+from connect_server.ai import (
+    TIME_CHECK_INTERVAL,
+    WIN_SCORE,
+    Engine,
+    TranspositionTable,
+)
+from connect_server.board import Board
+
+
+def _play(board, columns):
+    symbols = ("X", "O")
+    for col in columns:
+        board.drop(col, symbols[board.move_count % 2])
+
+
+def test_takes_an_immediate_win():
+    board = Board()
+    # X has four in a row along the bottom with O stacked on top
+    _play(board, [0, 0, 1, 1, 2, 2, 3, 3])
+    assert Engine().choose_move(board, "X") == 4
+
+
+def test_blocks_an_immediate_loss():
+    board = Board()
+    _play(board, [8, 0, 8, 1, 7, 2, 7, 3])
+    assert Engine().choose_move(board, "X") == 4
+
+
+def test_beats_a_random_player():
+    engine = Engine()
+    rng = random.Random(0)
+    for _ in range(3):
+        board = Board()
+        while not board.winner and not board.is_full():
+            if board.move_count % 2 == 0:
+                col = engine.choose_move(board, "X")
+            else:
+                col = rng.choice(
+                    [c for c in range(board.cols) if not board.is_column_full(c)]
+                )
+            board.drop(col, "XO"[board.move_count % 2])
+        assert board.winner == "X"
+
+
+def test_respects_the_time_budget():
+    board = Board()
+    _play(board, [4, 4, 3, 5])
+    # With no time at all the search stops at the first check of the clock, whatever
+    # the load on the machine running it
+    engine = Engine(time_budget=0)
+    engine.choose_move(board, "X")
+    assert engine._nodes <= TIME_CHECK_INTERVAL
+    assert engine.last_depth >= 1
+
+
+def test_forced_wins_are_stored_relative_to_the_position():
+    engine = Engine()
+    engine._prepare(Board())
+    # A win 4 plies below a position searched at ply 3 is a win in 7 from the root
+    stored = engine._to_table(WIN_SCORE - 7, 3)
+    assert stored == WIN_SCORE - 4
+    # Reaching the same position at ply 5 puts the same win 9 plies from the root
+    assert engine._from_table(stored, 5) == WIN_SCORE - 9
+    assert engine._from_table(engine._to_table(-(WIN_SCORE - 7), 3), 5) == -(
+        WIN_SCORE - 9
+    )
+    assert engine._to_table(123, 3) == 123
+
+
+def test_transposition_table_replacement():
+    table = TranspositionTable(size=4)
+    table.store(1, depth=5, score=10, flag=0, move=2)
+    # A shallower result from the same search does not replace a deeper one
+    table.store(5, depth=1, score=20, flag=0, move=3)
+    assert table.lookup(1)[2] == 10
+    assert table.lookup(5) is None
+    # Results left over from an earlier move are always replaced
+    table.new_search()
+    table.store(5, depth=1, score=20, flag=0, move=3)
+    assert table.lookup(5)[2] == 20
+    with pytest.raises(ValueError):
+        TranspositionTable(size=3)
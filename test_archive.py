@@ -0,0 +1,116 @@
+import io
+import json
+
+import pytest
+
+from connect_server import GameRegistry, SqliteStore, SYMBOL_1, SYMBOL_2, games
+from connect_server.ai import Engine
+from connect_server.archive import (
+    encode_binary,
+    encode_jsonl,
+    finished_records,
+    main,
+    read_records,
+    replay,
+)
+
+
+def _play(registry, moves, **details):
+    """Play a game of the given columns to the end"""
+    game = registry.create_game(**details)
+    game.register_new_player("a")
+    game.register_new_player("b")
+    game.initialise_player_details("a")
+    for ply, col in enumerate(moves):
+        assert game.make_move(col, (SYMBOL_1, SYMBOL_2)[ply % 2])["success"]
+    return game
+
+
+def _records():
+    registry = GameRegistry()
+    _play(registry, [0, 1, 0, 1, 0, 1, 0], connect=4)
+    _play(registry, [0, 1, 1, 0], rows=2, cols=2, connect=3)
+    registry.create_game()
+    return list(finished_records(registry))
+
+
+def test_only_finished_games_are_recorded():
+    records = _records()
+    assert [record["winner"] for record in records] == [SYMBOL_1, None]
+    assert records[0]["players"] == ["a", "b"]
+    assert [col for col, _, _ in records[0]["moves"]] == [0, 1, 0, 1, 0, 1, 0]
+    assert all(played_at for _, _, played_at in records[0]["moves"])
+
+
+@pytest.mark.parametrize("encode", [encode_jsonl, encode_binary])
+def test_archives_round_trip(encode):
+    records = _records()
+    read = list(read_records(io.BytesIO(b"".join(encode(iter(records))))))
+    assert len(read) == len(records)
+    for before, after in zip(records, read):
+        assert {**after, "moves": None} == {**before, "moves": None}
+        for (col, symbol, played_at), (read_col, read_symbol, read_at) in zip(
+            before["moves"], after["moves"]
+        ):
+            assert (read_col, read_symbol) == (col, symbol)
+            assert read_at == pytest.approx(played_at, abs=0.001)
+
+
+def test_binary_archive_holds_long_names_and_odd_times():
+    record = {**_records()[0], "players": ["a" * 300, None]}
+    start = record["moves"][0][2]
+    # The clock stepped backwards, then a move came after more than 49.7 days
+    record["moves"][1][2] = start - 5
+    record["moves"][2][2] = start + 50 * 24 * 60 * 60
+    (read,) = read_records(io.BytesIO(b"".join(encode_binary(iter([record])))))
+    assert read["players"] == ["a" * 300, None]
+    assert read["moves"][1][2] == pytest.approx(start)
+    assert start < read["moves"][2][2] < start + 50 * 24 * 60 * 60
+
+
+def test_replay_checks_the_recorded_winner():
+    record = _records()[0]
+    assert replay(record) == {
+        "game_id": record["game_id"],
+        "moves": 7,
+        "winner": SYMBOL_1,
+        "consistent": True,
+    }
+    assert not replay({**record, "winner": SYMBOL_2})["consistent"]
+    # The engine always takes the winning move at the end
+    assert replay(record, Engine(time_budget=None, max_depth=2))["engine_agreement"] > 0
+
+
+def test_move_times_are_stored(tmp_path):
+    path = str(tmp_path / "games.db")
+    game_id = _play(
+        GameRegistry(SqliteStore(path)), [0, 1, 0, 1, 0, 1, 0], connect=4
+    ).game_id
+    registry = GameRegistry(SqliteStore(path))
+    held = set(registry.games)
+    (record,) = finished_records(registry)
+    assert record["game_id"] == game_id
+    assert all(played_at for _, _, played_at in record["moves"])
+    # Exporting reads games from the store without loading them into the registry
+    assert set(registry.games) == held
+
+
+@pytest.mark.parametrize(
+    "archive_format, magic", [("jsonl", b"\x1f\x8b"), ("binary", b"C5AR")]
+)
+def test_export_route(client, archive_format, magic):
+    game_id = _play(games, [2, 3, 2, 3, 2, 3, 2], connect=4).game_id
+    rv = client.get(f"/games/export?format={archive_format}")
+    assert rv.status_code == 200
+    assert rv.data.startswith(magic)
+    records = list(read_records(io.BytesIO(rv.data)))
+    assert game_id in [record["game_id"] for record in records]
+    assert client.get("/games/export?format=xml").status_code == 400
+
+
+def test_replay_command(tmp_path, capsys):
+    path = tmp_path / "games.jsonl.gz"
+    path.write_bytes(b"".join(encode_jsonl(iter(_records()))))
+    assert main(["replay", str(path)]) == 0
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result["consistent"] for result in results] == [True, True]
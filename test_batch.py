@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import test_connect
+from connect_server import create_app, games, DEFAULT_GAME_ID
+from connect_server.batch import encode_boards, find_winners
+from connect_server.board import Board
+
+SCENARIOS = [
+    getattr(test_connect, name)
+    for name in dir(test_connect)
+    if name.startswith("test_")
+]
+
+
+def _scenario_board(scenario):
+    """Play a scenario from test_connect.py and return the board it leaves behind"""
+    app = create_app()
+    with app.test_client() as client:
+        client.get("/reset")
+        client.post("/register", json={"name": "a"})
+        client.post("/register", json={"name": "b"})
+        scenario(client)
+        board = games.get_game(DEFAULT_GAME_ID).board
+        client.get("/reset")
+        client.post("/register", json={"name": "a"})
+        client.post("/register", json={"name": "b"})
+    return board
+
+
+def test_matches_the_game_checker_on_test_connect_scenarios():
+    boards = [_scenario_board(scenario) for scenario in SCENARIOS]
+    has_winner, _ = find_winners(boards)
+    assert list(has_winner) == [bool(board.winner) for board in boards]
+
+
+def test_matches_the_game_checker_on_random_boards():
+    # Games stop at the first line, so there is never more than one winning symbol
+    rng = random.Random(0)
+    boards = []
+    for _ in range(200):
+        board = Board(rows=7, cols=8, connect=4)
+        for _ in range(rng.randrange(board.rows * board.cols)):
+            col = rng.choice(
+                [c for c in range(board.cols) if not board.is_column_full(c)]
+            )
+            board.drop(col, "XO"[board.move_count % 2])
+            if board.winner:
+                break
+        boards.append(board)
+    has_winner, winners = find_winners(boards, connect=4)
+    assert list(winners) == [board.winner for board in boards]
+
+
+def test_accepts_encoded_arrays():
+    codes = np.zeros((2, 6, 9), dtype=np.int8)
+    codes[1, 2, 0:5] = 2
+    has_winner, winners = find_winners(codes)
+    assert list(has_winner) == [False, True]
+    assert list(winners) == [None, "O"]
+    assert (encode_boards(codes) == codes).all()
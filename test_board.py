@@ -0,0 +1,56 @@
+import random
+
+import pytest
+from connect_server.board import Board
+from connect_server.tournament import scan_for_winner
+
+
+def test_drop_stacks_symbols_in_a_column():
+    board = Board(rows=3, cols=2, connect=3)
+    assert board.drop(0, "X") == 0
+    assert board.drop(0, "O") == 1
+    assert board.drop(0, "X") == 2
+    assert board.drop(0, "O") is None
+    assert board.get(1, 0) == "O"
+    assert board.get(0, 1) is None
+
+
+def test_render_matches_bracketed_format():
+    board = Board(rows=2, cols=3, connect=2)
+    board.drop(1, "X")
+    board.drop(1, "O")
+    assert board.render() == "[ ][O][ ]\n[ ][X][ ]\n"
+
+
+@pytest.mark.parametrize("rows,cols,connect", [(6, 9, 5), (6, 7, 4), (15, 15, 5)])
+def test_random_games_match_brute_force(rows, cols, connect):
+    rng = random.Random(rows * cols * connect)
+    for _ in range(20):
+        board = Board(rows=rows, cols=cols, connect=connect)
+        symbols = ("X", "O")
+        while not board.winner and not board.is_full():
+            col = rng.choice([c for c in range(cols) if not board.is_column_full(c)])
+            board.drop(col, symbols[board.move_count % 2])
+            assert board.winner == scan_for_winner(board)
+
+
+def test_invalid_dimensions_are_rejected():
+    with pytest.raises(ValueError):
+        Board(rows=0)
+
+
+def test_cells_are_row_major_from_the_bottom():
+    board = Board(rows=2, cols=3, connect=2)
+    board.drop(1, "X")
+    board.drop(1, "O")
+    board.drop(2, "X")
+    assert board.cells() == ".XX.O."
+
+
+def test_from_moves_replays_the_board():
+    board = Board(rows=4, cols=4, connect=3)
+    for col, symbol in [(0, "X"), (1, "O"), (0, "X"), (3, "O")]:
+        board.drop(col, symbol)
+    replayed = Board.from_moves(board.moves, rows=4, cols=4, connect=3)
+    assert replayed.render() == board.render()
+    assert replayed.moves == board.moves
@@ -0,0 +1,65 @@
+import pytest
+
+from connect_server.ai import Engine
+from connect_server.board import Board
+from connect_server.book import (
+    OpeningBook,
+    build_book,
+    opening_positions,
+    search_positions,
+)
+
+SIZE = {"rows": 4, "cols": 5, "connect": 3}
+
+
+@pytest.fixture(scope="module")
+def book(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("book") / "opening.book")
+    build_book(path, plies=3, depth=3, workers=1, **SIZE)
+    with OpeningBook(path) as book:
+        yield book
+
+
+def _board(columns):
+    board = Board(**SIZE)
+    for col in columns:
+        board.drop(col, ("X", "O")[board.move_count % 2])
+    return board
+
+
+def test_book_holds_the_searched_move_of_every_opening_position(book):
+    positions = opening_positions(plies=3, **SIZE)
+    assert book.count == len(positions)
+    for moves in positions:
+        ((_, move, score),) = search_positions([moves], depth=3, **SIZE)
+        symbol = ("X", "O")[len(moves) % 2]
+        entry = book.lookup(_board(moves), symbol)
+        assert entry[1] == score
+        if entry[0] != move:
+            # Only the mirror image of the position was stored
+            assert entry[0] == SIZE["cols"] - 1 - move
+
+
+def test_mirror_images_share_an_entry(book):
+    move, score = book.lookup(_board([0, 1]), "X")
+    assert book.lookup(_board([4, 3]), "X") == (SIZE["cols"] - 1 - move, score)
+
+
+def test_positions_outside_the_book(book):
+    assert book.lookup(_board([0, 0, 0]), "O") is None
+    assert book.lookup(Board(), "X") is None
+
+
+def test_engine_plays_from_the_book_without_searching(book):
+    engine = Engine(book=book)
+    assert engine.choose_move(_board([2]), "O") == book.lookup(_board([2]), "O")[0]
+    assert engine.last_depth == 0
+    engine.choose_move(_board([2, 2, 2]), "O")
+    assert engine.last_depth > 0
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not.book"
+    path.write_bytes(b"\0" * 32)
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
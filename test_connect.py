@@ -1,6 +1,5 @@
 import pytest
 from connect_server import (
-    create_app,
     FIRST_INDEX,
     NUM_ROWS,
     NUM_TO_CONNECT,
@@ -10,11 +9,8 @@ from connect_server import (
 
 
 @pytest.fixture
-def client(scope="function"):
-    app = create_app()
-    app.config["TESTING"] = True
-    with app.test_client() as client:
-        yield client
+def client(client):
+    yield client
 
     # Before every test clear the board and populate participants
     client.get("/reset")
@@ -0,0 +1,459 @@
+import json
+import threading
+
+import pytest
+
+from connect_server import games, Game, GameRegistry, FIRST_INDEX, SYMBOL_1, SYMBOL_2
+from connect_server.events import EventLog
+
+
+def _create_game(client, **details):
+    rv = client.post("/games", json=details)
+    assert rv.json["success"]
+    return rv.json["game_id"]
+
+
+def test_create_and_list_games(client):
+    game_id = _create_game(client, rows=15, cols=15, connect=5)
+    rv = client.get("/games")
+    summaries = {game["game_id"]: game for game in rv.json["games"]}
+    assert summaries[game_id]["rows"] == 15
+    assert summaries[game_id]["cols"] == 15
+    assert summaries[game_id]["players"] == 0
+
+
+def test_invalid_game_dimensions(client):
+    rv = client.post("/games", json={"rows": 0})
+    assert rv.json["success"] == False
+
+
+def test_join_game(client):
+    game_id = _create_game(client)
+    client.post(f"/games/{game_id}/join", json={"name": "a"})
+    client.post(f"/games/{game_id}/join", json={"name": "b"})
+    rv = client.post(f"/games/{game_id}/join", json={"name": "c"})
+    assert rv.json["success"] == False
+    rv = client.get(f"/games/{game_id}/players")
+    assert rv.json["players"] == "[a, b]"
+
+
+def test_games_do_not_share_boards(client):
+    first_game = _create_game(client)
+    second_game = _create_game(client)
+    client.post(
+        f"/games/{first_game}/makemove",
+        json={"column": FIRST_INDEX, "symbol": SYMBOL_1},
+    )
+    first_board = client.get(f"/games/{first_game}/board").json["board"]
+    second_board = client.get(f"/games/{second_game}/board").json["board"]
+    assert SYMBOL_1 in first_board
+    assert SYMBOL_1 not in second_board
+
+
+def test_unknown_game(client):
+    rv = client.get("/games/missing/board")
+    assert rv.status_code == 404
+    assert rv.json["success"] == False
+
+
+def test_moves_publish_events():
+    game = Game("events")
+    game.register_new_player("a")
+    game.register_new_player("b")
+    details = game.initialise_player_details("a")
+    game.make_move(FIRST_INDEX, SYMBOL_1)
+    events = game.wait_for_events(details["event_id"], timeout=0)
+    assert [event.event_type for event in events] == ["move", "turn"]
+    assert events[1].data == {"active_player": "b"}
+    assert events[0].encoded.startswith(f"id: {events[0].event_id}\nevent: move\n")
+
+
+def test_waiting_for_events_is_woken_by_a_move():
+    game = Game("wake")
+    threading.Timer(0.05, game.make_move, args=(FIRST_INDEX, SYMBOL_1)).start()
+    events = game.wait_for_events(game.events.last_id, timeout=5)
+    assert events[0].data["symbol"] == SYMBOL_1
+
+
+def test_wait_returns_state_once_version_changes(client):
+    game_id = _create_game(client)
+    version = client.get(f"/games/{game_id}/wait?timeout=0").json["version"]
+    threading.Timer(
+        0.05, lambda: games.get_game(game_id).make_move(FIRST_INDEX, SYMBOL_1)
+    ).start()
+    rv = client.get(f"/games/{game_id}/wait?since={version}&timeout=5")
+    assert rv.json["changed"] == True
+    assert rv.json["version"] > version
+    assert SYMBOL_1 in rv.json["board"]
+
+
+def test_wait_times_out_without_change(client):
+    game_id = _create_game(client)
+    rv = client.get(f"/games/{game_id}/wait?since=0&timeout=0")
+    assert rv.json["changed"] == False
+    assert rv.json["winner"] == False
+
+
+def test_state_combines_game_details(client):
+    game_id = _create_game(client)
+    client.post(f"/games/{game_id}/join", json={"name": "a"})
+    client.post(f"/games/{game_id}/join", json={"name": "b"})
+    client.post(f"/games/{game_id}/initdetails", json={"name": "a"})
+    client.post(
+        f"/games/{game_id}/makemove", json={"column": FIRST_INDEX, "symbol": SYMBOL_1}
+    )
+    state = client.get(f"/games/{game_id}/state").json
+    assert state["players"] == ["a", "b"]
+    assert state["active_player"] == "b"
+    assert state["move_count"] == 1
+    assert state["winner"] == False
+    assert state["board"] == client.get(f"/games/{game_id}/board").json["board"]
+
+
+def test_state_is_rebuilt_only_when_version_changes():
+    game = Game("cached")
+    first = game.get_state()
+    assert game.get_state() is first
+    game.make_move(FIRST_INDEX, SYMBOL_1)
+    second = game.get_state()
+    assert second is not first
+    assert second["version"] > first["version"]
+
+
+def test_compact_board_formats(client):
+    game_id = _create_game(client)
+    client.post(
+        f"/games/{game_id}/makemove", json={"column": FIRST_INDEX, "symbol": SYMBOL_1}
+    )
+    rv = client.get(f"/games/{game_id}/board?format=cells")
+    assert rv.json["cells"] == SYMBOL_1 + "." * (rv.json["rows"] * rv.json["cols"] - 1)
+    rv = client.get(
+        f"/games/{game_id}/board",
+        headers={"Accept": "application/vnd.connect5.moves+json"},
+    )
+    assert rv.json["moves"] == [[FIRST_INDEX, SYMBOL_1]]
+    rv = client.get(f"/games/{game_id}/board?format=unknown")
+    assert rv.json["success"] == False
+
+
+def test_out_of_range_column_reports_zero_based_range(client):
+    game_id = _create_game(client, cols=9)
+    rv = client.post(
+        f"/games/{game_id}/makemove", json={"column": 9, "symbol": SYMBOL_1}
+    )
+    assert rv.json["success"] == False
+    assert rv.json["reason"] == "Column must be between 0 and 8"
+
+
+def test_late_initdetails_reports_the_current_turn():
+    game = Game("late")
+    game.register_new_player("a")
+    game.register_new_player("b")
+    game.initialise_player_details("a")
+    game.make_move(FIRST_INDEX, SYMBOL_1)
+    details = game.initialise_player_details("b")
+    assert details["active_player"] == True
+    assert details["symbol"] == SYMBOL_2
+
+
+def _read_events(client, url, count, headers=None):
+    """Read the first `count` events from a Server-Sent Events stream"""
+    rv = client.get(url, headers=headers or {}, buffered=False)
+    assert rv.status_code == 200
+    events = []
+    for chunk in rv.response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        events += [
+            line[len("event: ") :]
+            for line in chunk.splitlines()
+            if line.startswith("event: ")
+        ]
+        if len(events) >= count:
+            break
+    rv.close()
+    return events
+
+
+def test_event_stream_route(client):
+    game_id = _create_game(client)
+    client.post(f"/games/{game_id}/join", json={"name": "a"})
+    client.post(f"/games/{game_id}/join", json={"name": "b"})
+    client.post(f"/games/{game_id}/initdetails", json={"name": "a"})
+    client.post(
+        f"/games/{game_id}/makemove", json={"column": FIRST_INDEX, "symbol": SYMBOL_1}
+    )
+    url = f"/games/{game_id}/events"
+    assert _read_events(client, url, 5) == ["join", "join", "turn", "move", "turn"]
+    assert _read_events(client, f"{url}?since=3", 2) == ["move", "turn"]
+    assert _read_events(client, url, 2, headers={"Last-Event-ID": "3"}) == [
+        "move",
+        "turn",
+    ]
+    headers = {"Last-Event-ID": "not-a-number"}
+    assert _read_events(client, url, 1, headers=headers) == ["join"]
+
+
+def test_full_board_is_a_draw():
+    game = Game("draw", rows=1, cols=2, connect=2)
+    game.register_new_player("a")
+    game.register_new_player("b")
+    details = game.initialise_player_details("a")
+    game.make_move(0, SYMBOL_1)
+    game.make_move(1, SYMBOL_2)
+    events = game.wait_for_events(details["event_id"], timeout=0)
+    assert [event.event_type for event in events] == ["move", "turn", "move", "draw"]
+    assert game.get_state()["draw"] == True
+
+
+def test_subscribers_that_fall_behind_are_told_to_sync():
+    events = EventLog(history=2)
+    for column in range(3):
+        events.publish("move", {"column": column})
+    assert [event.event_type for event in events.since(0)] == ["sync"]
+    assert [event.event_id for event in events.since(1)] == [2, 3]
+
+
+def _started_game(game_id, **details):
+    game = Game(game_id, **details)
+    game.register_new_player("a")
+    game.register_new_player("b")
+    game.initialise_player_details("a")
+    return game
+
+
+def test_moves_are_only_accepted_from_the_active_player():
+    game = _started_game("turns")
+    assert game.make_move(0, SYMBOL_2)["reason"] == f"It is {SYMBOL_1}'s turn"
+    assert game.make_move(0, SYMBOL_1, name="b")["reason"] == "It is not your turn"
+    assert game.make_move(0, SYMBOL_1, name="a")["success"]
+    assert game.make_move(0, SYMBOL_1)["reason"] == f"It is {SYMBOL_2}'s turn"
+    assert game.get_state()["move_count"] == 1
+
+
+def test_no_moves_after_a_win():
+    game = _started_game("over", rows=2, cols=2, connect=2)
+    game.make_move(0, SYMBOL_1)
+    game.make_move(1, SYMBOL_2)
+    assert game.make_move(0, SYMBOL_1)["winner"]
+    rv = game.make_move(1, SYMBOL_2)
+    assert rv["success"] == False
+    assert rv["reason"] == "The game is already over"
+
+
+def test_move_at_a_stale_version_is_rejected_unless_it_is_a_repeat():
+    game = _started_game("cas")
+    version = game.version
+    first = game.make_move(0, SYMBOL_1, name="a", expected_version=version)
+    assert first["success"] and first["version"] > version
+    # The same move resent for the same version is not played twice
+    repeat = game.make_move(0, SYMBOL_1, name="a", expected_version=version)
+    assert repeat == dict(first, duplicate=True)
+    assert game.get_state()["move_count"] == 1
+    # The same move from the other player is not theirs to repeat
+    impostor = game.make_move(0, SYMBOL_1, name="b", expected_version=version)
+    assert impostor["success"] == False
+    # A different move for a stale version is a conflict
+    conflict = game.make_move(1, SYMBOL_2, name="b", expected_version=version)
+    assert conflict["success"] == False
+    assert conflict["version"] == first["version"]
+
+
+def test_makemove_route_checks_name_and_version(client):
+    game_id = _create_game(client)
+    url = f"/games/{game_id}"
+    client.post(f"{url}/register", json={"name": "a"})
+    client.post(f"{url}/register", json={"name": "b"})
+    version = client.post(f"{url}/initdetails", json={"name": "a"}).json["version"]
+    move = {"column": 0, "symbol": SYMBOL_1, "name": "b"}
+    assert client.post(f"{url}/makemove", json=move).json["success"] == False
+    move = dict(move, name="a", version=version)
+    assert client.post(f"{url}/makemove", json=move).json["success"]
+    assert client.post(f"{url}/makemove", json=move).json["duplicate"]
+
+
+def test_concurrent_moves_are_applied_in_turn():
+    """Both players hammer the game from several threads each, submitting every move
+    for the version they last saw. Exactly one move may win each version."""
+    game = _started_game("stress")
+    results = {"success": 0, "duplicate": 0, "conflict": 0, "rejected": 0}
+    attempts = [0]
+    unexplained = []
+    results_lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def play(name, symbol, column):
+        start.wait()
+        while not game.get_state()["winner"] and not game.get_state()["draw"]:
+            rv = game.make_move(
+                column, symbol, name=name, expected_version=game.version
+            )
+            if rv.get("duplicate"):
+                outcome = "duplicate"
+            elif rv["success"]:
+                outcome = "success"
+            elif "version" in rv:
+                outcome = "conflict"
+            else:
+                outcome = "rejected"
+            with results_lock:
+                attempts[0] += 1
+                results[outcome] += 1
+                if not rv["success"] and not rv.get("reason"):
+                    unexplained.append(rv)
+            # Spread the moves over the board so columns do not fill first
+            column = (column + 2) % game.board.cols
+
+    threads = [
+        threading.Thread(target=play, args=(name, symbol, column))
+        for column, (name, symbol) in enumerate([("a", SYMBOL_1), ("b", SYMBOL_2)] * 4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    moves = game.board.moves
+    assert results["success"] == len(moves)
+    assert [symbol for _, symbol in moves] == [
+        (SYMBOL_1, SYMBOL_2)[number % 2] for number in range(len(moves))
+    ]
+    # Every attempt got exactly one outcome, and every losing one says why
+    assert sum(results.values()) == attempts[0]
+    assert unexplained == []
+    # Four threads per player raced for each of their turns, so some must have lost
+    assert results["conflict"] + results["rejected"] + results["duplicate"] > 0
+
+
+def test_spectators_get_a_snapshot_then_every_event(client):
+    game_id = _create_game(client)
+    url = f"/games/{game_id}"
+    client.post(f"{url}/join", json={"name": "a"})
+    client.post(f"{url}/join", json={"name": "b"})
+    client.post(f"{url}/initdetails", json={"name": "a"})
+    client.post(f"{url}/makemove", json={"column": FIRST_INDEX, "symbol": SYMBOL_1})
+    game = games.get_game(game_id)
+
+    rv = client.get(f"{url}/spectate", buffered=False)
+    chunks = (
+        chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in rv.response
+    )
+    assert next(chunks).startswith("id: 5\nevent: snapshot\n")
+    summary = next(s for s in games.list_games() if s["game_id"] == game_id)
+    assert summary["spectators"] == 1
+    # Move on the game directly, as the Flask test client cannot make a request while
+    # a stream it opened is still being read
+    game.make_move(1, SYMBOL_2)
+    assert next(chunks).startswith("id: 6\nevent: move\n")
+    rv.close()
+    assert game.spectators == 0
+
+
+def test_snapshot_is_encoded_once_per_version():
+    game = _started_game("snapshot")
+    snapshot = game.get_snapshot_event()
+    assert game.get_snapshot_event() is snapshot
+    game.make_move(0, SYMBOL_1)
+    assert game.get_snapshot_event() is not snapshot
+    assert game.get_snapshot_event().event_id == game.version
+    data = json.loads(game.get_snapshot_event().encoded.split("data: ")[1])
+    assert data["moves"] == [[0, SYMBOL_1]]
+    assert data["active_player"] == "b"
+
+
+def test_batch_of_moves_stops_at_a_win():
+    game = _started_game("batch", rows=6, cols=7, connect=4)
+    moves = [
+        {"column": col, "symbol": (SYMBOL_1, SYMBOL_2)[ply % 2]}
+        for ply, col in enumerate([0, 1, 0, 1, 0, 1, 0, 1])
+    ]
+    result = game.make_moves(moves)
+    assert result["success"]
+    assert result["applied"] == 7
+    assert result["winning_symbol"] == SYMBOL_1
+    assert result["move_count"] == 7
+
+
+def test_batch_of_moves_stops_at_an_illegal_move():
+    game = _started_game("illegal", rows=2, cols=2, connect=2)
+    version = game.version
+    result = game.make_moves(
+        [
+            {"column": 0, "symbol": SYMBOL_1},
+            {"column": 0, "symbol": SYMBOL_2},
+            {"column": 0, "symbol": SYMBOL_1},
+            {"column": 1, "symbol": SYMBOL_1},
+        ],
+        expected_version=version,
+    )
+    assert not result["success"]
+    assert result["applied"] == 2
+    assert result["reason"] == "That column is full. Choose another column"
+    assert game.make_moves([], expected_version=version)["reason"] == (
+        "The game has changed since that version"
+    )
+
+
+def test_make_moves_route(client):
+    game_id = _create_game(client, rows=6, cols=7, connect=4)
+    rv = client.post(
+        f"/games/{game_id}/makemoves",
+        json={
+            "moves": [
+                {"column": 3, "symbol": SYMBOL_1},
+                {"column": 3, "symbol": SYMBOL_2},
+            ]
+        },
+    )
+    assert rv.json["success"]
+    assert rv.json["applied"] == 2
+    assert rv.json["version"] == client.get(f"/games/{game_id}/state").json["version"]
+
+
+def test_simulate_route(client):
+    rv = client.post(
+        "/games/simulate",
+        json={
+            "games": [
+                {"rows": 6, "cols": 7, "connect": 4, "moves": [0, 1, 0, 1, 0, 1, 0]},
+                {"connect": 4, "players": ["a", "b"], "moves": [0, 0, 1]},
+                {"rows": 0, "moves": [0]},
+            ]
+        },
+    )
+    won, started, invalid = rv.json["games"]
+    assert won["winning_symbol"] == SYMBOL_1 and won["applied"] == 7
+    assert started["success"] and started["active_player"] == "b"
+    assert not invalid["success"]
+    state = client.get(f"/games/{won['game_id']}/state").json
+    assert state["move_count"] == 7
+    assert client.post("/games/simulate", json={"games": None}).status_code == 400
+
+
+@pytest.mark.parametrize(
+    "moves",
+    [
+        [{"symbol": SYMBOL_1}],
+        [{"column": "a", "symbol": SYMBOL_1}],
+        [{"column": None, "symbol": SYMBOL_1}],
+        5,
+        [3],
+    ],
+)
+def test_make_moves_route_rejects_malformed_moves(client, moves):
+    game_id = _create_game(client)
+    rv = client.post(f"/games/{game_id}/makemoves", json={"moves": moves})
+    assert rv.status_code == 400
+    assert rv.json["success"] == False
+    assert client.get(f"/games/{game_id}/state").json["move_count"] == 0
+
+
+@pytest.mark.parametrize("script", [3, {"moves": 5}, {"moves": [None]}])
+def test_simulate_route_rejects_malformed_games(client, script):
+    rv = client.post("/games/simulate", json={"games": [script]})
+    assert rv.status_code == 400
+    assert rv.json["success"] == False
+
+
+def test_scripted_game_needs_both_players_or_neither():
+    with pytest.raises(ValueError):
+        GameRegistry().play_scripted_game([0], players=["a"])
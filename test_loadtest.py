@@ -0,0 +1,28 @@
+from connect_server.loadtest import compare, run_load_test, serve_in_process
+
+ROUTES = ["/activeplayer/<name>", "/board", "/makemove", "/winner"]
+
+
+def test_load_test_plays_whole_games():
+    with serve_in_process() as url:
+        results = run_load_test(url, games=4, concurrency=4, rows=6, cols=7, connect=4)
+    routes = results["routes"]
+    assert set(ROUTES) <= set(routes)
+    assert all(summary["errors"] == 0 for summary in routes.values())
+    assert routes["/makemove"]["requests"] == routes["/winner"]["requests"]
+    assert routes["/makemove"]["requests"] == results["moves"]
+    assert routes["/initdetails"]["requests"] == 8
+    summary = routes["/makemove"]
+    assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+
+
+def test_compare_reports_routes_slower_than_the_baseline():
+    baseline = {"routes": {"/board": {"p95_ms": 2.0}, "/winner": {"p95_ms": 2.0}}}
+    results = {
+        "routes": {
+            "/board": {"p95_ms": 2.2},
+            "/winner": {"p95_ms": 3.0},
+            "/makemove": {"p95_ms": 9.0},
+        }
+    }
+    assert compare(results, baseline) == {"/winner": 1.5}
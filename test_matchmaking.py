@@ -0,0 +1,117 @@
+import threading
+import time
+
+from connect_server import Matchmaker, GameRegistry, SqliteStore
+
+
+def test_first_player_gets_pending_ticket(client):
+    rv = client.post("/matchmaking", json={"name": "a"})
+    assert rv.json["status"] == "pending"
+    client.delete(f"/matchmaking/{rv.json['ticket']}")
+
+
+def test_second_player_is_matched_into_new_game(client):
+    first = client.post("/matchmaking", json={"name": "a"}).json
+    second = client.post("/matchmaking", json={"name": "b"}).json
+    assert second["status"] == "matched"
+
+    rv = client.get(f"/matchmaking/{first['ticket']}")
+    assert rv.json["status"] == "matched"
+    assert rv.json["game_id"] == second["game_id"]
+
+    rv = client.get(f"/games/{second['game_id']}/players")
+    assert rv.json["players"] == "[a, b]"
+    rv = client.post(f"/games/{second['game_id']}/initdetails", json={"name": "a"})
+    assert rv.json["active_player"] == True
+
+
+def test_cancelled_ticket_is_not_matched(client):
+    first = client.post("/matchmaking", json={"name": "a"}).json
+    assert client.delete(f"/matchmaking/{first['ticket']}").json["success"]
+    second = client.post("/matchmaking", json={"name": "b"}).json
+    assert second["status"] == "pending"
+    client.delete(f"/matchmaking/{second['ticket']}")
+
+
+def test_long_poll_is_woken_by_opponent():
+    matchmaker = Matchmaker(GameRegistry())
+    ticket = matchmaker.enqueue("a")
+    threading.Timer(0.05, matchmaker.enqueue, args=("b",)).start()
+    assert matchmaker.wait(ticket, timeout=5)["status"] == "matched"
+
+
+def test_initdetails_returns_pending_without_opponent(client):
+    game_id = client.post("/games", json={}).json["game_id"]
+    client.post(f"/games/{game_id}/join", json={"name": "a"})
+    rv = client.post(f"/games/{game_id}/initdetails", json={"name": "a", "wait": 0})
+    assert rv.json["success"] == False
+    assert rv.json["pending"] == True
+
+
+def test_cancel_during_match_keeps_the_match():
+    registry = GameRegistry()
+    matchmaker = Matchmaker(registry)
+    first = matchmaker.enqueue("a")
+    create_game = registry.create_game
+    cancelled = []
+
+    def slow_create_game(*args, **kwargs):
+        cancelled.append(matchmaker.cancel(first.ticket_id))
+        return create_game(*args, **kwargs)
+
+    registry.create_game = slow_create_game
+    matchmaker.enqueue("b")
+    assert cancelled == [False]
+    assert matchmaker.wait(first, timeout=0)["status"] == "matched"
+
+
+def test_unchecked_tickets_expire():
+    matchmaker = Matchmaker(GameRegistry(), expiry=0.05)
+    first = matchmaker.enqueue("a")
+    time.sleep(0.1)
+    second = matchmaker.enqueue("b")
+    assert matchmaker.get_ticket(first.ticket_id) is None
+    assert matchmaker.wait(second, timeout=0)["status"] == "pending"
+
+
+def test_invalid_wait_falls_back_to_default(client):
+    game_id = client.post("/games", json={}).json["game_id"]
+    client.post(f"/games/{game_id}/join", json={"name": "a"})
+    for timeout in ("abc", "nan"):
+        rv = client.get(f"/games/{game_id}/wait?since=0&timeout={timeout}")
+        assert rv.status_code == 200
+        assert rv.json["changed"] == True
+
+
+def test_players_are_paired_across_workers(tmp_path):
+    path = str(tmp_path / "games.db")
+    first = Matchmaker(GameRegistry(SqliteStore(path)))
+    second_registry = GameRegistry(SqliteStore(path))
+    second = Matchmaker(second_registry)
+
+    ticket = first.enqueue("a")
+    assert first.wait(ticket, timeout=0)["status"] == "pending"
+    assert second.pending() == 1
+    # The ticket can be checked through a worker other than the one it queued on
+    assert second.get_ticket(ticket.ticket_id).name == "a"
+
+    threading.Timer(0.05, second.enqueue, args=("b",)).start()
+    response = first.wait(ticket, timeout=5)
+    assert response["status"] == "matched"
+    game = second_registry.get_game(response["game_id"])
+    assert game.get_players()["players"] == "[a, b]"
+    # A collected ticket is forgotten by every worker
+    assert second.get_ticket(ticket.ticket_id) is None
+    assert first.pending() == 0
+
+
+def test_shared_tickets_can_be_cancelled_and_expire(tmp_path):
+    path = str(tmp_path / "games.db")
+    first = Matchmaker(GameRegistry(SqliteStore(path)))
+    second = Matchmaker(GameRegistry(SqliteStore(path)), expiry=0)
+    ticket = first.enqueue("a")
+    assert second.cancel(ticket.ticket_id)
+    assert second.enqueue("b").matched.is_set() == False
+    time.sleep(0.01)
+    assert second.expire() == 1
+    assert first.pending() == 0
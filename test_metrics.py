@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from conftest import _test_client
+from connect_server import SYMBOL_1, create_app
+from connect_server.asgi import create_asgi_app
+from connect_server.metrics import RETIRE_THRESHOLD, Metrics
+
+
+@pytest.fixture(params=[create_app, create_asgi_app])
+def client(request, monkeypatch):
+    monkeypatch.setenv("CONNECT5_METRICS", "1")
+    with _test_client(request.param()) as client:
+        yield client
+
+
+def _metric(text, name):
+    return next(
+        float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith(name + " ")
+    )
+
+
+def test_metrics_route_reports_requests_and_games(client):
+    game_id = client.post("/games", json={}).json["game_id"]
+    url = f"/games/{game_id}"
+    for name in ("a", "b"):
+        client.post(f"{url}/register", json={"name": name})
+    for name in ("a", "b"):
+        client.post(f"{url}/initdetails", json={"name": name, "wait": 0})
+    client.post(f"{url}/makemove", json={"column": 0, "symbol": SYMBOL_1})
+    client.get("/missing")
+
+    rv = client.get("/metrics")
+    assert rv.status_code == 200
+    text = rv.data.decode()
+    route = 'route="/games/<game_id>/makemove"'
+    assert f'connect5_requests_total{{{route},method="POST",status="200"}} 1' in text
+    assert f"connect5_request_duration_seconds_count{{{route}}} 1" in text
+    assert 'route="<unmatched>",method="GET",status="404"' in text
+    assert _metric(text, "connect5_join_wait_seconds_count") == 2
+    assert _metric(text, "connect5_join_waiting") == 0
+    assert _metric(text, "connect5_active_games") >= 1
+
+
+def test_metrics_are_off_by_default(monkeypatch):
+    monkeypatch.delenv("CONNECT5_METRICS", raising=False)
+    with _test_client(create_app()) as client:
+        assert client.get("/metrics").status_code == 404
+
+
+def test_counts_from_finished_threads_are_kept():
+    metrics = Metrics()
+    threads = [
+        threading.Thread(
+            target=metrics.observe_request, args=("/board", "GET", 200, 0.002)
+        )
+        for _ in range(RETIRE_THRESHOLD * 2)
+    ]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    metrics.observe_request("/board", "GET", 200, 5)
+
+    totals = metrics.totals()
+    assert totals.requests[("/board", "GET", 200)] == RETIRE_THRESHOLD * 2 + 1
+    # One count per bucket plus +Inf and the sum, with 5 seconds in +Inf
+    assert totals.latency["/board"][-2] == 1
+    assert len(metrics._shards) < RETIRE_THRESHOLD
@@ -0,0 +1,31 @@
+import pytest
+
+from connect_server import microbench
+from connect_server.microbench import WIN_CHECKERS, build_boards, run_benchmarks
+
+
+@pytest.mark.parametrize("size", microbench.SIZES)
+def test_boards_are_reproducible_and_in_each_state(size):
+    boards = build_boards(*size, seed=3)
+    assert boards["empty"].is_empty()
+    assert not boards["mid"].winner
+    assert boards["mid"].move_count == size[0] * size[1] // 2
+    assert boards["full"].is_full()
+    assert boards["won"].winner
+    assert build_boards(*size, seed=3)["won"].moves == boards["won"].moves
+
+
+@pytest.mark.parametrize("name", sorted(WIN_CHECKERS))
+def test_win_checkers_agree_with_the_board(name):
+    for size in microbench.SIZES:
+        boards = build_boards(*size)
+        for state in ("empty", "mid", "won"):
+            assert WIN_CHECKERS[name](boards[state]) == boards[state].winner
+
+
+def test_every_benchmark_runs(monkeypatch):
+    monkeypatch.setattr(microbench, "RUN_SECONDS", 0.0001)
+    results = run_benchmarks(sizes=[(4, 4, 3)], repeat=1)
+    names = {result["benchmark"] for result in results}
+    assert {"create", "drop", "render", "is_empty", "win:bitboard"} <= names
+    assert all(result["min_ns"] <= result["median_ns"] for result in results)
@@ -0,0 +1,100 @@
+import os
+
+from connect_server import GameRegistry, MoveLog, SYMBOL_1, SYMBOL_2
+
+
+def _play(registry):
+    game = registry.create_game(rows=6, cols=7, connect=4, game_id="g")
+    game.register_new_player("a")
+    game.register_new_player("b")
+    game.initialise_player_details("a", timeout=0)
+    for column, symbol in ((0, SYMBOL_1), (1, SYMBOL_2), (0, SYMBOL_1)):
+        game.make_move(column, symbol)
+    return game
+
+
+def _recover(directory):
+    registry = GameRegistry()
+    journal = MoveLog(directory)
+    journal.recover(registry)
+    journal.close()
+    return registry
+
+
+def test_recover_from_log(tmp_path):
+    registry = GameRegistry()
+    journal = MoveLog(str(tmp_path), snapshot_interval=3600)
+    journal.recover(registry)
+    game = _play(registry)
+    journal.close()
+
+    recovered = _recover(str(tmp_path)).get_game("g")
+    assert recovered.get_state() == game.get_state()
+    assert recovered.board.connect == 4
+
+
+def test_recover_from_snapshot_and_log(tmp_path):
+    registry = GameRegistry()
+    journal = MoveLog(str(tmp_path), snapshot_interval=3600)
+    journal.recover(registry)
+    game = _play(registry)
+    journal.close()
+
+    # Snapshot what has been played so far, then keep playing into a new segment
+    registry = GameRegistry()
+    journal = MoveLog(str(tmp_path), snapshot_interval=0)
+    journal.recover(registry)
+    registry.get_game("g").make_move(1, SYMBOL_2)
+    game.make_move(1, SYMBOL_2)
+    journal.close()
+
+    assert "snapshot.json" in os.listdir(tmp_path)
+    recovered = _recover(str(tmp_path)).get_game("g")
+    assert recovered.get_state() == game.get_state()
+
+
+def test_recover_after_reset(tmp_path):
+    registry = GameRegistry()
+    journal = MoveLog(str(tmp_path))
+    journal.recover(registry)
+    game = _play(registry)
+    game.reset(rows=8, cols=8, connect=5)
+    journal.close()
+
+    recovered = _recover(str(tmp_path)).get_game("g")
+    assert recovered.get_state() == game.get_state()
+    assert recovered.board.rows == 8
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    registry = GameRegistry()
+    journal = MoveLog(str(tmp_path))
+    journal.recover(registry)
+    game = _play(registry)
+    journal.close()
+
+    segment = max(name for name in os.listdir(tmp_path) if name.endswith(".log"))
+    with open(tmp_path / segment, "a") as f:
+        f.write('["g",99,"mo')
+    recovered = _recover(str(tmp_path)).get_game("g")
+    assert recovered.get_state() == game.get_state()
+
+
+def test_evicted_games_are_not_recovered(tmp_path):
+    registry = GameRegistry(max_games=2)
+    journal = MoveLog(str(tmp_path), snapshot_interval=3600)
+    journal.recover(registry)
+    created = [registry.create_game() for _ in range(3)]
+    registry.evict(created[2].game_id)
+    kept = registry.create_game()
+    journal.close()
+
+    recovered = _recover(str(tmp_path))
+    assert set(recovered.games) == {created[1].game_id, kept.game_id}
+
+    # Recovering into a capped registry restores no more games than the cap
+    registry = GameRegistry(max_games=1)
+    journal = MoveLog(str(tmp_path))
+    journal.recover(registry)
+    journal.close()
+    assert list(registry.games) == [kept.game_id]
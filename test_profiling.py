@@ -0,0 +1,65 @@
+import pytest
+
+from conftest import _test_client
+from connect_server import create_app
+from connect_server.asgi import create_asgi_app
+from connect_server.profiling import Profiler
+
+
+@pytest.fixture(params=[create_app, create_asgi_app])
+def client(request, monkeypatch):
+    monkeypatch.setenv("CONNECT5_PROFILE_RATE", "1")
+    with _test_client(request.param()) as client:
+        yield client
+
+
+def test_sampled_requests_are_profiled_by_route(client):
+    for _ in range(3):
+        client.get("/board")
+    client.get("/winner")
+
+    text = client.get("/admin/profile?limit=5").data.decode()
+    assert "/board: 3 requests profiled" in text
+    assert "/winner: 1 requests profiled" in text
+    text = client.get("/admin/profile?route=/winner&sort=bogus").data.decode()
+    assert "/board" not in text
+    assert "check_for_winner" in text
+
+    client.delete("/admin/profile")
+    assert "/board" not in client.get("/admin/profile?route=/board").data.decode()
+
+
+def test_profiling_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("CONNECT5_PROFILE_RATE", raising=False)
+    with _test_client(create_app()) as client:
+        assert client.get("/admin/profile").status_code == 404
+
+
+def test_only_the_sampled_fraction_is_profiled():
+    profiler = Profiler(0.25, seed=1)
+    sampled = 0
+    for _ in range(400):
+        profile = profiler.start()
+        if profile:
+            sampled += 1
+            profiler.stop(profile, "/board")
+    assert 60 < sampled < 140
+    assert profiler.requests == {"/board": sampled}
+
+
+def test_only_one_request_is_profiled_at_a_time():
+    profiler = Profiler(1)
+    profile = profiler.start()
+    assert profiler.start() is None
+    profiler.stop(profile, "/board")
+    profile = profiler.start()
+    assert profile is not None
+    profiler.stop(profile, "/board")
+
+
+def test_dump_writes_a_file_per_route(tmp_path):
+    profiler = Profiler(1, directory=str(tmp_path))
+    profiler.stop(profiler.start(), "/games/<game_id>/makemove")
+    (path,) = profiler.dump()
+    assert path.endswith("connect5-profile-games-game_id-makemove.prof")
+    assert (tmp_path / path).exists()
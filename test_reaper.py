@@ -0,0 +1,118 @@
+import time
+
+from connect_server import (
+    DEFAULT_GAME_ID,
+    Game,
+    GameRegistry,
+    Matchmaker,
+    SYMBOL_1,
+    SYMBOL_2,
+)
+from connect_server.reaper import Reaper
+
+TTL = 60
+
+
+def _reaper(registry, **ttls):
+    return Reaper(registry, Matchmaker(registry), **ttls)
+
+
+def _started_game(registry):
+    game = registry.create_game()
+    game.register_new_player("a")
+    game.register_new_player("b")
+    game.initialise_player_details("a")
+    return game
+
+
+def test_abandoned_game_is_forfeited_to_the_opponent():
+    registry = GameRegistry()
+    game = _started_game(registry)
+    game.make_move(0, SYMBOL_1, name="a")
+    reaper = _reaper(registry, player_ttl=TTL)
+    assert reaper.reap(time.monotonic() + TTL / 2)["forfeited"] == 0
+    assert reaper.reap(time.monotonic() + TTL)["forfeited"] == 1
+    state = game.get_state()
+    assert state["winning_symbol"] == SYMBOL_1
+    assert not game.is_in_play()
+    forfeit = [event for event in game.events.since(0) if event.event_type == "forfeit"]
+    assert forfeit[0].data == {"name": "b", "symbol": SYMBOL_1}
+
+    replayed = Game("replayed")
+    replayed.apply_event("forfeit", forfeit[0].data, forfeit[0].event_id)
+    assert replayed.board.winner == SYMBOL_1
+
+
+def test_calling_in_keeps_a_player_in_the_game():
+    registry = GameRegistry()
+    game = _started_game(registry)
+    reaper = _reaper(registry, player_ttl=TTL)
+    game.last_activity -= TTL
+    game.players_seen["a"] -= TTL
+    game.is_active_player("a")
+    assert reaper.reap()["forfeited"] == 0
+    assert game.is_in_play()
+
+
+def test_only_players_keep_a_game_alive():
+    registry = GameRegistry()
+    game = _started_game(registry)
+    game.last_activity -= TTL
+    game.is_active_player(None)
+    game.is_active_player("outsider")
+    game.initialise_player_details("outsider", timeout=0)
+    assert set(game.players_seen) == {"a", "b"}
+    assert game.idle_seconds() >= TTL
+
+
+def test_idle_games_are_evicted():
+    registry = GameRegistry()
+    idle = registry.create_game()
+    watched = registry.create_game()
+    busy = registry.create_game()
+    default = registry.get_game(DEFAULT_GAME_ID)
+    for game in (idle, watched, default):
+        game.last_activity -= TTL
+    with watched.spectating():
+        assert _reaper(registry, game_ttl=TTL).reap()["evicted"] == 2
+    assert registry.get_game(idle.game_id) is None
+    assert registry.store.load(idle.game_id) is None
+    assert registry.get_game(watched.game_id) is watched
+    assert registry.get_game(busy.game_id) is busy
+    # The default game is always there to play
+    assert registry.get_game(DEFAULT_GAME_ID) not in (None, default)
+
+
+def test_least_recently_used_games_are_evicted_beyond_the_limit():
+    registry = GameRegistry(max_games=2)
+    first = registry.create_game()
+    second = registry.create_game()
+    registry.get_game(first.game_id)
+    third = registry.create_game()
+    assert set(registry.games) == {first.game_id, third.game_id}
+    assert registry.get_game(second.game_id) is None
+
+
+def test_matched_tickets_never_collected_expire():
+    registry = GameRegistry()
+    matchmaker = Matchmaker(registry, expiry=TTL)
+    matchmaker.enqueue("a")
+    matchmaker.enqueue("b")
+    assert len(matchmaker.tickets) == 2
+    for ticket in matchmaker.tickets.values():
+        ticket.last_seen -= TTL
+    waiting = matchmaker.enqueue("c")
+    assert list(matchmaker.tickets) == [waiting.ticket_id]
+    waiting.last_seen -= TTL
+    assert matchmaker.expire() == 1
+    assert not matchmaker.tickets and not matchmaker.waiting
+
+
+def test_memory_report(client):
+    before = client.get("/admin/memory").json
+    game_id = client.post("/games", json={"rows": 6, "cols": 7}).json["game_id"]
+    client.post(f"/games/{game_id}/makemove", json={"column": 0, "symbol": SYMBOL_2})
+    report = client.get("/admin/memory").json
+    assert report["games"] == before["games"] + 1
+    assert report["total_bytes"] > before["total_bytes"]
+    assert 0 < report["mean_bytes"] <= report["max_bytes"]
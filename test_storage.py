@@ -0,0 +1,123 @@
+import threading
+
+from conftest import _test_client
+from connect_server import (
+    GameRegistry,
+    MemoryStore,
+    SqliteStore,
+    SYMBOL_1,
+    SYMBOL_2,
+    games,
+)
+from connect_server.asgi import create_asgi_app
+
+
+def _registries(tmp_path):
+    """Two registries sharing a database, standing in for two worker processes"""
+    path = str(tmp_path / "games.db")
+    return GameRegistry(SqliteStore(path)), GameRegistry(SqliteStore(path))
+
+
+def test_workers_share_games(tmp_path):
+    first, second = _registries(tmp_path)
+    game_id = first.create_game(rows=6, cols=7, connect=4).game_id
+    first.get_game(game_id).register_new_player("a")
+    second.get_game(game_id).register_new_player("b")
+    first.get_game(game_id).initialise_player_details("a", timeout=0)
+    assert (
+        second.get_game(game_id).initialise_player_details("b", timeout=0)[
+            "active_player"
+        ]
+        == False
+    )
+
+    first.get_game(game_id).make_move(0, SYMBOL_1)
+    second.get_game(game_id).make_move(1, SYMBOL_2)
+    state = first.get_game(game_id).get_state()
+    assert state == second.get_game(game_id).get_state()
+    assert state["move_count"] == 2
+    assert state["active_player"] == "a"
+
+
+def test_reset_and_win_are_shared(tmp_path):
+    first, second = _registries(tmp_path)
+    game = first.get_game("default")
+    for col in range(4):
+        game.make_move(col, SYMBOL_1)
+    other = second.get_game("default")
+    assert other.check_for_winner()["winner"] == False
+    game.make_move(4, SYMBOL_1)
+    assert other.check_for_winner()["winner"] == True
+    other.reset(rows=7)
+    assert game.get_state()["move_count"] == 0
+    assert game.board.rows == 7
+
+
+def test_waits_see_changes_from_other_workers(tmp_path):
+    first, second = _registries(tmp_path)
+    game_id = first.create_game().game_id
+    version = first.get_game(game_id).version
+    threading.Timer(
+        0.05, lambda: second.get_game(game_id).make_move(0, SYMBOL_1)
+    ).start()
+    state = first.get_game(game_id).wait_for_change(version, timeout=5)
+    assert state["changed"] == True
+    assert state["move_count"] == 1
+
+
+def test_games_listed_across_workers(tmp_path):
+    first, second = _registries(tmp_path)
+    game_id = first.create_game().game_id
+    assert game_id in [game["game_id"] for game in second.list_games()]
+    assert second.get_game("missing") is None
+
+
+def test_memory_store_keeps_games_in_process():
+    store = MemoryStore()
+    registry = GameRegistry(store)
+    game = registry.create_game(game_id="g")
+    game.register_new_player("a")
+    # The game itself is the only copy, so moves never snapshot it into the store
+    saved = []
+    store.save = lambda snapshot, events: saved.append(snapshot)
+    game.make_move(0, SYMBOL_1)
+    assert saved == []
+    assert list(store.game_ids()) == ["g"]
+    assert registry.get_game("g") is game
+    assert GameRegistry(MemoryStore()).get_game("g") is None
+
+
+def test_subscribers_sync_after_changes_from_other_workers(tmp_path):
+    first, second = _registries(tmp_path)
+    game = first.create_game()
+    event_id = game.version
+    second.get_game(game.game_id).make_move(0, SYMBOL_1)
+    events = game.wait_for_events(event_id, timeout=5)
+    assert [event.event_type for event in events] == ["sync"]
+    assert events[0].event_id == game.version
+
+
+def test_long_scripts_are_saved_in_full(tmp_path):
+    first, second = _registries(tmp_path)
+    script = [col for col in range(10) for _ in range(15)]
+    result = first.play_scripted_game(script, rows=15, cols=15, connect=15)
+    assert result["applied"] == len(script)
+    assert second.get_game(result["game_id"]).get_state()["move_count"] == len(script)
+
+
+def test_async_app_reads_a_shared_store_off_the_event_loop(tmp_path, monkeypatch):
+    store = SqliteStore(str(tmp_path / "games.db"))
+    threads = set()
+    load = store.load
+
+    def recording_load(game_id):
+        threads.add(threading.current_thread().name)
+        return load(game_id)
+
+    monkeypatch.setattr(store, "load", recording_load)
+    monkeypatch.setattr(games, "store", store)
+    monkeypatch.setattr(games, "games", type(games.games)())
+    game_id = GameRegistry(SqliteStore(store.path)).create_game().game_id
+    with _test_client(create_asgi_app()) as client:
+        assert client.get(f"/games/{game_id}/state").json["version"] == 0
+    assert threads and all(name.startswith("asyncio_") for name in threads)
@@ -0,0 +1,46 @@
+import io
+import json
+
+from connect_server.board import Board
+from connect_server.tournament import play_game, run_tournament, scan_for_winner
+
+OPTIONS = {
+    "rows": 6,
+    "cols": 9,
+    "connect": 5,
+    "seed": 0,
+    "verify": True,
+    "player_options": {},
+}
+
+
+def test_play_game_is_reproducible():
+    first = play_game(3, ["random", "centre"], OPTIONS)
+    second = play_game(3, ["random", "centre"], OPTIONS)
+    assert first["moves"] == second["moves"]
+    assert first["verified"] == True
+    assert len(first["move_times"]) == len(first["moves"])
+
+
+def test_engine_games_are_reproducible():
+    options = dict(OPTIONS, player_options={"depth": 2})
+    first = play_game(1, ["engine", "engine"], options)
+    assert play_game(1, ["engine", "engine"], options)["moves"] == first["moves"]
+
+
+def test_replayed_moves_give_the_recorded_winner():
+    result = play_game(0, ["random", "random"], OPTIONS)
+    symbols = ("X", "O")
+    board = Board.from_moves(
+        [(col, symbols[i % 2]) for i, col in enumerate(result["moves"])]
+    )
+    assert board.winner == result["winning_symbol"] == scan_for_winner(board)
+
+
+def test_run_tournament_streams_every_game():
+    output = io.StringIO()
+    tally = run_tournament(40, ["random", "centre"], output, workers=2, verify=True)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(result["game"] for result in results) == list(range(40))
+    assert sum(tally[name] for name in ("random", "centre", None)) == 40
+    assert tally["verification_failures"] == 0